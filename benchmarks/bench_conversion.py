@@ -0,0 +1,266 @@
+"""Benchmark dice art conversion stage by stage through the public API.
+
+Synthetic inputs are generated per size and converted with `ArtGenerator.convert_to_dice_art`, so every engine,
+encoder, face atlas and streaming writer is measured as shipped; the stage timings come from its ConversionMetrics.
+Every case runs in a fresh process, so peak RSS belongs to that case alone and the face atlas starts cold, and results
+are written as JSON. Pass a previous results file with --baseline to flag slowdowns.
+
+    python benchmarks/bench_conversion.py --sizes 1 10 100 --scales 1 2 -o results.json
+    python benchmarks/bench_conversion.py --baseline results.json --threshold 0.15
+    python benchmarks/bench_conversion.py --sizes 16 --mappings flat bayer floyd-steinberg
+    python benchmarks/bench_conversion.py --sizes 16 --engines vectorized streaming --formats png tiff
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import PIL
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from photo_to_dices.animation import ANIMATION_FORMATS  # noqa: E402
+from photo_to_dices.art_generator import ArtGenerator  # noqa: E402
+from photo_to_dices.metrics import ConversionMetrics  # noqa: E402
+
+STAGES = ConversionMetrics.STAGES
+DEFAULT_SIZES = (1, 4, 16)
+DEFAULT_DICE_WIDTHS = (ArtGenerator.DEFAULT_DICE_WIDTH,)
+DEFAULT_SCALES = (1, 2)
+DEFAULT_FORMAT = "jpeg"
+# Synthetic inputs are stills, so animation formats are left out.
+FORMATS = tuple(
+    output_format for output_format in ArtGenerator.OUTPUT_FORMATS if output_format not in ANIMATION_FORMATS
+)
+DEFAULT_THRESHOLD = 0.15
+
+
+def make_input(directory, megapixels, seed=0):
+    path = Path(directory) / f"synthetic-{megapixels}mp.jpg"
+    if path.exists():
+        return path
+    width = int(math.sqrt(megapixels * 1_000_000 * 4 / 3))
+    height = int(width * 3 / 4)
+    rng = np.random.default_rng(seed)
+    # Gradients plus noise give the equalizer and the face mapping realistic work to do.
+    columns = np.linspace(0, 255, width, dtype=np.float32)
+    gradient = columns[None, :] * np.linspace(0.2, 1, height, dtype=np.float32)[:, None]
+    noise = rng.integers(-40, 40, (height, width), dtype=np.int16)
+    channel = np.clip(gradient.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    Image.fromarray(np.dstack([channel, channel[::-1], channel[:, ::-1]])).save(path, "JPEG", quality=90)
+    return path
+
+
+def run_case(
+    image_path,
+    dice_width,
+    scale,
+    trace_allocations,
+    mapping=ArtGenerator.DEFAULT_MAPPING,
+    engine=ArtGenerator.DEFAULT_ENGINE,
+    output_format=DEFAULT_FORMAT,
+):
+    Image.MAX_IMAGE_PIXELS = None
+    logging.getLogger().setLevel(logging.WARNING)
+    metrics = ConversionMetrics(trace_memory=trace_allocations)
+    with tempfile.TemporaryDirectory(prefix="photo2dice-bench-out-") as output_dir:
+        generator = ArtGenerator(output_dir)
+        with Image.open(image_path) as image:
+            input_size = image.size
+        _, dice = generator.convert_to_dice_art(
+            image_path,
+            scale,
+            dice_width,
+            engine=engine,
+            metrics=metrics,
+            output_format=output_format,
+            mapping=mapping,
+        )
+
+    total_seconds = metrics.total_seconds
+    result = {
+        "input_pixels": input_size[0] * input_size[1],
+        "output_pixels": input_size[0] * input_size[1] * scale * scale,
+        "dice_size": generator.dice_size_for(input_size[0], dice_width),
+        "dice": dice,
+        "dice_per_second": round(dice / total_seconds, 1) if total_seconds else None,
+        "seconds": round(total_seconds, 6),
+        "encoded_bytes": metrics.counters.get("bytes_written"),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "stages": {name: {"seconds": round(seconds, 6)} for name, seconds in metrics.stage_seconds.items()},
+    }
+    if metrics.memory_peak_bytes is not None:
+        result["traced_peak_bytes"] = metrics.memory_peak_bytes
+    return result
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _run_case_in_child(queue, args):
+    try:
+        queue.put(run_case(*args))
+    except ValueError as e:
+        queue.put({"error": str(e)})
+
+
+def run_isolated(*args):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_case_in_child, args=(queue, args))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def case_key(case):
+    key = f"{case['megapixels']}mp/w{case['dice_width']}/x{case['scale']}"
+    # Default settings are left out of the key, so earlier results files stay comparable.
+    for name, default in (
+        ("engine", ArtGenerator.DEFAULT_ENGINE),
+        ("format", DEFAULT_FORMAT),
+        ("mapping", ArtGenerator.DEFAULT_MAPPING),
+    ):
+        value = case.get(name, default)
+        if value != default:
+            key = f"{key}/{value}"
+    return key
+
+
+def find_regressions(results, baseline, threshold):
+    previous = {case_key(case): case for case in baseline["results"]}
+    regressions = []
+    for case in results:
+        old = previous.get(case_key(case))
+        if old is None:
+            continue
+        metrics = [("total", old["seconds"], case["seconds"])]
+        for stage in STAGES:
+            if stage in old["stages"] and stage in case["stages"]:
+                metrics.append((stage, old["stages"][stage]["seconds"], case["stages"][stage]["seconds"]))
+        for name, old_value, new_value in metrics:
+            # Sub-millisecond stages are too noisy to compare.
+            if old_value >= 1e-3 and new_value > old_value * (1 + threshold):
+                regressions.append(
+                    {"case": case_key(case), "metric": name, "baseline": old_value, "current": new_value}
+                )
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=DEFAULT_SIZES, help="Input sizes in megapixels")
+    parser.add_argument("--dice-widths", type=int, nargs="+", default=DEFAULT_DICE_WIDTHS)
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES)
+    parser.add_argument("--mappings", nargs="+", choices=ArtGenerator.MAPPINGS, default=(ArtGenerator.DEFAULT_MAPPING,))
+    parser.add_argument("--engines", nargs="+", choices=ArtGenerator.ENGINES, default=(ArtGenerator.DEFAULT_ENGINE,))
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=(DEFAULT_FORMAT,), help="Output encodings")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case; the fastest is kept")
+    parser.add_argument(
+        "--trace-allocations", action="store_true", help="Record the peak of traced Python allocations (slower)"
+    )
+    parser.add_argument("--input-dir", help="Where synthetic inputs are cached (defaults to a temporary directory)")
+    parser.add_argument("-o", "--output", help="Write results JSON here instead of stdout")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown fraction")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    input_dir = Path(args.input_dir or tempfile.mkdtemp(prefix="photo2dice-bench-"))
+    input_dir.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    for megapixels in args.sizes:
+        image_path = make_input(input_dir, megapixels)
+        for dice_width in args.dice_widths:
+            for scale in args.scales:
+                for engine, output_format, mapping in itertools.product(args.engines, args.formats, args.mappings):
+                    runs = [
+                        run_isolated(
+                            image_path, dice_width, scale, args.trace_allocations, mapping, engine, output_format
+                        )
+                        for _ in range(args.repeat)
+                    ]
+                    # Engines only write some formats and mappings; ArtGenerator rejects the other combinations.
+                    if "error" in runs[0]:
+                        print(f"skipping {engine}/{output_format}/{mapping}: {runs[0]['error']}", file=sys.stderr)
+                        continue
+                    case = {
+                        "megapixels": megapixels,
+                        "dice_width": dice_width,
+                        "scale": scale,
+                        "engine": engine,
+                        "format": output_format,
+                        "mapping": mapping,
+                    }
+                    case.update(min(runs, key=lambda run: run["seconds"]))
+                    results.append(case)
+                    print(
+                        f"{case_key(case)}: {case['seconds']:.3f}s, {case['dice']} dice, "
+                        f"{case['peak_rss_bytes'] / 2**20:.0f} MiB peak",
+                        file=sys.stderr,
+                    )
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pillow": PIL.__version__,
+            "machine": platform.machine(),
+            "cpu_count": multiprocessing.cpu_count(),
+        },
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.threshold)
+        report["regressions"] = regressions
+        for regression in regressions:
+            print(
+                f"REGRESSION {regression['case']} {regression['metric']}: "
+                f"{regression['baseline']:.4f}s -> {regression['current']:.4f}s",
+                file=sys.stderr,
+            )
+        exit_code = 1 if regressions else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
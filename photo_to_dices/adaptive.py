@@ -0,0 +1,127 @@
+import numpy as np
+
+from photo_to_dices.dice_grid import BACKGROUND_COLOR, check_cancelled, means_to_faces
+
+LAYOUTS = ("grid", "adaptive")
+DEFAULT_LAYOUT = "grid"
+# The largest die of an adaptive layout is 2 ** ADAPTIVE_LEVELS times the smallest one.
+ADAPTIVE_LEVELS = 3
+# A block is split while the standard deviation of its gray levels exceeds this. Neighbouring faces are about
+# 42 levels apart, so blocks below it would mostly be filled with dice of a single face anyway.
+ADAPTIVE_THRESHOLD = 12.0
+# Offsets of the four quadrants of a split block, in units of half its size.
+QUADRANTS = np.array([[0, 0], [0, 1], [1, 0], [1, 1]])
+
+
+def check_layout(layout):
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout {layout!r}, expected one of {LAYOUTS}")
+
+
+def pad_to_cells(array, dice_size):
+    # Repeats the last row and column so the canvas ends on a whole die instead of dropping the partial edge.
+    height, width = array.shape
+    pad_y, pad_x = -height % dice_size, -width % dice_size
+    return np.pad(array, ((0, pad_y), (0, pad_x)), mode="edge") if pad_y or pad_x else array
+
+
+def summed_area_tables(array, dice_size):
+    # Integral images of the sums and squared sums of every cell of the smallest die. Blocks of any level start and
+    # end on cell boundaries, so the sum over cells y0:y1, x0:x1 is
+    # table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0] whatever its size.
+    rows, cols = array.shape[0] // dice_size, array.shape[1] // dice_size
+    tables = np.zeros((2, rows + 1, cols + 1), dtype=np.int64)
+    for table, values in zip(tables, (array, np.square(array, dtype=np.uint16))):
+        cells = values.reshape(rows, dice_size, cols, dice_size).sum(axis=(1, 3), dtype=np.int64)
+        np.cumsum(np.cumsum(cells, axis=0), axis=1, out=table[1:, 1:])
+    return tables
+
+
+def block_sums(tables, ys, xs, span):
+    y1, x1 = ys + span, xs + span
+    return tables[:, y1, x1] - tables[:, ys, x1] - tables[:, y1, xs] + tables[:, ys, xs]
+
+
+class DiceLayout:
+    # Dice of several sizes covering a canvas: die i sits at (xs[i], ys[i]), is sizes[i] pixels wide and shows
+    # faces[i]. Like a face grid, `size` is the number of dice.
+    def __init__(self, ys, xs, sizes, faces, canvas_size):
+        self.ys = ys
+        self.xs = xs
+        self.sizes = sizes
+        self.faces = faces
+        self.canvas_size = canvas_size
+
+    @property
+    def size(self):
+        return self.faces.size
+
+    @property
+    def dice_sizes(self):
+        return tuple(int(size) for size in np.unique(self.sizes))
+
+    def dice_counts(self):
+        # Dice needed of every size, for ordering stock.
+        sizes, counts = np.unique(self.sizes, return_counts=True)
+        return {f"{size}px": int(count) for size, count in zip(sizes, counts)}
+
+
+def adaptive_layout(array, dice_size, levels=ADAPTIVE_LEVELS, threshold=ADAPTIVE_THRESHOLD, cancel_token=None):
+    # Quadtree over a gray image: blocks of the largest die are split into quadrants while their gray levels vary
+    # more than `threshold`, down to `dice_size`. Each level is handled for all of its blocks at once, and the
+    # statistics of any block are four lookups in the summed-area tables. Blocks reaching past the padded canvas
+    # are split until they fit, so the edges are covered by whole dice.
+    array = pad_to_cells(array, dice_size)
+    tables = summed_area_tables(array, dice_size)
+    rows, cols = tables.shape[1] - 1, tables.shape[2] - 1
+    # The largest block must fit in the canvas at least once, or a strip narrower than it would have no valid corner
+    # to read its sums from.
+    levels = max(0, min(levels, min(rows, cols).bit_length() - 1))
+    span = 1 << levels
+    ys, xs = (axis.ravel() for axis in np.mgrid[0:rows:span, 0:cols:span])
+    parts = []
+    for level in range(levels, -1, -1):
+        check_cancelled(cancel_token)
+        span = 1 << level
+        inside = (ys < rows) & (xs < cols)
+        ys, xs = ys[inside], xs[inside]
+        fits = (ys + span <= rows) & (xs + span <= cols)
+        sums, squares = block_sums(tables, np.minimum(ys, rows - span), np.minimum(xs, cols - span), span)
+        area = (span * dice_size) ** 2
+        means = sums / area
+        leaves = fits & ((level == 0) | (squares / area - means * means <= threshold * threshold))
+        parts.append((ys[leaves], xs[leaves], span, means[leaves]))
+        offsets = QUADRANTS * (span // 2)
+        ys = (ys[~leaves, None] + offsets[:, 0]).ravel()
+        xs = (xs[~leaves, None] + offsets[:, 1]).ravel()
+
+    return DiceLayout(
+        np.concatenate([part_ys for part_ys, _, _, _ in parts]) * dice_size,
+        np.concatenate([part_xs for _, part_xs, _, _ in parts]) * dice_size,
+        np.concatenate([np.full(len(part_ys), part_span * dice_size) for part_ys, _, part_span, _ in parts]),
+        means_to_faces(np.concatenate([means for _, _, _, means in parts])),
+        (array.shape[1], array.shape[0]),
+    )
+
+
+def render_layout(layout, face_stacks, progress_callback=None, cancel_token=None, out=None):
+    # `face_stacks` maps every die size of the layout to its stack of faces.
+    width, height = layout.canvas_size
+    if out is None:
+        output = np.full((height, width), BACKGROUND_COLOR, dtype=np.uint8)
+    elif out.shape != (height, width):
+        raise ValueError(f"Expected an output array of shape {(height, width)}, got {out.shape}")
+    else:
+        output = out
+    dice_sizes = layout.dice_sizes
+    for step, dice_size in enumerate(dice_sizes):
+        check_cancelled(cancel_token)
+        # Dice of one size sit on multiples of that size, so they are whole blocks of this view of the canvas.
+        rows, cols = height // dice_size, width // dice_size
+        blocks = output[: rows * dice_size, : cols * dice_size].reshape(rows, dice_size, cols, dice_size)
+        selected = layout.sizes == dice_size
+        faces = layout.faces[selected].astype(np.intp) - 1
+        blocks[layout.ys[selected] // dice_size, :, layout.xs[selected] // dice_size, :] = face_stacks[dice_size][faces]
+        if progress_callback:
+            progress_callback(int((step + 1) / len(dice_sizes) * 100))
+    return output
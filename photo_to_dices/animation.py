@@ -0,0 +1,173 @@
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageOps, ImageSequence
+
+from photo_to_dices.dice_grid import BACKGROUND_COLOR, DEFAULT_MAPPING, check_cancelled, compute_face_grid
+from photo_to_dices.encoders import DEFAULT_COMPRESS_LEVEL
+from photo_to_dices.metrics import timed
+from photo_to_dices.pipeline_cache import scale_image
+from photo_to_dices.preview import preview_face_grid
+
+ANIMATION_FORMATS = ("gif", "webp", "frames")
+ANIMATION_SUFFIXES = {"gif": ".gif", "webp": ".webp", "frames": "_frames"}
+# Formats written as a directory rather than a single file.
+DIRECTORY_ANIMATION_FORMATS = ("frames",)
+DEFAULT_FRAME_DURATION = 100
+FRAMES_PER_CHUNK = 8
+# Chunks in flight per worker: enough to keep every worker busy without decoding a long clip ahead into memory.
+CHUNKS_PER_WORKER = 2
+
+
+def iter_frames(image, durations=None):
+    # Pillow composites GIF and APNG frames onto the ones before them, so each frame is a complete picture.
+    # Seeking to a GIF frame decodes the ones before it, so the duration of every frame is appended to `durations`
+    # as it is decoded instead of in a pass of its own.
+    for frame in ImageSequence.Iterator(image):
+        if durations is not None:
+            durations.append(frame.info.get("duration") or DEFAULT_FRAME_DURATION)
+        yield np.asarray(ImageOps.grayscale(frame))
+
+
+def frame_face_grid(frame, scale, dice_size, mapping=DEFAULT_MAPPING, fast_decode=False):
+    # Every frame is equalized on its own, exactly as a still photo would be.
+    equalized = np.asarray(ImageOps.equalize(Image.fromarray(frame, "L")))
+    if fast_decode:
+        return preview_face_grid(equalized, scale, dice_size, mapping)
+    processed = scale_image(equalized, scale) if scale > 1 else equalized
+    return compute_face_grid(processed, dice_size, mapping)
+
+
+def _face_grid_chunk(frames, scale, dice_size, mapping, fast_decode):
+    return [frame_face_grid(frame, scale, dice_size, mapping, fast_decode) for frame in frames]
+
+
+def iter_face_grids(frames, scale, dice_size, mapping=DEFAULT_MAPPING, fast_decode=False, workers=1):
+    # Yields the face grid of every frame in order. With several workers, chunks of frames are converted
+    # concurrently and their results handed out in submission order.
+    if workers <= 1:
+        for frame in frames:
+            yield frame_face_grid(frame, scale, dice_size, mapping, fast_decode)
+        return
+
+    frames = iter(frames)
+    executor = ProcessPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        while chunk := list(islice(frames, FRAMES_PER_CHUNK)):
+            pending.append(executor.submit(_face_grid_chunk, chunk, scale, dice_size, mapping, fast_decode))
+            if len(pending) >= workers * CHUNKS_PER_WORKER:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+class FrameCompositor:
+    # Holds the previous frame's canvas and face grid; each new grid only redraws the dice whose face changed.
+    def __init__(self, face_stack, width, height):
+        self.face_stack = face_stack
+        self.canvas = np.full((height, width), BACKGROUND_COLOR, dtype=np.uint8)
+        self.face_grid = None
+
+    def update(self, face_grid):
+        dice_size = self.face_stack.shape[1]
+        rows, cols = face_grid.shape
+        if self.face_grid is None:
+            changed_rows, changed_cols = np.nonzero(np.ones_like(face_grid, dtype=bool))
+        else:
+            changed_rows, changed_cols = np.nonzero(face_grid != self.face_grid)
+        # Splitting both axes is always a view, so these writes land in the canvas itself.
+        blocks = self.canvas[: rows * dice_size, : cols * dice_size].reshape(rows, dice_size, cols, dice_size)
+        faces = face_grid[changed_rows, changed_cols].astype(np.intp) - 1
+        blocks[changed_rows, :, changed_cols, :] = self.face_stack[faces]
+        self.face_grid = face_grid
+        return len(changed_rows)
+
+
+def save_animation(
+    image,
+    path,
+    face_stack,
+    scale,
+    output_format="gif",
+    workers=1,
+    compress_level=None,
+    mapping=DEFAULT_MAPPING,
+    fast_decode=False,
+    progress_callback=None,
+    cancel_token=None,
+    metrics=None,
+):
+    # Converts every frame of a multi-frame image and writes an animated GIF or WebP, or a directory of numbered
+    # PNG frames. Returns (face grid of the last frame, bytes written).
+    path = Path(path)
+    dice_size = face_stack.shape[1]
+    # Counting frames only walks their headers. Frame i is decoded, and its duration known, before frame i is handed
+    # to the encoder, and both encoders read durations[i] only after pulling frame i.
+    frame_count = getattr(image, "n_frames", 1)
+    durations = []
+    compositor = FrameCompositor(face_stack, image.width * scale, image.height * scale)
+    face_grids = iter_face_grids(iter_frames(image, durations), scale, dice_size, mapping, fast_decode, workers)
+    # The encoders pull frames while they write; the grid and composite time spent inside them is taken out of "save".
+    produce_seconds = 0.0
+
+    def dice_frames():
+        nonlocal produce_seconds
+        for index in range(frame_count):
+            check_cancelled(cancel_token)
+            start = time.perf_counter()
+            with timed(metrics, "grid"):
+                face_grid = next(face_grids)
+            with timed(metrics, "composite"):
+                changed = compositor.update(face_grid)
+                frame = Image.fromarray(compositor.canvas.copy(), "L")
+            produce_seconds += time.perf_counter() - start
+            if metrics is not None:
+                metrics.count("frames")
+                metrics.count("dice_changed", changed)
+            if progress_callback:
+                progress_callback(int((index + 1) / frame_count * 100))
+            yield frame
+
+    compress_level = DEFAULT_COMPRESS_LEVEL if compress_level is None else compress_level
+    try:
+        frames = dice_frames()
+        with timed(metrics, "save"):
+            if output_format in DIRECTORY_ANIMATION_FORMATS:
+                shutil.rmtree(path, ignore_errors=True)
+                path.mkdir(parents=True)
+                bytes_written = 0
+                for index, frame in enumerate(frames):
+                    frame_path = path / f"{index:06d}.png"
+                    frame.save(frame_path, "PNG", compress_level=compress_level)
+                    bytes_written += frame_path.stat().st_size
+            else:
+                first = next(frames)
+                # Lossless WebP suits flat dice faces and is smaller than lossy at a quality that keeps pips sharp.
+                options = {"lossless": True} if output_format == "webp" else {}
+                # A GIF without a loop count plays once. WebP always stores a count, where 1 means a single play.
+                if "loop" in image.info:
+                    options["loop"] = image.info["loop"]
+                elif output_format == "webp":
+                    options["loop"] = 1
+                first.save(
+                    path, output_format.upper(), save_all=True, append_images=frames, duration=durations, **options
+                )
+                bytes_written = path.stat().st_size
+        if metrics is not None:
+            metrics.stage_seconds["save"] -= produce_seconds
+    except BaseException:
+        face_grids.close()
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+        raise
+    return compositor.face_grid, bytes_written
@@ -1,69 +1,799 @@
 import logging
+from contextlib import ExitStack
+from dataclasses import replace
 from pathlib import Path
 from PIL import Image, ImageOps
 import numpy as np
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+from photo_to_dices.adaptive import (
+    ADAPTIVE_LEVELS,
+    ADAPTIVE_THRESHOLD,
+    DEFAULT_LAYOUT,
+    LAYOUTS,
+    adaptive_layout,
+    check_layout,
+    render_layout,
+)
+from photo_to_dices.animation import ANIMATION_FORMATS, ANIMATION_SUFFIXES, DIRECTORY_ANIMATION_FORMATS, save_animation
+from photo_to_dices.decoding import decode_face_grid
+from photo_to_dices.dice_art import DiceArt, canvas_array, canvas_shape, open_source
+from photo_to_dices.dice_grid import (
+    DEFAULT_MAPPING,
+    LOCAL_MAPPINGS,
+    MAPPINGS,
+    check_cancelled,
+    check_mapping,
+    compute_face_grid,
+    grid_shape,
+    render_face_grid,
+)
+from photo_to_dices.encoders import (
+    DEFAULT_COMPRESS_LEVEL,
+    FORMAT_SUFFIXES,
+    OUTPUT_FORMATS,
+    STREAMING_FORMATS,
+    check_compress_level,
+    open_stream_writer,
+    save_image,
+)
+from photo_to_dices.face_atlas import DEFAULT_FACE_SET, face_atlas, load_face_images
+from photo_to_dices.grid_file import DEFAULT_BITS, GRID_FILE_SUFFIX, file_sha256, save_face_grid
+from photo_to_dices.metrics import ConversionMetrics
+from photo_to_dices.output_store import OutputStore
+from photo_to_dices.palette import DEFAULT_PALETTE, PALETTES, Palette
+from photo_to_dices.parallel import default_worker_count, render_parallel
+from photo_to_dices.pipeline_cache import (
+    equalize_color_image,
+    equalize_image,
+    scale_image,
+    source_identity,
+    source_sha256,
+)
+from photo_to_dices.preview import DEFAULT_PREVIEW_SIZE, preview_face_grid, render_preview
+from photo_to_dices.render_options import DEFAULT_DICE_WIDTH, DEFAULT_ENGINE, DEFAULT_WORKERS, RenderOptions
+from photo_to_dices.streaming import equalize_lut, stream_dice_rows
+from photo_to_dices.tiles import TILE_FORMATS, TILE_SUFFIXES, DeepZoomPyramid
+from photo_to_dices.vector import VECTOR_FORMATS, VECTOR_SUFFIXES, save_vector
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".gif"}
+# Inputs that are converted frame by frame into an animation unless another output format is asked for.
+ANIMATED_EXTENSIONS = {".gif"}
+# Applications configure logging themselves (see the GUI and CLI entry points); the library only emits records.
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+# Outputs in the output directory are named after their source with this prefix.
+OUTPUT_PREFIX = "dice-"
+OUTPUT_SUFFIXES = {**FORMAT_SUFFIXES, **VECTOR_SUFFIXES, **TILE_SUFFIXES, **ANIMATION_SUFFIXES}
+# Stored outputs have no source name to borrow an extension from.
+STORE_SUFFIXES = {"jpeg": ".jpg", **OUTPUT_SUFFIXES}
+# Formats written straight from the face grid, without compositing a raster.
+GRID_FORMATS = VECTOR_FORMATS + TILE_FORMATS
+# Formats written as a directory tree, which the output store does not hold.
+DIRECTORY_FORMATS = TILE_FORMATS + DIRECTORY_ANIMATION_FORMATS
+
+logger = logging.getLogger(__name__)
 
 
 class ArtGenerator:
     DICE_IMAGE_SIZE_THRESHOLD = 20
-    DEFAULT_DICE_WIDTH = 300
+    DEFAULT_DICE_WIDTH = DEFAULT_DICE_WIDTH
+    DEFAULT_ENGINE = DEFAULT_ENGINE
+    ENGINES = ("vectorized", "legacy", "streaming")
+    DEFAULT_WORKERS = DEFAULT_WORKERS
+    DEFAULT_MAPPING = DEFAULT_MAPPING
+    MAPPINGS = MAPPINGS
+    DEFAULT_PALETTE = DEFAULT_PALETTE
+    PALETTES = tuple(PALETTES)
+    DEFAULT_LAYOUT = DEFAULT_LAYOUT
+    LAYOUTS = LAYOUTS
+    ADAPTIVE_LEVELS = ADAPTIVE_LEVELS
+    ADAPTIVE_THRESHOLD = ADAPTIVE_THRESHOLD
+    OUTPUT_FORMATS = OUTPUT_FORMATS + GRID_FORMATS + ANIMATION_FORMATS
 
-    def __init__(self, output_dir_path="~/tmp/"):
+    def __init__(self, output_dir_path="~/tmp/", face_set=DEFAULT_FACE_SET, pipeline_cache=None, output_store=None):
+        self.face_set = Path(face_set)
+        # A PipelineCache keeps the intermediates of recent photos, so converting one again with other settings skips
+        # the stages those settings leave alone. Off by default: one-off conversions would only hold memory; the GUI
+        # passes the shared `pipeline_cache.pipeline_cache`.
+        self.pipeline_cache = pipeline_cache
+        # With an OutputStore (or its directory), outputs are filed under a hash of the source and the parameters
+        # instead of `dice-<name>` in the output directory. DeepZoom trees and frame sequences are always written to
+        # the output directory.
+        if output_store is not None and not isinstance(output_store, OutputStore):
+            output_store = OutputStore(output_store)
+        self.output_store = output_store
         self.output_dir = Path(output_dir_path).expanduser()
         self.output_dir.mkdir(parents=True, exist_ok=True)
-        logging.info(f"Output directory set to: {self.output_dir}")
+        logger.info(f"Output directory set to: {self.output_dir}")
+
+    def output_format_for(self, options=RenderOptions(), image_path=None):
+        output_format, engine = options.output_format, options.engine
+        if output_format is None:
+            if engine == "streaming":
+                return "png"
+            if (
+                engine == "vectorized"
+                and image_path is not None
+                and Path(image_path).suffix.lower() in ANIMATED_EXTENSIONS
+            ):
+                # Other palettes and layouts only convert stills; PNG keeps the first frame under its own suffix
+                # rather than writing JPEG data to `dice-<name>.gif`.
+                if options.palette != DEFAULT_PALETTE or options.layout != DEFAULT_LAYOUT:
+                    return "png"
+                return "gif"
+            return "jpeg"
+        if output_format not in self.OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format {output_format!r}, expected one of {self.OUTPUT_FORMATS}")
+        if engine == "streaming" and output_format not in STREAMING_FORMATS:
+            raise ValueError(f"The streaming engine can only write {STREAMING_FORMATS}, got {output_format!r}")
+        if engine == "legacy" and output_format in GRID_FORMATS + ANIMATION_FORMATS:
+            raise ValueError(f"The legacy engine cannot write {output_format} output")
+        return output_format
+
+    def output_path_for(self, image_path, options=RenderOptions()):
+        image_path = Path(image_path)
+        output_format = self.output_format_for(options, image_path)
+        if output_format in OUTPUT_SUFFIXES:
+            return self.output_dir / f"{OUTPUT_PREFIX}{image_path.stem}{OUTPUT_SUFFIXES[output_format]}"
+        return self.output_dir / f"{OUTPUT_PREFIX}{image_path.name}"
+
+    def grid_path_for(self, image_path):
+        return self.output_dir / f"{OUTPUT_PREFIX}{Path(image_path).stem}{GRID_FILE_SUFFIX}"
+
+    def _save_grid(self, image_path, face_grid, dice_size, canvas_size, metrics, palette=None):
+        bits = max(DEFAULT_BITS, palette.face_count.bit_length()) if palette is not None else DEFAULT_BITS
+        with metrics.stage("save"):
+            grid_file_path = save_face_grid(
+                self.grid_path_for(image_path), face_grid, dice_size, canvas_size, file_sha256(image_path), bits
+            )
+        metrics.count("bytes_written", grid_file_path.stat().st_size)
+        logger.info(f"Dice grid saved to: {grid_file_path}")
+
+    def dice_size_for(self, image_width, dice_width=DEFAULT_DICE_WIDTH):
+        return max(self.DICE_IMAGE_SIZE_THRESHOLD, int(image_width / dice_width))
 
     def _get_dice_images(self, dice_size):
-        package_directory = Path(__file__).parent
-        dice_images = []
-        for i in range(1, 7):
-            dice_path = package_directory / "dice" / f"{i}.png"
-            logging.debug(f"Loading dice image: {dice_path}")  # Changed to debug
-            dice_image = Image.open(dice_path)
-            dice_image = dice_image.resize((dice_size, dice_size), Image.Resampling.LANCZOS)
-            dice_images.append(dice_image)
-        return dice_images
-
-    def convert_to_dice_art(self, image_path, scale=1, dice_width=DEFAULT_DICE_WIDTH, progress_callback=None):
-        logging.info(f"Starting dice art conversion for: {image_path}")
+        return load_face_images(dice_size, self.face_set)
+
+    def _get_face_stack(self, dice_size):
+        return face_atlas.get(dice_size, self.face_set)
+
+    def _palette_for(self, palette):
+        # The default palette is the plain face set, which every engine and format handles without a lookup table.
+        return None if palette == DEFAULT_PALETTE else Palette(palette, self.face_set)
+
+    def convert_to_dice_art(
+        self,
+        image_path,
+        scale=1,
+        dice_width=DEFAULT_DICE_WIDTH,
+        progress_callback=None,
+        engine=DEFAULT_ENGINE,
+        workers=DEFAULT_WORKERS,
+        save_grid=False,
+        cancel_token=None,
+        metrics=None,
+        output_format=None,
+        compress_level=None,
+        fast_decode=False,
+        mapping=DEFAULT_MAPPING,
+        palette=DEFAULT_PALETTE,
+        layout=DEFAULT_LAYOUT,
+    ):
+        # `mapping` picks how block means become faces: "flat" quantizes each die on its own, "bayer" and
+        # "floyd-steinberg" dither so gradients keep their tone with fewer dice.
+        # `palette` builds the piece from several dice sets, such as "black-white" or "colors" (see `palette.Palette`);
+        # each die takes the perceptually nearest face of any set, and `metrics` counts the dice of every set
+        # under "dice:<set>".
+        # `layout="adaptive"` lets flat areas take larger dice: blocks of up to 2 ** ADAPTIVE_LEVELS dice are split
+        # while their gray levels vary more than ADAPTIVE_THRESHOLD, and the dice of every size are counted under
+        # "dice:<size>px". The canvas is rounded up to whole dice so the edges are covered.
+        # `fast_decode` builds the face grid from a JPEG draft or reduced decode of the source, which is much faster
+        # for large photos but may pick a different face for a few dice near a threshold.
+        # `output_format` trades file size for encode speed (see `encoders.OUTPUT_FORMATS`); the default is JPEG,
+        # or PNG for the streaming engine. `compress_level` sets the zlib level of the PNG and TIFF formats.
+        # Pass a ConversionMetrics to read per-stage timings, counters and optional profiles after the call.
+        options = RenderOptions(
+            scale=scale,
+            dice_width=dice_width,
+            engine=engine,
+            workers=workers,
+            mapping=mapping,
+            palette=palette,
+            layout=layout,
+            output_format=output_format,
+            compress_level=compress_level,
+            fast_decode=fast_decode,
+            save_grid=save_grid,
+        )
+        return self.convert(image_path, options, progress_callback, cancel_token, metrics)
+
+    def convert(self, image_path, options=RenderOptions(), progress_callback=None, cancel_token=None, metrics=None):
+        # `convert_to_dice_art` with its settings bundled in a RenderOptions; returns (output path, dice count).
+        metrics = metrics if metrics is not None else ConversionMetrics()
+        with metrics.capture():
+            result = self._convert(image_path, options, progress_callback, cancel_token, metrics)
+        if result[0] is not None:
+            logger.info(f"Stage timings: {metrics.summary()}")
+        return result
+
+    def _convert(self, image_path, options, progress_callback, cancel_token, metrics):
+        if options.engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine {options.engine!r}, expected one of {self.ENGINES}")
+        # From here on the output format is resolved, and so is the worker count below.
+        options = replace(options, output_format=self.output_format_for(options, image_path))
+        output_format, layout = options.output_format, options.layout
+        check_compress_level(output_format, options.compress_level)
+        animated = output_format in ANIMATION_FORMATS
+        options, palette = self._check_options(options, animated)
+        if layout != DEFAULT_LAYOUT and output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"The {layout} layout can only be written as {OUTPUT_FORMATS}, got {output_format!r}")
+        if layout != DEFAULT_LAYOUT and options.save_grid:
+            raise ValueError(f"A dice grid file holds a uniform grid and cannot be saved for the {layout} layout")
+        if options.workers > 1 and output_format in GRID_FORMATS:
+            raise ValueError(f"{output_format} output has no composite to render in parallel workers")
+        if options.save_grid and animated:
+            raise ValueError("A dice grid file holds a single frame and cannot be saved for an animation")
+        if palette is not None and output_format not in palette.output_formats:
+            raise ValueError(
+                f"The {options.palette} palette cannot be written as {output_format}, "
+                f"expected one of {palette.output_formats}"
+            )
+
+        logger.info(f"Starting dice art conversion for: {image_path}")
         try:
-            input_image = Image.open(image_path)
+            with metrics.stage("open"):
+                input_image = Image.open(image_path)
         except FileNotFoundError:
-            logging.error(f"Image not found at: {image_path}")
+            logger.error(f"Image not found at: {image_path}")
             return None, None
 
-        image_name = Path(image_path).name
+        store_key = None
+        if self.output_store is not None and output_format not in DIRECTORY_FORMATS:
+            store_key = self.store_key_for(image_path, options)
+            stored = self.output_store.lookup(store_key)
+            if stored is not None:
+                input_image.close()
+                if options.save_grid:
+                    # The store holds only the output, so the grid is computed again, without compositing or encoding.
+                    face_grid, dice_size, canvas_size = self.face_grid(
+                        image_path,
+                        options.scale,
+                        options.dice_width,
+                        options.fast_decode,
+                        metrics,
+                        options.mapping,
+                        options.palette,
+                    )
+                    self._save_grid(image_path, face_grid, dice_size, canvas_size, metrics, palette)
+                return self._stored_result(stored, progress_callback, metrics)
+            output_file_path = self.output_store.temporary_path(STORE_SUFFIXES[output_format])
+        else:
+            output_file_path = self.output_path_for(image_path, options)
+
+        dice_size = self.dice_size_for(input_image.width, options.dice_width)
+        logger.info(f"Calculated dice size: {dice_size}")
+
+        identity = source_identity(image_path) if self.pipeline_cache is not None else None
+        bytes_written = None
+        try:
+            if options.engine == "streaming":
+                face_grid, canvas_size = self._write_streaming(
+                    input_image, output_file_path, dice_size, options, progress_callback, cancel_token, metrics
+                )
+            elif animated:
+                # Only the dice whose face changed since the previous frame are redrawn.
+                logger.info(
+                    f"Converting {getattr(input_image, 'n_frames', 1)} frames with {options.workers} worker(s)."
+                )
+                canvas_size = (input_image.width * options.scale, input_image.height * options.scale)
+                face_grid, bytes_written = save_animation(
+                    input_image,
+                    output_file_path,
+                    self._get_face_stack(dice_size),
+                    options.scale,
+                    output_format,
+                    options.workers,
+                    options.compress_level,
+                    options.mapping,
+                    options.fast_decode,
+                    progress_callback,
+                    cancel_token,
+                    metrics,
+                )
+            elif output_format in GRID_FORMATS:
+                face_grid, canvas_size, bytes_written = self._write_from_grid(
+                    input_image,
+                    output_file_path,
+                    identity,
+                    dice_size,
+                    options,
+                    progress_callback,
+                    cancel_token,
+                    metrics,
+                )
+            else:
+                face_grid, canvas_size = self._write_raster(
+                    input_image,
+                    output_file_path,
+                    identity,
+                    dice_size,
+                    options,
+                    palette,
+                    progress_callback,
+                    cancel_token,
+                    metrics,
+                )
+        except BaseException:
+            if store_key is not None:
+                output_file_path.unlink(missing_ok=True)
+            raise
+
+        if progress_callback:
+            progress_callback(100)
+
+        total_dice_count = face_grid.size
+        metrics.count("dice", total_dice_count)
+        metrics.count("bytes_written", output_file_path.stat().st_size if bytes_written is None else bytes_written)
+        logger.info(f"Total dice used: {total_dice_count}")
+        dice_by_color = palette.dice_counts(face_grid) if palette is not None else {}
+        dice_by_size = face_grid.dice_counts() if layout != DEFAULT_LAYOUT else {}
+        for label, count in {**dice_by_color, **dice_by_size}.items():
+            metrics.count(f"dice:{label}", count)
+        if dice_by_color:
+            logger.info(f"Dice per set: {dice_by_color}")
+        if dice_by_size:
+            logger.info(f"Dice per size: {dice_by_size}")
+        if store_key is not None:
+            output_file_path = self.output_store.store(
+                store_key,
+                output_file_path,
+                STORE_SUFFIXES[output_format],
+                source=str(Path(image_path).resolve()),
+                dice=total_dice_count,
+                dice_size=dice_size,
+                canvas_size=list(canvas_size),
+                dice_by_color=dice_by_color,
+                dice_by_size=dice_by_size,
+            )
+        logger.info(f"Dice art saved to: {output_file_path}")
+        if options.save_grid:
+            self._save_grid(image_path, face_grid, dice_size, canvas_size, metrics, palette)
+        return str(output_file_path), total_dice_count
+
+    def _check_options(self, options, animated=False):
+        # Returns the options with their worker count resolved, and the Palette (None for the default palette).
+        # Animations spread whole frames across workers, so any mapping and fast_decode work there.
+        engine, mapping, layout = options.engine, options.mapping, options.layout
+        workers, fast_decode = options.workers, options.fast_decode
+        if workers is None:
+            workers = default_worker_count()
+        if workers < 1:
+            raise ValueError(f"workers must be at least 1, got {workers}")
+        if workers > 1 and engine != "vectorized":
+            raise ValueError(f"The {engine} engine does not support parallel workers")
+        if fast_decode and (engine != "vectorized" or (workers > 1 and not animated)):
+            raise ValueError("fast_decode only applies to the vectorized engine with a single worker")
+        check_mapping(mapping)
+        if engine == "legacy" and mapping != DEFAULT_MAPPING:
+            raise ValueError(f"The legacy engine only supports the {DEFAULT_MAPPING} mapping")
+        if workers > 1 and mapping not in LOCAL_MAPPINGS and not animated:
+            raise ValueError(f"The {mapping} mapping needs the whole grid and cannot be split across workers")
+        palette = self._palette_for(options.palette)
+        if palette is not None and (engine != "vectorized" or workers > 1 or fast_decode or mapping != DEFAULT_MAPPING):
+            raise ValueError(
+                f"The {options.palette} palette needs the vectorized engine with one worker, an exact decode "
+                f"and the {DEFAULT_MAPPING} mapping"
+            )
+        check_layout(layout)
+        if layout != DEFAULT_LAYOUT and (
+            engine != "vectorized" or workers > 1 or fast_decode or mapping != DEFAULT_MAPPING or palette is not None
+        ):
+            raise ValueError(
+                f"The {layout} layout needs the vectorized engine with one worker, an exact decode, "
+                f"the {DEFAULT_MAPPING} mapping and the {DEFAULT_PALETTE} palette"
+            )
+        return replace(options, workers=workers), palette
+
+    def store_key_for(self, image_path, options=RenderOptions()):
+        # Every engine writes the same pixels, so the engine only picks the default format and is not part of the key;
+        # neither are the worker count and save_grid, which leave the output alone.
+        return OutputStore.key_for(
+            source_sha256(source_identity(image_path)),
+            scale=options.scale,
+            dice_width=options.dice_width,
+            face_set=self.face_set.resolve(),
+            output_format=self.output_format_for(options, image_path),
+            compress_level=options.compress_level,
+            fast_decode=bool(options.fast_decode),
+            mapping=options.mapping,
+            palette=options.palette,
+            layout=options.layout,
+        )
+
+    def _stored_result(self, stored, progress_callback, metrics):
+        output_file_path, record = stored
+        if progress_callback:
+            progress_callback(100)
+        metrics.count("dice", record["dice"])
+        for label, count in {**record.get("dice_by_color", {}), **record.get("dice_by_size", {})}.items():
+            metrics.count(f"dice:{label}", count)
+        metrics.count("store_hits")
+        logger.info(f"Dice art already stored at: {output_file_path}")
+        return str(output_file_path), record["dice"]
+
+    def preview(
+        self,
+        image_path,
+        scale=1,
+        dice_width=DEFAULT_DICE_WIDTH,
+        max_size=DEFAULT_PREVIEW_SIZE,
+        mapping=DEFAULT_MAPPING,
+        palette=DEFAULT_PALETTE,
+        cancel_token=None,
+    ):
+        # A set `cancel_token` raises ConversionCancelled between stages, so superseded previews stop early.
+        check_mapping(mapping)
+        palette = self._palette_for(palette)
+        if palette is not None and mapping != DEFAULT_MAPPING:
+            raise ValueError(f"The {palette.name} palette only supports the {DEFAULT_MAPPING} mapping")
+        color = palette is not None and palette.mode == "RGB"
+        with Image.open(image_path) as input_image:
+            dice_size = self.dice_size_for(input_image.width, dice_width)
+            if self.pipeline_cache is not None:
+                equalized = self.pipeline_cache.equalized(source_identity(image_path), input_image, color=color)
+            else:
+                equalized = equalize_color_image(input_image) if color else equalize_image(input_image)
+
+        check_cancelled(cancel_token)
+        face_grid = preview_face_grid(equalized, scale, dice_size, mapping, palette)
+        check_cancelled(cancel_token)
+        return render_preview(face_grid, max_size, self.face_set, palette, cancel_token), face_grid.size
+
+    def face_grid(
+        self,
+        image,
+        scale=1,
+        dice_width=DEFAULT_DICE_WIDTH,
+        fast_decode=False,
+        metrics=None,
+        mapping=DEFAULT_MAPPING,
+        palette=DEFAULT_PALETTE,
+    ):
+        # Computes only the face grid of any source `render` accepts; returns (face_grid, dice_size, canvas_size).
+        check_mapping(mapping)
+        palette = self._palette_for(palette)
+        if palette is not None and (fast_decode or mapping != DEFAULT_MAPPING):
+            raise ValueError(f"The {palette.name} palette needs an exact decode and the {DEFAULT_MAPPING} mapping")
+        metrics = metrics if metrics is not None else ConversionMetrics()
+        with ExitStack() as stack:
+            with metrics.stage("open"):
+                input_image = stack.enter_context(open_source(image))
+            dice_size = self.dice_size_for(input_image.width, dice_width)
+            canvas_size = (input_image.width * scale, input_image.height * scale)
+            identity = None
+            if self.pipeline_cache is not None and isinstance(image, (str, Path)):
+                identity = source_identity(image)
+            if palette is not None:
+                face_grid = self._palette_face_grid(input_image, identity, scale, dice_size, palette, metrics)
+            elif fast_decode:
+                face_grid = self._decoded_face_grid(input_image, identity, scale, dice_size, metrics, mapping)
+            else:
+                processed_array = self._processed_array(input_image, identity, scale, metrics)
+                face_grid = self._exact_face_grid(processed_array, identity, scale, dice_size, metrics, mapping)
+        return face_grid, dice_size, canvas_size
+
+    def render(
+        self,
+        image,
+        scale=1,
+        dice_width=DEFAULT_DICE_WIDTH,
+        progress_callback=None,
+        engine=DEFAULT_ENGINE,
+        workers=DEFAULT_WORKERS,
+        cancel_token=None,
+        metrics=None,
+        fast_decode=False,
+        mapping=DEFAULT_MAPPING,
+        palette=DEFAULT_PALETTE,
+        layout=DEFAULT_LAYOUT,
+        out=None,
+    ):
+        # Converts without touching the disk and returns a DiceArt holding the face grid and the rendered canvas.
+        # `image` is a path, a binary file object, encoded bytes, a PIL image or a uint8 array of pixels. With `out`,
+        # a writable buffer the size of `canvas_shape(width, height, scale)` such as a SharedMemory block's `buf`, the
+        # canvas is rendered straight into it. Call `DiceArt.save` to also write the piece to a file.
+        if engine not in ("vectorized", "legacy"):
+            raise ValueError(f"The {engine} engine writes straight to disk; render needs vectorized or legacy")
+        options = RenderOptions(
+            scale=scale,
+            dice_width=dice_width,
+            engine=engine,
+            workers=workers,
+            mapping=mapping,
+            palette=palette,
+            layout=layout,
+            fast_decode=fast_decode,
+        )
+        options, palette = self._check_options(options)
+        metrics = metrics if metrics is not None else ConversionMetrics()
+        with metrics.capture(), ExitStack() as stack:
+            with metrics.stage("open"):
+                input_image = stack.enter_context(open_source(image))
+            identity = None
+            if self.pipeline_cache is not None and isinstance(image, (str, Path)):
+                identity = source_identity(image)
+            dice_size = self.dice_size_for(input_image.width, dice_width)
+            if out is not None:
+                mode = palette.mode if palette is not None else "L"
+                adaptive_size = dice_size if layout != DEFAULT_LAYOUT else None
+                out = canvas_array(out, canvas_shape(input_image.width, input_image.height, scale, mode, adaptive_size))
+            pixels, face_grid = self._render(
+                input_image, identity, dice_size, options, palette, progress_callback, cancel_token, metrics, out
+            )
+            # The legacy engine and parallel workers build their own canvas.
+            if out is not None and pixels is not out:
+                out[...] = pixels
+                pixels = out
+        if progress_callback:
+            progress_callback(100)
+        metrics.count("dice", face_grid.size)
+        dice_by_color = palette.dice_counts(face_grid) if palette is not None else {}
+        dice_by_size = face_grid.dice_counts() if layout != DEFAULT_LAYOUT else {}
+        for label, count in {**dice_by_color, **dice_by_size}.items():
+            metrics.count(f"dice:{label}", count)
+        logger.info(f"Rendered {face_grid.size} dice of the {options.palette} palette in memory.")
+        return DiceArt(pixels, face_grid, dice_size, dice_by_color)
+
+    def _write_streaming(
+        self, input_image, output_file_path, dice_size, options, progress_callback, cancel_token, metrics
+    ):
+        # Only the grayscale source is held in memory; the equalized, scaled image and the dice art
+        # exist one dice row at a time and are written straight into a PNG or tiled TIFF stream.
+        with metrics.stage("open"):
+            input_image.load()
+        with metrics.stage("grayscale"):
+            gray_image = ImageOps.grayscale(input_image)
+        input_image.close()
+        with metrics.stage("equalize"):
+            lut = equalize_lut(gray_image.histogram())
+        face_stack = self._get_face_stack(dice_size)
 
-        dice_size = int(input_image.width / dice_width)
-        if dice_size < self.DICE_IMAGE_SIZE_THRESHOLD:
-            dice_size = self.DICE_IMAGE_SIZE_THRESHOLD
-        logging.info(f"Calculated dice size: {dice_size}")
+        scale = options.scale
+        canvas_size = (gray_image.width * scale, gray_image.height * scale)
+        with open_stream_writer(
+            output_file_path, *canvas_size, options.output_format, options.compress_level
+        ) as writer:
+            face_grid = stream_dice_rows(
+                gray_image, lut, scale, face_stack, writer, progress_callback, cancel_token, metrics, options.mapping
+            )
+        return face_grid, canvas_size
+
+    def _write_from_grid(
+        self, input_image, output_file_path, identity, dice_size, options, progress_callback, cancel_token, metrics
+    ):
+        # Every die of a face is identical, so vector documents reference six embedded faces and tile pyramids
+        # render each tile from a face atlas on demand; only the face grid is ever computed.
+        scale, mapping = options.scale, options.mapping
+        canvas_size = (input_image.width * scale, input_image.height * scale)
+        if options.fast_decode:
+            face_grid = self._decoded_face_grid(input_image, identity, scale, dice_size, metrics, mapping)
+        else:
+            processed_array = self._processed_array(input_image, identity, scale, metrics)
+            check_cancelled(cancel_token)
+            face_grid = self._exact_face_grid(processed_array, identity, scale, dice_size, metrics, mapping)
+        check_cancelled(cancel_token)
+        logger.info(f"Computed a {face_grid.shape[0]}x{face_grid.shape[1]} dice grid.")
 
-        dice_faces = self._get_dice_images(dice_size)
+        with metrics.stage("save"):
+            if options.output_format in TILE_FORMATS:
+                pyramid = DeepZoomPyramid(face_grid, dice_size, canvas_size, self.face_set)
+                bytes_written = pyramid.export(
+                    output_file_path,
+                    DEFAULT_COMPRESS_LEVEL if options.compress_level is None else options.compress_level,
+                    progress_callback=progress_callback,
+                    cancel_token=cancel_token,
+                )
+            else:
+                save_vector(
+                    output_file_path,
+                    face_grid,
+                    dice_size,
+                    canvas_size,
+                    options.output_format,
+                    self.face_set,
+                    options.compress_level,
+                    progress_callback,
+                    cancel_token,
+                )
+                bytes_written = output_file_path.stat().st_size
+        return face_grid, canvas_size, bytes_written
 
-        processed_image = ImageOps.grayscale(input_image)
-        processed_image = ImageOps.equalize(processed_image)
+    def _write_raster(
+        self,
+        input_image,
+        output_file_path,
+        identity,
+        dice_size,
+        options,
+        palette,
+        progress_callback,
+        cancel_token,
+        metrics,
+    ):
+        dice_art_array, face_grid = self._render(
+            input_image, identity, dice_size, options, palette, progress_callback, cancel_token, metrics
+        )
+        check_cancelled(cancel_token)
+        with metrics.stage("save"):
+            dice_art_image = Image.fromarray(dice_art_array, "L" if dice_art_array.ndim == 2 else "RGB")
+            save_image(dice_art_image, output_file_path, options.output_format, options.compress_level)
+        return face_grid, dice_art_image.size
+
+    def _render(
+        self, input_image, identity, dice_size, options, palette, progress_callback, cancel_token, metrics, out=None
+    ):
+        # Returns (canvas array, face grid), or a DiceLayout in place of the grid for the adaptive layout. The canvas
+        # is rendered into `out` when the engine can draw in place. `options` has its worker count resolved and
+        # `palette` is its Palette, or None for the default palette.
+        if options.layout == "adaptive":
+            return self._render_adaptive(
+                input_image, identity, dice_size, options, progress_callback, cancel_token, metrics, out
+            )
+        if palette is not None:
+            return self._render_palette(
+                input_image, identity, dice_size, options, palette, progress_callback, cancel_token, metrics, out
+            )
+        if options.fast_decode:
+            return self._render_decoded(
+                input_image, identity, dice_size, options, progress_callback, cancel_token, metrics, out
+            )
+        return self._render_processed(
+            input_image, identity, dice_size, options, progress_callback, cancel_token, metrics, out
+        )
 
+    def _processed_array(self, input_image, identity, scale, metrics, color=False):
+        if identity is not None:
+            return self.pipeline_cache.processed(identity, input_image, scale, metrics, color)
+        processed_array = equalize_color_image(input_image, metrics) if color else equalize_image(input_image, metrics)
         if scale > 1:
-            logging.info(f"Scaling image by a factor of {scale}")
-            processed_image = processed_image.resize(
-                (processed_image.width * scale, processed_image.height * scale), Image.Resampling.LANCZOS
+            logger.info(f"Scaling image by a factor of {scale}")
+            processed_array = scale_image(processed_array, scale, metrics)
+        return processed_array
+
+    def _exact_face_grid(self, processed_array, identity, scale, dice_size, metrics, mapping=DEFAULT_MAPPING):
+        if identity is not None:
+            return self.pipeline_cache.face_grid(identity, processed_array, scale, dice_size, metrics, mapping)
+        with metrics.stage("grid"):
+            return compute_face_grid(processed_array, dice_size, mapping)
+
+    def _palette_face_grid(self, input_image, identity, scale, dice_size, palette, metrics):
+        processed_array = self._processed_array(input_image, identity, scale, metrics, palette.mode == "RGB")
+        if identity is not None:
+            return self.pipeline_cache.palette_face_grid(identity, processed_array, scale, dice_size, palette, metrics)
+        with metrics.stage("grid"):
+            return palette.face_grid(processed_array, dice_size)
+
+    def _decoded_face_grid(self, input_image, identity, scale, dice_size, metrics, mapping=DEFAULT_MAPPING):
+        if identity is not None:
+            return self.pipeline_cache.decoded_face_grid(identity, input_image, scale, dice_size, metrics, mapping)
+        return decode_face_grid(input_image, scale, dice_size, metrics, mapping)
+
+    def _render_decoded(
+        self, input_image, identity, dice_size, options, progress_callback, cancel_token, metrics, out=None
+    ):
+        # Only the face grid comes from the reduced decode; the composite is still rendered at full size.
+        scale = options.scale
+        canvas_size = (input_image.width * scale, input_image.height * scale)
+        face_grid = self._decoded_face_grid(input_image, identity, scale, dice_size, metrics, options.mapping)
+        check_cancelled(cancel_token)
+        with metrics.stage("composite"):
+            dice_art_array = self._render_vectorized(
+                canvas_size, self._get_face_stack(dice_size), face_grid, progress_callback, cancel_token, out
+            )
+        return dice_art_array, face_grid
+
+    def _render_adaptive(
+        self, input_image, identity, dice_size, options, progress_callback, cancel_token, metrics, out=None
+    ):
+        processed_array = self._processed_array(input_image, identity, options.scale, metrics)
+        check_cancelled(cancel_token)
+        with metrics.stage("grid"):
+            layout = adaptive_layout(
+                processed_array, dice_size, self.ADAPTIVE_LEVELS, self.ADAPTIVE_THRESHOLD, cancel_token
             )
+        logger.info(f"Laid out {layout.size} dice of sizes {layout.dice_sizes}.")
+        check_cancelled(cancel_token)
+        with metrics.stage("composite"):
+            face_stacks = {size: self._get_face_stack(size) for size in layout.dice_sizes}
+            dice_art_array = render_layout(layout, face_stacks, progress_callback, cancel_token, out)
+        return dice_art_array, layout
 
-        # Convert processed image to numpy array for faster pixel access
-        processed_array = np.array(processed_image)
+    def _render_palette(
+        self, input_image, identity, dice_size, options, palette, progress_callback, cancel_token, metrics, out=None
+    ):
+        scale = options.scale
+        canvas_size = (input_image.width * scale, input_image.height * scale)
+        face_grid = self._palette_face_grid(input_image, identity, scale, dice_size, palette, metrics)
+        check_cancelled(cancel_token)
+        with metrics.stage("composite"):
+            dice_art_array = self._render_vectorized(
+                canvas_size, palette.face_stack(dice_size), face_grid, progress_callback, cancel_token, out
+            )
+        return dice_art_array, face_grid
+
+    def _render_processed(
+        self, input_image, identity, dice_size, options, progress_callback, cancel_token, metrics, out=None
+    ):
+        processed_array = self._processed_array(input_image, identity, options.scale, metrics)
+        check_cancelled(cancel_token)
+
+        if options.engine == "legacy":
+            with metrics.stage("composite"):
+                dice_art_image, face_grid = self._render_legacy(
+                    processed_array, self._get_dice_images(dice_size), dice_size, progress_callback, cancel_token
+                )
+                dice_art_array = np.asarray(dice_art_image)
+        elif options.workers > 1:
+            # Workers compute means and tiles together, so the grid stage is folded into composite here.
+            with metrics.stage("composite"):
+                dice_art_array, face_grid = self._render_parallel(
+                    processed_array,
+                    self._get_face_stack(dice_size),
+                    options.workers,
+                    progress_callback,
+                    cancel_token,
+                    options.mapping,
+                )
+        else:
+            face_grid = self._exact_face_grid(
+                processed_array, identity, options.scale, dice_size, metrics, options.mapping
+            )
+            with metrics.stage("composite"):
+                dice_art_array = self._render_vectorized(
+                    (processed_array.shape[1], processed_array.shape[0]),
+                    self._get_face_stack(dice_size),
+                    face_grid,
+                    progress_callback,
+                    cancel_token,
+                    out,
+                )
+        return dice_art_array, face_grid
+
+    def _render_vectorized(
+        self, canvas_size, face_stack, face_grid, progress_callback=None, cancel_token=None, out=None
+    ):
+        logger.info(f"Computed a {face_grid.shape[0]}x{face_grid.shape[1]} dice grid.")
+        width, height = canvas_size
+        return render_face_grid(face_grid, face_stack, width, height, progress_callback, cancel_token, out)
+
+    def _render_parallel(
+        self,
+        processed_array,
+        face_stack,
+        workers,
+        progress_callback=None,
+        cancel_token=None,
+        mapping=DEFAULT_MAPPING,
+    ):
+        logger.info(f"Rendering dice rows across {workers} worker processes.")
+        dice_art_array, face_grid = render_parallel(
+            processed_array, face_stack, workers, progress_callback, cancel_token, mapping
+        )
+        logger.info(f"Computed a {face_grid.shape[0]}x{face_grid.shape[1]} dice grid.")
+        return dice_art_array, face_grid
+
+    def _render_legacy(self, processed_array, dice_faces, dice_size, progress_callback=None, cancel_token=None):
+        processed_image = Image.fromarray(processed_array, "L")
 
         dice_art_image = Image.new("L", (processed_image.width, processed_image.height), "white")
-        logging.info("Created a new blank image for the dice art.")
+        logger.info("Created a new blank image for the dice art.")
 
-        total_dice_count = 0
+        face_grid = np.zeros(grid_shape(processed_image.width, processed_image.height, dice_size), dtype=np.uint8)
         total_rows = (processed_image.height - dice_size) // dice_size
 
         for y_step, y in enumerate(range(0, processed_image.height - dice_size, dice_size)):
-            for x in range(0, processed_image.width - dice_size, dice_size):
+            check_cancelled(cancel_token)
+            for x_step, x in enumerate(range(0, processed_image.width - dice_size, dice_size)):
                 # Extract the current block using NumPy slicing
                 block = processed_array[y : y + dice_size, x : x + dice_size]
                 average_sector_color = np.mean(block)  # Calculate mean directly
@@ -73,17 +803,10 @@ class ArtGenerator:
 
                 box = (x, y, x + dice_size, y + dice_size)
                 dice_art_image.paste(dice_faces[dice_number - 1], box)
-                total_dice_count += 1
+                face_grid[y_step, x_step] = dice_number
 
             if progress_callback and total_rows > 0:  # Avoid ZeroDivisionError
                 progress = int((y_step / total_rows) * 100)
                 progress_callback(progress)
 
-        if progress_callback:
-            progress_callback(100)
-
-        logging.info(f"Total dice used: {total_dice_count}")
-        output_file_path = self.output_dir / f"dice-{image_name}"
-        dice_art_image.save(output_file_path, "JPEG")
-        logging.info(f"Dice art saved to: {output_file_path}")
-        return str(output_file_path), total_dice_count
+        return dice_art_image, face_grid
@@ -0,0 +1,279 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+from photo_to_dices.art_generator import IMAGE_EXTENSIONS, LOG_FORMAT, OUTPUT_PREFIX, ArtGenerator
+from photo_to_dices.metrics import ConversionMetrics
+from photo_to_dices.output_store import DEFAULT_STORE_DIR, OutputStore
+from photo_to_dices.render_options import RenderOptions
+
+_output_dir = None
+_output_store = None
+_generators = {}
+
+
+def _pattern_root(pattern):
+    # The directory a glob pattern starts from: its leading parts without wildcards.
+    root = Path()
+    for part in Path(pattern).parts:
+        if any(char in part for char in "*?["):
+            break
+        root /= part
+    return root
+
+
+def collect_inputs(patterns, output_dir, recursive=False):
+    # Returns (input path, output subdirectory) pairs. Inputs found below a directory or glob root keep their path
+    # relative to it under the output directory, so photos sharing a file name in different folders never share an
+    # output.
+    output_dir = Path(output_dir).expanduser().resolve()
+    seen = set()
+    inputs = []
+    for pattern in patterns:
+        path = Path(pattern).expanduser()
+        if path.is_dir():
+            root = path
+            candidates = path.rglob("*") if recursive else path.iterdir()
+        elif path.is_file():
+            root = path.parent
+            candidates = [path]
+        else:
+            root = _pattern_root(path)
+            candidates = (Path(match) for match in glob.glob(str(path), recursive=recursive))
+
+        # Never feed our own outputs back in: an output directory inside the input tree is skipped whole, and outputs
+        # written beside their photos, by this run or earlier ones, are told apart by their prefix.
+        nested_output = root.resolve() in output_dir.parents
+        for candidate in sorted(candidates):
+            resolved = candidate.resolve()
+            if resolved in seen or (nested_output and output_dir in resolved.parents) or not candidate.is_file():
+                continue
+            if candidate.suffix.lower() not in IMAGE_EXTENSIONS or candidate.name.startswith(OUTPUT_PREFIX):
+                continue
+            seen.add(resolved)
+            inputs.append((candidate, candidate.parent.relative_to(root)))
+    return inputs
+
+
+def split_clashes(inputs):
+    # Inputs of one output subdirectory that share a stem would be written to the same output; the first one is
+    # converted and the others are returned as (input path, path of the input it clashes with).
+    first_inputs = {}
+    unique = []
+    clashes = []
+    for image_path, output_subdir in inputs:
+        name = (output_subdir, image_path.stem.lower())
+        if name in first_inputs:
+            clashes.append((image_path, first_inputs[name]))
+        else:
+            first_inputs[name] = image_path
+            unique.append((image_path, output_subdir))
+    return unique, clashes
+
+
+def _init_worker(output_dir, log_level, store=None):
+    global _output_dir, _output_store
+    logging.basicConfig(level=log_level, format=LOG_FORMAT)
+    # Every worker opens the same store directory; finished outputs become visible to all of them at once.
+    _output_dir = Path(output_dir)
+    _output_store = OutputStore(*store) if store is not None else None
+    _generators.clear()
+
+
+def _generator_for(output_subdir):
+    if output_subdir not in _generators:
+        # Batch inputs are converted once each, so caching their intermediates would only hold memory.
+        _generators[output_subdir] = ArtGenerator(
+            _output_dir / output_subdir, pipeline_cache=None, output_store=_output_store
+        )
+    return _generators[output_subdir]
+
+
+def _convert_one(image_path, output_subdir, options, overwrite):
+    record = {
+        "input": str(image_path),
+        "engine": options.engine,
+        "scale": options.scale,
+        "dice_width": options.dice_width,
+        "mapping": options.mapping,
+        "palette": options.palette,
+        "layout": options.layout,
+    }
+    generator = _generator_for(output_subdir)
+    try:
+        output_path = generator.output_path_for(image_path, options)
+    except ValueError as e:
+        record.update(status="error", error=str(e))
+        return record
+    # A store tells photos apart by content, so only name-based outputs can be skipped by name.
+    if generator.output_store is None and output_path.exists() and not overwrite:
+        record.update(status="skipped", output=str(output_path))
+        return record
+
+    start = time.perf_counter()
+    metrics = ConversionMetrics()
+    try:
+        output_path, total_dice = generator.convert(image_path, options, metrics=metrics)
+    except Exception as e:
+        record.update(status="error", error=str(e), seconds=round(time.perf_counter() - start, 4))
+        return record
+
+    if output_path is None:
+        record.update(status="error", error="Image not found", seconds=round(time.perf_counter() - start, 4))
+    else:
+        record.update(
+            status="stored" if metrics.counters.get("store_hits") else "converted",
+            output=output_path,
+            dice=total_dice,
+            seconds=round(time.perf_counter() - start, 4),
+        )
+        if options.save_grid:
+            record["grid"] = str(generator.grid_path_for(image_path))
+        record.update(metrics.as_dict())
+    return record
+
+
+def run_batch(inputs, output_dir, options, jobs, overwrite=False, store=None):
+    # `inputs` are the (input path, output subdirectory) pairs of `collect_inputs`, all converted with the same
+    # RenderOptions. `store` is None or the (directory, max_bytes, max_age) of an OutputStore shared by every worker.
+    log_level = logging.getLogger().level
+    if jobs == 1:
+        _init_worker(output_dir, log_level, store)
+        for image_path, output_subdir in inputs:
+            yield _convert_one(image_path, output_subdir, options, overwrite)
+        return
+
+    image_paths, output_subdirs = zip(*inputs)
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(output_dir, log_level, store)
+    ) as executor:
+        yield from executor.map(_convert_one, image_paths, output_subdirs, repeat(options), repeat(overwrite))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="photo2dice-batch", description="Convert images to dice art without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="Image files, glob patterns or directories")
+    parser.add_argument("-o", "--output-dir", default="~/tmp/", help="Directory for the generated dice art")
+    parser.add_argument("-s", "--scale", type=int, default=1, help="Scaling factor for the output dice art")
+    parser.add_argument("-w", "--dice-width", type=int, default=ArtGenerator.DEFAULT_DICE_WIDTH)
+    parser.add_argument("-e", "--engine", choices=ArtGenerator.ENGINES, default=ArtGenerator.DEFAULT_ENGINE)
+    parser.add_argument(
+        "-m",
+        "--mapping",
+        choices=ArtGenerator.MAPPINGS,
+        default=ArtGenerator.DEFAULT_MAPPING,
+        help="How dice faces follow the image: flat quantization, or bayer / floyd-steinberg dithering",
+    )
+    parser.add_argument(
+        "-p",
+        "--palette",
+        default=ArtGenerator.DEFAULT_PALETTE,
+        help=(
+            f"Dice sets to build from: one of {', '.join(ArtGenerator.PALETTES)}, or a comma-separated list of "
+            "dice colors and face-set directories; the dice of every set are counted"
+        ),
+    )
+    parser.add_argument(
+        "--layout",
+        choices=ArtGenerator.LAYOUTS,
+        default=ArtGenerator.DEFAULT_LAYOUT,
+        help="adaptive gives flat areas larger dice, up to 8 times the regular size, and counts the dice of every size",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=ArtGenerator.OUTPUT_FORMATS,
+        help="Output encoding (default: jpeg, or png for the streaming engine)",
+    )
+    parser.add_argument(
+        "--compress-level",
+        type=int,
+        choices=range(10),
+        metavar="0-9",
+        help="zlib level for png and tiff output; lower encodes faster",
+    )
+    parser.add_argument(
+        "--fast-decode",
+        action="store_true",
+        help="Build the dice grid from a reduced decode of each photo (much faster, approximate)",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Number of images converted concurrently"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=ArtGenerator.DEFAULT_WORKERS,
+        help="Worker processes per image: row bands of a large photo, or chunks of frames of an animation",
+    )
+    parser.add_argument("-r", "--recursive", action="store_true", help="Descend into subdirectories")
+    parser.add_argument("--overwrite", action="store_true", help="Convert even if the output already exists")
+    parser.add_argument("--grid", action="store_true", help="Also save the compact dice grid (.dgrid) per image")
+    parser.add_argument(
+        "--store",
+        nargs="?",
+        const=DEFAULT_STORE_DIR,
+        metavar="DIR",
+        help=f"File outputs by content hash in a store (default {DEFAULT_STORE_DIR}) so repeated photos are reused",
+    )
+    parser.add_argument(
+        "--store-size",
+        type=int,
+        default=OutputStore.DEFAULT_MAX_BYTES // (1024 * 1024),
+        metavar="MIB",
+        help="Evict the least recently used outputs once the store exceeds this size",
+    )
+    parser.add_argument(
+        "--store-max-age", type=float, metavar="DAYS", help="Evict outputs from the store unused for this many days"
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log conversion progress to stderr")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format=LOG_FORMAT)
+
+    inputs, clashes = split_clashes(collect_inputs(args.inputs, args.output_dir, args.recursive))
+    if not inputs:
+        print("No input images found.", file=sys.stderr)
+        return 1
+
+    jobs = max(1, min(args.jobs, len(inputs)))
+    store = None
+    if args.store:
+        max_age = args.store_max_age * 24 * 60 * 60 if args.store_max_age is not None else None
+        store = (args.store, args.store_size * 1024 * 1024, max_age)
+    failed = len(clashes)
+    for image_path, first_path in clashes:
+        record = {"input": str(image_path), "status": "error", "error": f"Output name clashes with {first_path}"}
+        print(json.dumps(record), flush=True)
+    options = RenderOptions(
+        scale=args.scale,
+        dice_width=args.dice_width,
+        engine=args.engine,
+        workers=args.workers,
+        mapping=args.mapping,
+        palette=args.palette,
+        layout=args.layout,
+        output_format=args.format,
+        compress_level=args.compress_level,
+        fast_decode=args.fast_decode,
+        save_grid=args.grid,
+    )
+    records = run_batch(inputs, args.output_dir, options, jobs, args.overwrite, store)
+    for record in records:
+        failed += record["status"] == "error"
+        print(json.dumps(record), flush=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,246 @@
+import io
+import os
+from collections import OrderedDict
+from fnmatch import fnmatchcase
 from pathlib import Path
-from PyQt5 import QtCore, QtGui, QtWidgets
+
+from PIL import Image
+from PyQt5 import QtCore, QtGui
 from PyQt5.QtWidgets import (
     QDialog,
     QVBoxLayout,
     QHBoxLayout,
+    QLabel,
     QLineEdit,
     QPushButton,
-    QListWidget,
-    QListWidgetItem,
+    QListView,
     QStyle,
 )
 
+from photo_to_dices.disk_cache import DiskCache, cache_key
+
+SCAN_BATCH_SIZE = 500
+THUMBNAIL_SIZE = 48
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_CACHE_DIR = "~/tmp/photo2dice-thumbnails"
+THUMBNAIL_CACHE_BYTES = 64 * 1024 * 1024
+# Decoded thumbnails kept in memory as icons; the disk cache holds everything generated so far.
+MAX_THUMBNAIL_ICONS = 512
+# Rows sort by rank, then by name ignoring case.
+PARENT_RANK, DIRECTORY_RANK, FILE_RANK = 0, 1, 2
+
+_thumbnail_cache = None
+
+
+def thumbnail_cache():
+    # Shared by every dialog, and only opened once one is shown.
+    global _thumbnail_cache
+    if _thumbnail_cache is None:
+        _thumbnail_cache = DiskCache(THUMBNAIL_CACHE_DIR, THUMBNAIL_CACHE_BYTES)
+    return _thumbnail_cache
+
+
+def matches_filter(name, file_filter):
+    # Camera files are often upper case (IMG_0001.JPG), so patterns match regardless of case.
+    name = name.lower()
+    return not file_filter or any(fnmatchcase(name, pattern.lower()) for pattern in file_filter)
+
+
+def load_thumbnail(cache, path, key):
+    # PNG bytes of the thumbnail from the disk cache, generated on a miss; None if `path` is not a readable image.
+    cached_path = cache.get(key)
+    if cached_path is not None:
+        try:
+            return cached_path.read_bytes()
+        except FileNotFoundError:
+            pass
+    try:
+        with Image.open(path) as image:
+            # JPEGs decode straight at a fraction of their size.
+            image.draft("RGB", (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            buffer = io.BytesIO()
+            image.convert("RGBA" if image.has_transparency_data else "RGB").save(buffer, "PNG")
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    data = buffer.getvalue()
+    cache.put(key, data)
+    return data
+
+
+class DirectoryScanner(QtCore.QThread):
+    # Lists a directory off the UI thread. os.scandir tells directories apart from the listing itself on most
+    # platforms, so only matching files cost a stat call, and entries arrive in batches while a slow share is read.
+    batch_ready = QtCore.pyqtSignal(list)
+
+    def __init__(self, path, file_filter):
+        super().__init__()
+        self.path = path
+        self.file_filter = file_filter
+        self.cancelled = False
+        self.error = None
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        batch = []
+        try:
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    if self.cancelled:
+                        return
+                    try:
+                        if entry.is_dir():
+                            batch.append((DIRECTORY_RANK, entry.name.lower(), entry.name, entry.path, 0, 0))
+                        elif matches_filter(entry.name, self.file_filter):
+                            stat = entry.stat()
+                            batch.append(
+                                (FILE_RANK, entry.name.lower(), entry.name, entry.path, stat.st_mtime_ns, stat.st_size)
+                            )
+                    except OSError:
+                        continue  # Removed or unreadable while the directory was being listed
+                    if len(batch) >= SCAN_BATCH_SIZE:
+                        self.batch_ready.emit(batch)
+                        batch = []
+        except OSError as e:
+            self.error = str(e)
+        if batch and not self.cancelled:
+            self.batch_ready.emit(batch)
+
+
+class ThumbnailSignals(QtCore.QObject):
+    ready = QtCore.pyqtSignal(str, str, QtGui.QImage)
+
+
+class ThumbnailJob(QtCore.QRunnable):
+    def __init__(self, cache, path, key, signals):
+        super().__init__()
+        self.cache = cache
+        self.path = path
+        self.key = key
+        self.signals = signals
+
+    def run(self):
+        data = load_thumbnail(self.cache, self.path, self.key)
+        # QImage may be built off the UI thread; only the QPixmap behind an icon has to be made on it.
+        image = QtGui.QImage.fromData(data) if data else QtGui.QImage()
+        self.signals.ready.emit(self.path, self.key, image)
+
+
+class ThumbnailLoader(QtCore.QObject):
+    # Thumbnails are requested by the model as the view paints rows, so only visible images are ever decoded.
+    icon_ready = QtCore.pyqtSignal(str)
+
+    def __init__(self, cache, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(THUMBNAIL_WORKERS)
+        self.signals = ThumbnailSignals(self)
+        self.signals.ready.connect(self._job_finished)
+        self._icons = OrderedDict()
+        self._pending = set()
+        self._failed = set()
+
+    def icon(self, path, mtime_ns, size):
+        # Returns the cached icon, or None after queueing the thumbnail; `icon_ready` follows once it is loaded.
+        key = cache_key("thumbnail", path, mtime_ns, size, THUMBNAIL_SIZE)
+        icon = self._icons.get(key)
+        if icon is not None:
+            self._icons.move_to_end(key)
+            return icon
+        if key not in self._pending and key not in self._failed:
+            self._pending.add(key)
+            self.pool.start(ThumbnailJob(self.cache, path, key, self.signals))
+        return None
+
+    def clear_pending(self):
+        # Drops queued thumbnails of a directory that is no longer shown; running ones still finish.
+        self.pool.clear()
+        self._pending.clear()
+
+    def shutdown(self):
+        self.clear_pending()
+        self.pool.waitForDone()
+
+    def _job_finished(self, path, key, image):
+        self._pending.discard(key)
+        if image.isNull():
+            self._failed.add(key)
+            return
+        self._icons[key] = QtGui.QIcon(QtGui.QPixmap.fromImage(image))
+        while len(self._icons) > MAX_THUMBNAIL_ICONS:
+            self._icons.popitem(last=False)
+        self.icon_ready.emit(path)
+
+
+class DirectoryModel(QtCore.QAbstractListModel):
+    # Rows are (rank, lowercase name, name, path, mtime_ns, size) tuples, kept sorted so a plain tuple sort orders
+    # them without a key function.
+    def __init__(self, thumbnails, directory_icon, file_icon, parent=None):
+        super().__init__(parent)
+        self.thumbnails = thumbnails
+        self.directory_icon = directory_icon
+        self.file_icon = file_icon
+        self._entries = []
+        self._rows = None
+        self.file_count = 0
+        thumbnails.icon_ready.connect(self._icon_ready)
+
+    def reset(self, parent_path=None):
+        self.beginResetModel()
+        self._entries = [(PARENT_RANK, "..", "..", str(parent_path), 0, 0)] if parent_path is not None else []
+        self._rows = None
+        self.file_count = 0
+        self.endResetModel()
+
+    def add_entries(self, entries):
+        # Batches arrive in directory order. Timsort only sorts the new batch and merges it into the rows, which
+        # are already in order, so directories stay first and names stay sorted while a large listing loads.
+        persistent = self.persistentIndexList()
+        self.layoutAboutToBeChanged.emit()
+        moved_paths = [self._entries[index.row()][3] for index in persistent]
+        self._entries.extend(entries)
+        self._entries.sort()
+        self.file_count += sum(1 for entry in entries if entry[0] == FILE_RANK)
+        self._rows = None
+        if persistent:
+            rows = self._row_map()
+            self.changePersistentIndexList(persistent, [self.index(rows[path]) for path in moved_paths])
+        self.layoutChanged.emit()
+
+    def entry(self, row):
+        return self._entries[row]
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self._entries)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        rank, _, name, path, mtime_ns, size = self._entries[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            return f"{name}/" if rank == DIRECTORY_RANK else name
+        if role == QtCore.Qt.DecorationRole:
+            if rank != FILE_RANK:
+                return self.directory_icon
+            return self.thumbnails.icon(path, mtime_ns, size) or self.file_icon
+        if role == QtCore.Qt.ToolTipRole:
+            return path
+        return None
+
+    def _row_map(self):
+        if self._rows is None:
+            self._rows = {entry[3]: row for row, entry in enumerate(self._entries)}
+        return self._rows
+
+    def _icon_ready(self, path):
+        row = self._row_map().get(path)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [QtCore.Qt.DecorationRole])
+
 
 class CustomFileDialog(QDialog):
     def __init__(self, parent=None, initial_path=None, file_filter="*"):
@@ -19,6 +249,7 @@ class CustomFileDialog(QDialog):
         self.setMinimumSize(600, 400)
         self.selected_file = None
         self.file_filter = file_filter.split()  # e.g., ["*.png", "*.jpg"]
+        self.scanner = None
 
         self.current_path = Path(initial_path) if initial_path else Path.home()
         if not self.current_path.is_dir():
@@ -48,17 +279,30 @@ class CustomFileDialog(QDialog):
         main_layout.addLayout(path_layout)
 
         # File/Directory List
-        self.list_widget = QListWidget()
-        self.list_widget.itemDoubleClicked.connect(self.handle_item_double_click)
-        main_layout.addWidget(self.list_widget)
+        self.thumbnails = ThumbnailLoader(thumbnail_cache(), self)
+        self.model = DirectoryModel(
+            self.thumbnails,
+            self.style().standardIcon(QStyle.SP_DirIcon),
+            self.style().standardIcon(QStyle.SP_FileIcon),
+            self,
+        )
+        self.list_view = QListView()
+        self.list_view.setModel(self.model)
+        self.list_view.setIconSize(QtCore.QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        # Every row has the same height, so the view never measures tens of thousands of rows to lay them out.
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.doubleClicked.connect(self.handle_item_double_click)
+        main_layout.addWidget(self.list_view)
 
         # Action buttons
         button_layout = QHBoxLayout()
+        self.status_label = QLabel()
         self.open_button = QPushButton("Open")
         self.open_button.clicked.connect(self.accept)
         self.cancel_button = QPushButton("Cancel")
         self.cancel_button.clicked.connect(self.reject)
 
+        button_layout.addWidget(self.status_label)
         button_layout.addStretch()
         button_layout.addWidget(self.open_button)
         button_layout.addWidget(self.cancel_button)
@@ -74,6 +318,9 @@ class CustomFileDialog(QDialog):
                 font-family: 'Segoe UI', 'Roboto', 'Helvetica Neue', sans-serif;
                 font-size: 10pt;
             }
+            QLabel {
+                color: #ecf0f1;
+            }
             QLineEdit {
                 background-color: #4a6480;
                 color: #ecf0f1;
@@ -95,17 +342,17 @@ class CustomFileDialog(QDialog):
             QPushButton#up_button { /* Specific style for up button if needed */
                 padding: 5px;
             }
-            QListWidget {
+            QListView {
                 background-color: #34495e;
                 color: #ecf0f1;
                 border: 1px solid #3498db;
                 border-radius: 5px;
                 padding: 5px;
             }
-            QListWidget::item {
+            QListView::item {
                 padding: 3px;
             }
-            QListWidget::item:selected {
+            QListView::item:selected {
                 background-color: #3498db;
                 color: white;
             }
@@ -113,50 +360,72 @@ class CustomFileDialog(QDialog):
         )
 
     def load_directory_contents(self):
-        self.list_widget.clear()
         self.path_edit.setText(str(self.current_path))
+        self.stop_scanning()
+        self.thumbnails.clear_pending()
+        # Add parent directory, avoiding an infinite 'up' from root
+        self.model.reset(self.current_path.parent if self.current_path.parent != self.current_path else None)
+        self.status_label.setText("Listing...")
+
+        scanner = DirectoryScanner(self.current_path, self.file_filter)
+        scanner.batch_ready.connect(self.add_entries)
+        scanner.finished.connect(self.listing_finished)
+        # Cancelled scanners run until their next entry; they stay parented until then so Qt does not destroy them.
+        scanner.setParent(self)
+        scanner.finished.connect(scanner.deleteLater)
+        self.scanner = scanner
+        scanner.start()
 
-        # Add parent directory
-        if self.current_path.parent != self.current_path:  # Avoid infinite 'up' from root
-            item = QListWidgetItem("..")
-            item.setData(QtCore.Qt.UserRole, self.current_path.parent)
-            self.list_widget.addItem(item)
-
-        for entry in sorted(self.current_path.iterdir(), key=lambda p: (not p.is_dir(), p.name.lower())):
-            item_text = entry.name
-            if entry.is_dir():
-                item_text += "/"
-                item.setIcon(self.style().standardIcon(QStyle.SP_DirIcon))
-            elif self._is_file_match(entry):
-                item.setIcon(self.style().standardIcon(QStyle.SP_FileIcon))
-            else:
-                continue  # Skip files that don't match the filter
-
-            item = QListWidgetItem(item_text)
-            item.setData(QtCore.Qt.UserRole, entry)  # Store the full Path object
-            self.list_widget.addItem(item)
-
-    def _is_file_match(self, file_path):
-        if not self.file_filter or file_path.is_dir():
-            return True
-        for pattern in self.file_filter:
-            if file_path.match(pattern):
-                return True
-        return False
+    def stop_scanning(self):
+        if self.scanner is not None:
+            self.scanner.cancel()
+            self.scanner = None
+
+    def add_entries(self, entries):
+        if self.sender() is self.scanner:
+            self.model.add_entries(entries)
+            self.status_label.setText(f"Listing... {self.model.file_count} images")
+
+    def listing_finished(self):
+        if self.sender() is not self.scanner:
+            return
+        if self.scanner.error:
+            self.status_label.setText(f"Cannot list this folder: {self.scanner.error}")
+        else:
+            self.status_label.setText(f"{self.model.file_count} images")
 
     def navigate_up(self):
         if self.current_path.parent != self.current_path:
             self.current_path = self.current_path.parent
             self.load_directory_contents()
 
-    def handle_item_double_click(self, item):
-        path_obj = item.data(QtCore.Qt.UserRole)
-        if path_obj.is_dir():
-            self.current_path = path_obj
-            self.load_directory_contents()
-        else:
-            self.selected_file = str(path_obj)
+    def handle_item_double_click(self, index):
+        rank, _, _, path, _, _ = self.model.entry(index.row())
+        if rank == FILE_RANK:
+            self.selected_file = path
             self.accept()
+        else:
+            self.current_path = Path(path)
+            self.load_directory_contents()
+
+    def accept(self):
+        index = self.list_view.currentIndex()
+        if self.selected_file is None and index.isValid():
+            # "Open" on a selected folder enters it instead of closing the dialog.
+            if self.model.entry(index.row())[0] != FILE_RANK:
+                self.handle_item_double_click(index)
+                return
+            self.selected_file = self.model.entry(index.row())[3]
+        super().accept()
+
+    def done(self, result):
+        # The listing and thumbnail threads must not outlive the dialog.
+        self.stop_scanning()
+        for scanner in self.findChildren(DirectoryScanner):
+            scanner.cancel()
+            scanner.wait()
+        self.thumbnails.shutdown()
+        super().done(result)
 
     def get_selected_file(self):
         return self.selected_file
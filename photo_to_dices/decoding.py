@@ -0,0 +1,71 @@
+import math
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from photo_to_dices.dice_grid import DEFAULT_MAPPING, grid_shape, map_faces
+from photo_to_dices.metrics import timed
+
+# Every die still averages at least this many decoded pixels across, which keeps the equalized histogram
+# and the block means close to the ones of the full-resolution image.
+MIN_DECODED_PIXELS_PER_DIE = 4
+JPEG_DRAFT_FACTORS = (8, 4, 2)
+
+
+def reduction_factor(scale, dice_size):
+    # A die spans dice_size / scale source pixels, so the source can shrink by this much before dice blur together.
+    return max(1, int(dice_size / scale / MIN_DECODED_PIXELS_PER_DIE))
+
+
+def decode_reduced(input_image, factor, metrics=None):
+    # Returns the equalized grayscale source decoded at about 1/factor of its size.
+    width, height = input_image.size
+    with timed(metrics, "open"):
+        if input_image.format == "JPEG":
+            draft_factor = next((draft for draft in JPEG_DRAFT_FACTORS if draft <= factor), 1)
+            # libjpeg scales in the DCT domain and, for "L", skips the chroma planes and color conversion.
+            input_image.draft("L", (math.ceil(width / draft_factor), math.ceil(height / draft_factor)))
+        input_image.load()
+    with timed(metrics, "grayscale"):
+        gray_image = ImageOps.grayscale(input_image)
+        remaining = factor // max(1, width // gray_image.width)
+        if remaining > 1:
+            gray_image = gray_image.reduce(remaining)
+    with timed(metrics, "equalize"):
+        return np.asarray(ImageOps.equalize(gray_image))
+
+
+def reduced_block_means(reduced, source_size, scale, dice_size):
+    # Each die covers dice_size / scale source pixels; mapped into the reduced image, a BOX downsample of
+    # that region to one pixel per die approximates the block means without building the upscaled image.
+    height, width = reduced.shape[:2]
+    source_width, source_height = source_size
+    rows, cols = grid_shape(source_width * scale, source_height * scale, dice_size)
+    if rows == 0 or cols == 0:
+        return np.zeros((rows, cols, *reduced.shape[2:]))
+
+    box = (
+        0,
+        0,
+        cols * dice_size / scale * width / source_width,
+        rows * dice_size / scale * height / source_height,
+    )
+    image = Image.fromarray(reduced, "L" if reduced.ndim == 2 else "RGB")
+    return np.asarray(image.resize((cols, rows), Image.Resampling.BOX, box=box), dtype=np.float64)
+
+
+def reduced_face_grid(reduced, source_size, scale, dice_size, mapping=DEFAULT_MAPPING):
+    means = reduced_block_means(reduced, source_size, scale, dice_size)
+    if means.size == 0:
+        return np.zeros(means.shape, dtype=np.uint8)
+    return map_faces(means, mapping)
+
+
+def decode_face_grid(input_image, scale, dice_size, metrics=None, mapping=DEFAULT_MAPPING):
+    # Never moves a die more than one face from the exact grid. Dice whose block mean sits near a face threshold can
+    # flip, mostly because the reduced image is less noisy and so equalizes a little differently: about 2% of the
+    # dice of a clean photo, and more with heavy sensor noise or Floyd-Steinberg, which carries the change along.
+    source_size = input_image.size
+    reduced = decode_reduced(input_image, reduction_factor(scale, dice_size), metrics)
+    with timed(metrics, "grid"):
+        return reduced_face_grid(reduced, source_size, scale, dice_size, mapping)
@@ -0,0 +1,97 @@
+import io
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from photo_to_dices.encoders import save_image
+
+
+@contextmanager
+def open_source(source):
+    # Opens a path, binary file object, bytes-like buffer, PIL image or uint8 NumPy array as a PIL image.
+    # Images and arrays belong to the caller and are not closed; arrays are wrapped without a copy where Pillow can.
+    if isinstance(source, Image.Image):
+        yield source
+        return
+    if isinstance(source, np.ndarray):
+        if source.dtype != np.uint8 or source.ndim not in (2, 3):
+            raise ValueError(
+                f"Expected a uint8 array of shape (height, width[, channels]), got {source.dtype} {source.shape}"
+            )
+        yield Image.fromarray(source)
+        return
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    with Image.open(source) as image:
+        yield image
+
+
+def canvas_shape(width, height, scale=1, mode="L", dice_size=None):
+    # NumPy shape of the canvas rendered for a `width` x `height` source, e.g. to size a shared memory block.
+    # An adaptive layout rounds the canvas up to whole dice of its smallest `dice_size`.
+    shape = (height * scale, width * scale)
+    if dice_size is not None:
+        shape = tuple(-(-side // dice_size) * dice_size for side in shape)
+    return shape if mode == "L" else (*shape, len(mode))
+
+
+def canvas_array(out, shape):
+    # A view of the caller's writable buffer (a shared memory block, mmap, bytearray or array) to render into.
+    # Arrays must have the canvas shape; raw buffers may be longer, as shared memory blocks are rounded up to pages.
+    if isinstance(out, np.ndarray):
+        if out.shape != shape or out.dtype != np.uint8 or not out.flags.c_contiguous:
+            raise ValueError(f"out must be a C-contiguous uint8 array of shape {shape}, got {out.dtype} {out.shape}")
+        if not out.flags.writeable:
+            raise ValueError("out must be a writable buffer")
+        return out
+    size = int(np.prod(shape))
+    try:
+        array = np.frombuffer(out, dtype=np.uint8, count=size)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"out must be a buffer of at least {size} bytes: {e}") from None
+    if not array.flags.writeable:
+        raise ValueError("out must be a writable buffer")
+    return array.reshape(shape)
+
+
+class DiceArt:
+    # A piece rendered in memory. `pixels` is a C-contiguous uint8 array of shape (height, width) for gray dice or
+    # (height, width, 3) for colored ones; it and `buffer` support the buffer protocol, so the canvas can be wrapped
+    # as a QImage (`bytes_per_line` per row), written to a socket or read by another process without a copy.
+    # `face_grid` is the DiceLayout of an adaptive piece, whose `size` is likewise the number of dice.
+    def __init__(self, pixels, face_grid, dice_size, dice_by_color=None):
+        self.pixels = pixels
+        self.face_grid = face_grid
+        self.dice_size = dice_size
+        self.dice_by_color = dice_by_color or {}
+
+    @property
+    def mode(self):
+        return "L" if self.pixels.ndim == 2 else "RGB"
+
+    @property
+    def size(self):
+        return self.pixels.shape[1], self.pixels.shape[0]
+
+    @property
+    def bytes_per_line(self):
+        return self.pixels.strides[0]
+
+    @property
+    def buffer(self):
+        return memoryview(self.pixels).cast("B")
+
+    @property
+    def dice(self):
+        return self.face_grid.size
+
+    def to_image(self):
+        # Gray canvases are shared with the image; Pillow stores RGB with a padding byte, so those are copied.
+        return Image.frombuffer(self.mode, self.size, self.pixels, "raw", self.mode, 0, 1)
+
+    def save(self, path, output_format="jpeg", compress_level=None):
+        # Writing to disk is one sink among others: `output_format` is any raster format of `encoders`.
+        save_image(self.to_image(), path, output_format, compress_level)
+        return Path(path)
@@ -1,4 +1,6 @@
+import logging
 import sys
+import threading
 from pathlib import Path
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtWidgets import (
@@ -14,50 +16,177 @@ from PyQt5.QtWidgets import (
     QPushButton,
     QLabel,
     QSpinBox,
+    QComboBox,
     QProgressBar,
     QGroupBox,
     QSpacerItem,
     QSizePolicy,
     QAction,
+    QListWidget,
+    QListWidgetItem,
+    QAbstractItemView,
 )
 
-from photo_to_dices.art_generator import ArtGenerator
+from photo_to_dices.art_generator import IMAGE_EXTENSIONS, LOG_FORMAT, ArtGenerator
 from photo_to_dices.custom_file_dialog import CustomFileDialog  # Import custom dialog
+from photo_to_dices.dice_grid import ConversionCancelled
+from photo_to_dices.metrics import ConversionMetrics
+from photo_to_dices.output_store import OutputStore
+from photo_to_dices.pipeline_cache import pipeline_cache
+
+
+class ConversionJobSignals(QtCore.QObject):
+    # QRunnable is not a QObject, so each job carries its signals in a companion object
+    progress = QtCore.pyqtSignal(int, int)
+    finished = QtCore.pyqtSignal(int, str, int)
+    error = QtCore.pyqtSignal(int, str)
+    cancelled = QtCore.pyqtSignal(int)
+
+
+class ConversionJob(QtCore.QRunnable):
+    def __init__(
+        self,
+        job_id,
+        art_generator,
+        image_path,
+        scale,
+        dice_width=ArtGenerator.DEFAULT_DICE_WIDTH,
+        mapping=ArtGenerator.DEFAULT_MAPPING,
+        palette=ArtGenerator.DEFAULT_PALETTE,
+    ):
+        super().__init__()
+        self.setAutoDelete(False)  # The app's job table owns the job so it can still be cancelled or inspected
+        self.job_id = job_id
+        self.art_generator = art_generator
+        self.image_path = image_path
+        self.scale = scale
+        self.dice_width = dice_width
+        self.mapping = mapping
+        self.palette = palette
+        # Dice of every set in a multi-set palette, filled in before `finished` is emitted.
+        self.dice_by_color = {}
+        self.cancel_event = threading.Event()
+        self.signals = ConversionJobSignals()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        if self.cancel_event.is_set():
+            self.signals.cancelled.emit(self.job_id)
+            return
+        metrics = ConversionMetrics()
+        try:
+            output_path, total_dice = self.art_generator.convert_to_dice_art(
+                self.image_path,
+                self.scale,
+                self.dice_width,
+                lambda value: self.signals.progress.emit(self.job_id, value),
+                cancel_token=self.cancel_event,
+                metrics=metrics,
+                mapping=self.mapping,
+                palette=self.palette,
+            )
+        except ConversionCancelled:
+            self.signals.cancelled.emit(self.job_id)
+        except Exception as e:
+            self.signals.error.emit(self.job_id, str(e))
+        else:
+            self.dice_by_color = {
+                name[len("dice:") :]: count for name, count in metrics.counters.items() if name.startswith("dice:")
+            }
+            if output_path:
+                self.signals.finished.emit(self.job_id, output_path, total_dice)
+            else:
+                self.signals.error.emit(self.job_id, "Failed to convert image.")
 
 
-class ConversionWorker(QtCore.QThread):
-    progress = QtCore.pyqtSignal(int)
-    finished = QtCore.pyqtSignal(str, int)
+class PreviewWorker(QtCore.QThread):
+    ready = QtCore.pyqtSignal(QtGui.QImage, int)
     error = QtCore.pyqtSignal(str)
 
-    def __init__(self, image_path, scale):
+    def __init__(
+        self,
+        art_generator,
+        image_path,
+        scale,
+        dice_width,
+        max_size,
+        mapping=ArtGenerator.DEFAULT_MAPPING,
+        palette=ArtGenerator.DEFAULT_PALETTE,
+    ):
         super().__init__()
+        self.art_generator = art_generator
         self.image_path = image_path
         self.scale = scale
-        self.art_generator = ArtGenerator()
+        self.dice_width = dice_width
+        self.mapping = mapping
+        self.palette = palette
+        self.max_size = max_size
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
 
     def run(self):
         try:
-            # DEFAULT_DICE_WIDTH from ArtGenerator is used here
-            output_path, total_dice = self.art_generator.convert_to_dice_art(
-                self.image_path, self.scale, self.art_generator.DEFAULT_DICE_WIDTH, self.progress.emit
+            preview, total_dice = self.art_generator.preview(
+                self.image_path,
+                self.scale,
+                self.dice_width,
+                self.max_size,
+                self.mapping,
+                self.palette,
+                self.cancel_event,
             )
-            if output_path:
-                self.finished.emit(output_path, total_dice)
-            else:
-                self.error.emit("Failed to convert image.")
+        except ConversionCancelled:
+            return
         except Exception as e:
-            self.error.emit(str(e))
+            if not self.cancel_event.is_set():
+                self.error.emit(str(e))
+            return
+
+        if self.cancel_event.is_set():
+            return
+        # copy() detaches the QImage from the Python bytes object before it goes out of scope
+        if preview.mode == "RGB":
+            image_format, bytes_per_line = QtGui.QImage.Format_RGB888, preview.width * 3
+        else:
+            image_format, bytes_per_line = QtGui.QImage.Format_Grayscale8, preview.width
+        qimage = QtGui.QImage(preview.tobytes(), preview.width, preview.height, bytes_per_line, image_format).copy()
+        self.ready.emit(qimage, total_dice)
 
 
 class DiceArtApp(QMainWindow):
+    PREVIEW_DEBOUNCE_MS = 250
+    PREVIEW_SIZE = (480, 320)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Photo to Dice Art Generator")
         self.setWindowIcon(QtGui.QIcon("icon.png"))  # Ensure 'icon.png' exists in project root
         self.setMinimumSize(650, 450)
+        self.setAcceptDrops(True)
+        # Settings, preview and queue are taller than many laptop screens, so they scroll when the window is short.
         self.central_widget = QtWidgets.QWidget()
-        self.setCentralWidget(self.central_widget)
+        self.central_widget.setObjectName("central_widget")
+        scroll_area = QtWidgets.QScrollArea()
+        scroll_area.setWidgetResizable(True)
+        scroll_area.setFrameShape(QtWidgets.QFrame.NoFrame)
+        scroll_area.setWidget(self.central_widget)
+        self.setCentralWidget(scroll_area)
+        self.resize(700, min(950, QApplication.primaryScreen().availableGeometry().height()))
+
+        # One generator and one pool for the whole session; jobs wait in the pool's queue. Jobs run concurrently, so
+        # outputs are filed in a store by content and settings: two jobs never write the same `dice-<name>` file.
+        # Previews and re-conversions of the selected photo share its cached intermediates.
+        self.art_generator = ArtGenerator(pipeline_cache=pipeline_cache, output_store=OutputStore())
+        self.thread_pool = QtCore.QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(QtCore.QThread.idealThreadCount())
+        self.jobs = {}
+        self.job_items = {}
+        self.job_states = {}
+        self.next_job_id = 0
 
         self.init_ui()
         self.apply_dark_style()
@@ -107,13 +236,53 @@ class DiceArtApp(QMainWindow):
         self.scale_spinbox.setSuffix("x")
         self.scale_spinbox.setToolTip("Sets the scaling factor for the output dice art.")
         options_layout.addRow("Output Scale:", self.scale_spinbox)
+        self.dice_width_spinbox = QSpinBox()
+        self.dice_width_spinbox.setRange(10, 2000)
+        self.dice_width_spinbox.setValue(ArtGenerator.DEFAULT_DICE_WIDTH)
+        self.dice_width_spinbox.setSuffix(" dice")
+        self.dice_width_spinbox.setToolTip("Sets how many dice span the width of the original image.")
+        options_layout.addRow("Dice Width:", self.dice_width_spinbox)
+        self.mapping_combo = QComboBox()
+        self.mapping_combo.addItems(ArtGenerator.MAPPINGS)
+        self.mapping_combo.setToolTip("Dithering keeps smooth gradients from banding, so fewer dice are needed.")
+        options_layout.addRow("Face Mapping:", self.mapping_combo)
+        self.palette_combo = QComboBox()
+        self.palette_combo.addItems(ArtGenerator.PALETTES)
+        self.palette_combo.setToolTip("Build the art from several dice colors; each die takes the nearest color.")
+        options_layout.addRow("Dice Colors:", self.palette_combo)
         main_layout.addWidget(options_group)
 
+        # Preview Group
+        preview_group = QGroupBox("Preview")
+        preview_layout = QVBoxLayout(preview_group)
+        self.preview_label = QLabel()
+        self.preview_label.setObjectName("preview_label")
+        self.preview_label.setAlignment(QtCore.Qt.AlignCenter)
+        self.preview_label.setMinimumSize(*self.PREVIEW_SIZE)
+        preview_layout.addWidget(self.preview_label)
+        main_layout.addWidget(preview_group)
+
         # Action Button
         self.generate_button = QPushButton("✨ Generate Dice Art")
         self.generate_button.setFixedHeight(55)
         main_layout.addWidget(self.generate_button)
 
+        # Render Queue Group
+        queue_group = QGroupBox("Render Queue")
+        queue_layout = QVBoxLayout(queue_group)
+        self.queue_list = QListWidget()
+        self.queue_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.queue_list.setToolTip("Drop image files on the window to queue them with the current settings.")
+        queue_layout.addWidget(self.queue_list)
+        queue_buttons = QHBoxLayout()
+        self.cancel_button = QPushButton("Cancel Selected")
+        self.clear_button = QPushButton("Clear Finished")
+        queue_buttons.addStretch()
+        queue_buttons.addWidget(self.cancel_button)
+        queue_buttons.addWidget(self.clear_button)
+        queue_layout.addLayout(queue_buttons)
+        main_layout.addWidget(queue_group)
+
         # Progress & Status
         self.progress_bar = QProgressBar()
         self.progress_bar.setAlignment(QtCore.Qt.AlignCenter)
@@ -126,8 +295,22 @@ class DiceArtApp(QMainWindow):
 
         main_layout.addSpacerItem(QSpacerItem(20, 20, QSizePolicy.Minimum, QSizePolicy.Expanding))
 
+        # Preview updates are debounced so spinning through values only renders the last one
+        self.preview_worker = None
+        self.preview_timer = QtCore.QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(self.PREVIEW_DEBOUNCE_MS)
+        self.preview_timer.timeout.connect(self.start_preview)
+
         # Connections
         self.generate_button.clicked.connect(self.start_conversion)
+        self.cancel_button.clicked.connect(self.cancel_selected_jobs)
+        self.clear_button.clicked.connect(self.clear_finished_jobs)
+        self.file_input.textChanged.connect(self.schedule_preview)
+        self.scale_spinbox.valueChanged.connect(self.schedule_preview)
+        self.dice_width_spinbox.valueChanged.connect(self.schedule_preview)
+        self.mapping_combo.currentTextChanged.connect(self.schedule_preview)
+        self.palette_combo.currentTextChanged.connect(self.schedule_preview)
 
         # Initial state
         self.reset_ui_state()
@@ -151,6 +334,10 @@ class DiceArtApp(QMainWindow):
                 font-weight: bold;
                 margin-bottom: 10px;
             }
+            QScrollArea, QScrollArea > QWidget > QWidget#central_widget {
+                background-color: #2c3e50;
+                border: none;
+            }
             QGroupBox {
                 background-color: #34495e; /* Slightly lighter blue-gray for groups */
                 border: 1px solid #3498db; /* Accent border */
@@ -166,7 +353,7 @@ class DiceArtApp(QMainWindow):
                 font-size: 12pt;
                 font-weight: bold;
             }
-            QLineEdit, QSpinBox {
+            QLineEdit, QSpinBox, QComboBox {
                 background-color: #4a6480; /* Darker input fields */
                 color: #ecf0f1;
                 border: 1px solid #3498db;
@@ -208,6 +395,20 @@ class DiceArtApp(QMainWindow):
                 background-color: #3498db;
                 border-radius: 6px;
             }
+            QListWidget {
+                background-color: #4a6480;
+                border: 1px solid #3498db;
+                border-radius: 5px;
+            }
+            QListWidget::item:selected {
+                background-color: #3498db;
+                color: white;
+            }
+            QLabel#preview_label {
+                background-color: #4a6480;
+                border-radius: 5px;
+                color: #bdc3c7;
+            }
             QLabel#status_label { /* Targeting status label specifically */
                 font-size: 10pt;
                 color: #bdc3c7;
@@ -242,6 +443,53 @@ class DiceArtApp(QMainWindow):
             if selected_file:
                 self.file_input.setText(selected_file)
 
+    def schedule_preview(self):
+        self.preview_timer.start()
+
+    def cancel_preview(self):
+        self.preview_timer.stop()
+        if self.preview_worker is not None:
+            self.preview_worker.cancel()
+            self.preview_worker = None
+
+    def start_preview(self):
+        self.cancel_preview()
+        image_path = self.file_input.text()
+        if not Path(image_path).is_file():
+            self.preview_label.clear()
+            self.preview_label.setText("Select an image to see a preview.")
+            return
+
+        self.preview_label.setText("Rendering preview...")
+        worker = PreviewWorker(
+            self.art_generator,
+            image_path,
+            self.scale_spinbox.value(),
+            self.dice_width_spinbox.value(),
+            self.PREVIEW_SIZE,
+            self.mapping_combo.currentText(),
+            self.palette_combo.currentText(),
+        )
+        worker.ready.connect(self.preview_ready)
+        worker.error.connect(self.preview_error)
+        # Cancelled workers stop at their next stage; keep them parented until then so Qt does not destroy them.
+        worker.setParent(self)
+        worker.finished.connect(worker.deleteLater)
+        self.preview_worker = worker
+        worker.start()
+
+    def preview_ready(self, qimage, total_dice):
+        if self.sender() is not self.preview_worker:
+            return  # Stale preview for settings that have since changed
+        self.preview_label.setPixmap(QtGui.QPixmap.fromImage(qimage))
+        self.status_label.setText(f"Preview uses {total_dice} dice. Generate to render at full resolution.")
+
+    def preview_error(self, error_message):
+        if self.sender() is not self.preview_worker:
+            return
+        self.preview_label.clear()
+        self.preview_label.setText(f"Preview unavailable: {error_message}")
+
     def start_conversion(self):
         image_path = self.file_input.text()
         if not Path(image_path).is_file():
@@ -249,44 +497,123 @@ class DiceArtApp(QMainWindow):
                 "Input Error", "Please select a valid image file before generating art.", QMessageBox.Warning
             )
             return
-
-        self.set_ui_enabled(False)
-        self.progress_bar.setValue(0)
-        self.status_label.setText("Generating your dice art... This might take a moment.")
-
-        self.worker = ConversionWorker(image_path, self.scale_spinbox.value())
-        self.worker.progress.connect(self.update_progress)
-        self.worker.finished.connect(self.conversion_finished)
-        self.worker.error.connect(self.conversion_error)
-        self.worker.start()
-
-    def update_progress(self, value):
-        self.progress_bar.setValue(value)
-
-    def conversion_finished(self, output_path, total_dice):
-        self.set_ui_enabled(True)
-        self.progress_bar.setValue(100)
-        self.status_label.setText(f"Dice art generated! Used {total_dice} dice.")
-        self.show_message(
-            "Conversion Complete", f"Your awesome dice art has been saved to:\n{output_path}", QMessageBox.Information
+        self.enqueue_job(image_path)
+
+    def enqueue_job(self, image_path):
+        job_id = self.next_job_id
+        self.next_job_id += 1
+
+        job = ConversionJob(
+            job_id,
+            self.art_generator,
+            image_path,
+            self.scale_spinbox.value(),
+            self.dice_width_spinbox.value(),
+            self.mapping_combo.currentText(),
+            self.palette_combo.currentText(),
         )
-        self.reset_ui_state()
-
-    def conversion_error(self, error_message):
-        self.set_ui_enabled(True)
-        self.status_label.setText("Conversion failed!")
-        self.show_message("Conversion Error", f"An error occurred: {error_message}", QMessageBox.Critical)
-
-    def set_ui_enabled(self, enabled):
-        self.file_input.setEnabled(enabled)
-        # self.browse_button is integrated into file_input as an action
-        self.scale_spinbox.setEnabled(enabled)
-        self.generate_button.setEnabled(enabled)
+        job.signals.progress.connect(self.update_progress)
+        job.signals.finished.connect(self.conversion_finished)
+        job.signals.error.connect(self.conversion_error)
+        job.signals.cancelled.connect(self.conversion_cancelled)
+
+        item = QListWidgetItem()
+        item.setData(QtCore.Qt.UserRole, job_id)
+        self.queue_list.addItem(item)
+        self.jobs[job_id] = job
+        self.job_items[job_id] = item
+        self.set_job_state(job_id, "Queued", 0)
+
+        self.thread_pool.start(job)
+        self.status_label.setText(f"Queued {Path(image_path).name}. Keep adding photos while it renders.")
+
+    def set_job_state(self, job_id, state, progress=None):
+        job = self.jobs[job_id]
+        if progress is None:
+            progress = self.job_states[job_id][1]
+        self.job_states[job_id] = (state, progress)
+        self.job_items[job_id].setText(f"{Path(job.image_path).name}  ({job.scale}x, {job.dice_width} dice)  {state}")
+        self.update_overall_progress()
+
+    def update_overall_progress(self):
+        active = [progress for state, progress in self.job_states.values() if state != "Cancelled"]
+        self.progress_bar.setValue(int(sum(active) / len(active)) if active else 0)
+
+    def update_progress(self, job_id, value):
+        if job_id in self.jobs and self.job_states[job_id][0] != "Cancelling...":
+            self.set_job_state(job_id, f"{value}%", value)
+
+    def conversion_finished(self, job_id, output_path, total_dice):
+        if job_id in self.jobs:
+            self.set_job_state(job_id, f"Done, {total_dice} dice", 100)
+            self.job_items[job_id].setToolTip(output_path)
+        dice_by_color = self.jobs[job_id].dice_by_color if job_id in self.jobs else {}
+        if dice_by_color:
+            total_dice = f"{total_dice} ({', '.join(f'{count} {name}' for name, count in dice_by_color.items())})"
+        self.status_label.setText(f"Dice art generated! Used {total_dice} dice. Saved to {output_path}")
+
+    def conversion_error(self, job_id, error_message):
+        if job_id in self.jobs:
+            self.set_job_state(job_id, "Failed", 100)
+            self.job_items[job_id].setToolTip(error_message)
+        self.status_label.setText(f"Conversion failed: {error_message}")
+
+    def conversion_cancelled(self, job_id):
+        if job_id in self.jobs:
+            self.set_job_state(job_id, "Cancelled")
+
+    def job_is_finished(self, job_id):
+        state = self.job_states[job_id][0]
+        return state in ("Cancelled", "Failed") or state.startswith("Done")
+
+    def cancel_job(self, job_id):
+        job = self.jobs[job_id]
+        job.cancel()
+        if self.thread_pool.tryTake(job):
+            # Never started, so no worker will report back
+            self.set_job_state(job_id, "Cancelled")
+        elif not self.job_is_finished(job_id):
+            self.set_job_state(job_id, "Cancelling...")
+
+    def cancel_selected_jobs(self):
+        for item in self.queue_list.selectedItems():
+            self.cancel_job(item.data(QtCore.Qt.UserRole))
+
+    def clear_finished_jobs(self):
+        for job_id in list(self.jobs):
+            if self.job_is_finished(job_id):
+                self.queue_list.takeItem(self.queue_list.row(self.job_items.pop(job_id)))
+                del self.jobs[job_id], self.job_states[job_id]
+        self.update_overall_progress()
+
+    def dragEnterEvent(self, event):
+        if event.mimeData().hasUrls():
+            event.acceptProposedAction()
+
+    def dropEvent(self, event):
+        for url in event.mimeData().urls():
+            path = Path(url.toLocalFile())
+            if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS:
+                self.enqueue_job(str(path))
+        event.acceptProposedAction()
+
+    def closeEvent(self, event):
+        self.cancel_preview()
+        for job_id in list(self.jobs):
+            self.jobs[job_id].cancel()
+        self.thread_pool.clear()
+        self.thread_pool.waitForDone()
+        # Cancelled previews, including ones already superseded, stop at their next stage; a QThread destroyed
+        # while still running aborts the process.
+        for worker in self.findChildren(PreviewWorker):
+            worker.cancel()
+            worker.wait()
+        super().closeEvent(event)
 
     def reset_ui_state(self):
         self.file_input.clear()
         self.scale_spinbox.setValue(1)
-        self.progress_bar.setValue(0)
+        self.dice_width_spinbox.setValue(ArtGenerator.DEFAULT_DICE_WIDTH)
         self.status_label.setText("Ready to convert!")
 
     def show_message(self, title, message, icon=QMessageBox.Information):
@@ -320,6 +647,7 @@ class DiceArtApp(QMainWindow):
 
 
 def main():
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
     QApplication.setStyle(QStyleFactory.create("Fusion"))
     app = QApplication(sys.argv)
     window = DiceArtApp()
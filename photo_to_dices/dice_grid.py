@@ -0,0 +1,190 @@
+import math
+
+import numpy as np
+
+FACE_COUNT = 6
+BACKGROUND_COLOR = 255
+MAPPINGS = ("flat", "bayer", "floyd-steinberg")
+DEFAULT_MAPPING = "flat"
+# The face of a die depends only on its own mean and position, so any band of rows can be mapped on its own.
+LOCAL_MAPPINGS = ("flat", "bayer")
+BAYER_MATRIX = np.array([[0, 8, 2, 10], [12, 4, 14, 6], [3, 11, 1, 9], [15, 7, 13, 5]])
+BAYER_OFFSETS = (BAYER_MATRIX + 0.5) / BAYER_MATRIX.size - 0.5
+# Floyd-Steinberg weights for the die to the right and the three below, left to right.
+DIFFUSE_RIGHT, DIFFUSE_BELOW_LEFT, DIFFUSE_BELOW, DIFFUSE_BELOW_RIGHT = 7 / 16, 3 / 16, 5 / 16, 1 / 16
+
+
+class ConversionCancelled(Exception):
+    pass
+
+
+def check_cancelled(cancel_token):
+    # Any object with an `is_set()` method works, e.g. `threading.Event`.
+    if cancel_token is not None and cancel_token.is_set():
+        raise ConversionCancelled()
+
+
+def grid_shape(width, height, dice_size):
+    # Mirrors the legacy `range(0, size - dice_size, dice_size)` loops, which never place a die
+    # flush against the right or bottom edge.
+    rows = len(range(0, height - dice_size, dice_size))
+    cols = len(range(0, width - dice_size, dice_size))
+    return rows, cols
+
+
+def stack_faces(dice_faces, mode="L"):
+    # Pasting an RGB face into an "L" canvas converts it the same way, so the stacked tiles composite identically.
+    return np.stack([np.asarray(face.convert(mode)) for face in dice_faces])
+
+
+def block_means(array, dice_size, rows, cols):
+    # A trailing channel axis of color images is kept, giving one mean per channel.
+    blocks = array[: rows * dice_size, : cols * dice_size].reshape(rows, dice_size, cols, dice_size, *array.shape[2:])
+    # Integer sums are exact, so dividing once gives the same float64 as `np.mean` on each block.
+    sums = blocks.sum(axis=(1, 3), dtype=np.int64)
+    return sums / (dice_size * dice_size)
+
+
+def means_to_faces(means):
+    faces = ((255 - means) * 6.0 / 255 + 1).astype(np.int64)
+    return np.clip(faces, 1, FACE_COUNT).astype(np.uint8)
+
+
+def check_mapping(mapping):
+    if mapping not in MAPPINGS:
+        raise ValueError(f"Unknown mapping {mapping!r}, expected one of {MAPPINGS}")
+
+
+def face_levels(means):
+    # Darkness in face units: face n covers levels [n - 1, n), so the flat mapping rounds to the nearest n - 0.5.
+    return (255 - means) * (FACE_COUNT / 255)
+
+
+def bayer_faces(means, row_offset=0):
+    # Ordered dithering: a 4x4 threshold pattern, anchored at the top-left die of the whole grid, nudges each
+    # level by up to half a face so smooth gradients turn into a fine mix of neighbouring faces.
+    rows, cols = means.shape
+    offsets = np.roll(BAYER_OFFSETS, -row_offset, axis=0)
+    offsets = np.tile(offsets, (-(-rows // 4), -(-cols // 4)))[:rows, :cols]
+    faces = np.floor(face_levels(means) + offsets) + 1
+    return np.clip(faces, 1, FACE_COUNT).astype(np.uint8)
+
+
+def error_diffusion_faces(means):
+    # Floyd-Steinberg. A die depends on its left neighbour and the three dice above it, so every die on the line
+    # col + 2 * row = step is ready at once; on the row-major grid those dice are evenly spaced, and each step is a
+    # handful of strided slice operations instead of a Python loop over dice.
+    rows, cols = means.shape
+    if rows == 0 or cols == 0:
+        return np.zeros((rows, cols), dtype=np.uint8)
+    stride = cols + 2
+    levels = np.zeros((rows + 1, stride))
+    levels[:rows, 1 : cols + 1] = face_levels(means)
+    # Error from the row above and from the left neighbour are kept apart and added in the same order as
+    # FaceRowMapper adds them, so both give identical faces.
+    below = np.zeros_like(levels)
+    right = np.zeros_like(levels)
+    faces = np.zeros_like(levels)
+    levels_flat, below_flat, right_flat, faces_flat = (a.reshape(-1) for a in (levels, below, right, faces))
+
+    step = stride - 2
+    for diagonal in range(cols + 2 * (rows - 1)):
+        first_row = max(0, -((cols - 1 - diagonal) // 2))
+        last_row = min(rows - 1, diagonal // 2)
+        start = first_row * step + diagonal + 1
+        stop = last_row * step + diagonal + 2
+        level = levels_flat[start:stop:step] + below_flat[start:stop:step]
+        level += right_flat[start:stop:step]
+        face = np.floor(level)
+        face += 1
+        np.clip(face, 1, FACE_COUNT, out=face)
+        faces_flat[start:stop:step] = face
+        error = level - face
+        error += 0.5
+        right_flat[start + 1 : stop + 1 : step] = error * DIFFUSE_RIGHT
+        below_flat[start + stride - 1 : stop + stride - 1 : step] += error * DIFFUSE_BELOW_LEFT
+        below_flat[start + stride : stop + stride : step] += error * DIFFUSE_BELOW
+        below_flat[start + stride + 1 : stop + stride + 1 : step] += error * DIFFUSE_BELOW_RIGHT
+    return faces[:rows, 1 : cols + 1].astype(np.uint8)
+
+
+def map_faces(means, mapping=DEFAULT_MAPPING, row_offset=0):
+    # `row_offset` is the grid row of `means[0]`, for local mappings applied to a band of rows.
+    if mapping == "flat":
+        return means_to_faces(means)
+    if mapping == "bayer":
+        return bayer_faces(means, row_offset)
+    if mapping == "floyd-steinberg":
+        if row_offset:
+            raise ValueError("floyd-steinberg needs the whole grid; map bands with FaceRowMapper instead")
+        return error_diffusion_faces(means)
+    check_mapping(mapping)
+
+
+class FaceRowMapper:
+    # Maps a grid one row of block means at a time, top to bottom, for engines that never hold all the means.
+    def __init__(self, cols, mapping=DEFAULT_MAPPING):
+        check_mapping(mapping)
+        self.cols = cols
+        self.mapping = mapping
+        self.row = 0
+        self._below = [0.0] * (cols + 2)
+
+    def map_row(self, means_row):
+        if self.mapping in LOCAL_MAPPINGS:
+            faces = map_faces(means_row[None], self.mapping, self.row)[0]
+        else:
+            faces = self._diffuse_row(face_levels(np.asarray(means_row, dtype=np.float64)).tolist())
+        self.row += 1
+        return faces
+
+    def _diffuse_row(self, levels):
+        below, next_below = self._below, [0.0] * (self.cols + 2)
+        faces = bytearray(self.cols)
+        carried = 0.0
+        for col, level in enumerate(levels):
+            level = level + below[col + 1] + carried
+            face = min(FACE_COUNT, max(1, math.floor(level) + 1))
+            faces[col] = face
+            error = level - face + 0.5
+            carried = error * DIFFUSE_RIGHT
+            next_below[col] += error * DIFFUSE_BELOW_LEFT
+            next_below[col + 1] += error * DIFFUSE_BELOW
+            next_below[col + 2] += error * DIFFUSE_BELOW_RIGHT
+        self._below = next_below
+        return np.frombuffer(bytes(faces), dtype=np.uint8)
+
+
+def compute_face_grid(array, dice_size, mapping=DEFAULT_MAPPING):
+    rows, cols = grid_shape(array.shape[1], array.shape[0], dice_size)
+    return map_faces(block_means(array, dice_size, rows, cols), mapping)
+
+
+def render_face_row(face_row, face_stack):
+    dice_size = face_stack.shape[1]
+    tiles = face_stack[face_row.astype(np.intp) - 1]
+    return tiles.swapaxes(0, 1).reshape(dice_size, len(face_row) * dice_size, *face_stack.shape[3:])
+
+
+def render_face_grid(face_grid, face_stack, width, height, progress_callback=None, cancel_token=None, out=None):
+    # Stacks of RGB faces render an RGB canvas. `out` is an existing uint8 array of that shape to render into.
+    dice_size = face_stack.shape[1]
+    rows, cols = face_grid.shape
+    shape = (height, width, *face_stack.shape[3:])
+    if out is None:
+        output = np.full(shape, BACKGROUND_COLOR, dtype=np.uint8)
+    elif out.shape != shape:
+        raise ValueError(f"Expected an output array of shape {shape}, got {out.shape}")
+    else:
+        output = out
+        output.fill(BACKGROUND_COLOR)
+    total_rows = (height - dice_size) // dice_size
+
+    for row in range(rows):
+        check_cancelled(cancel_token)
+        y = row * dice_size
+        output[y : y + dice_size, : cols * dice_size] = render_face_row(face_grid[row], face_stack)
+        if progress_callback and total_rows > 0:
+            progress_callback(int((row / total_rows) * 100))
+
+    return output
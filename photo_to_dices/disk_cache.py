@@ -0,0 +1,128 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+STALE_TEMPORARY_SECONDS = 24 * 60 * 60
+
+
+def cache_key(*parts):
+    return hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    # Content-addressed files under `<directory>/<key[:2]>/<key>`, evicted least recently used first once
+    # they exceed `max_bytes` or go unused for `max_age` seconds. Writes land in `tmp/` and are renamed into place,
+    # so readers never see a partial file.
+    DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, max_age=None):
+        self.directory = Path(directory).expanduser()
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.tmp_dir = self.directory / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        # Other processes may share the directory, so only temporaries left behind by a crash long ago are removed.
+        for path in self.tmp_dir.iterdir():
+            try:
+                if time.time() - path.stat().st_mtime > STALE_TEMPORARY_SECONDS:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+        files = []
+        for path in self.directory.glob("??/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime_ns, path.name, stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._bytes += size
+        with self._lock:
+            self._evict()
+
+    def path_for(self, key):
+        return self.directory / key[:2] / key
+
+    def temporary_path(self, suffix=""):
+        return self.tmp_dir / f"{uuid.uuid4().hex}{suffix}"
+
+    def get(self, key):
+        path = self.path_for(key)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            elif path.is_file():
+                # Written by another process sharing the directory since this one loaded it.
+                size = path.stat().st_size
+                self._entries[key] = size
+                self._bytes += size
+            else:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._evict()
+        try:
+            # The modification time doubles as the recency the entries are ordered by after a restart.
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._bytes -= self._entries.pop(key, 0)
+            return None
+        return path
+
+    def put_file(self, key, source_path):
+        # Moves `source_path` (normally from `temporary_path()`) into the cache.
+        path = self.path_for(key)
+        path.parent.mkdir(exist_ok=True)
+        size = Path(source_path).stat().st_size
+        os.replace(source_path, path)
+        with self._lock:
+            self._bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+        return path
+
+    def put(self, key, data):
+        source_path = self.temporary_path()
+        source_path.write_bytes(data)
+        return self.put_file(key, source_path)
+
+    def _expired(self, key):
+        if self.max_age is None:
+            return False
+        try:
+            return time.time() - self.path_for(key).stat().st_mtime > self.max_age
+        except FileNotFoundError:
+            return True
+
+    def _evict(self):
+        # Entries are ordered by last use, so only the oldest one ever needs its age checked.
+        while self._entries and (self._bytes > self.max_bytes or self._expired(next(iter(self._entries)))):
+            key, size = self._entries.popitem(last=False)
+            self.path_for(key).unlink(missing_ok=True)
+            self._bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
@@ -0,0 +1,263 @@
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from photo_to_dices.dice_grid import BACKGROUND_COLOR
+from photo_to_dices.parallel import default_worker_count
+
+OUTPUT_FORMATS = ("jpeg", "png", "png-palette", "png-1bit", "tiff")
+# Formats that can be written one band of rows at a time, so the streaming engine can use them.
+STREAMING_FORMATS = ("png", "tiff")
+FORMAT_SUFFIXES = {"png": ".png", "png-palette": ".png", "png-1bit": ".png", "tiff": ".tif"}
+DEFAULT_COMPRESS_LEVEL = 6
+# Dice faces are mostly flat black and white with anti-aliased edges, so 16 gray levels lose very little.
+PALETTE_LEVELS = 16
+ONE_BIT_THRESHOLD = 128
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+TIFF_TILE_SIZE = 256
+
+
+def palette_lut(levels=PALETTE_LEVELS):
+    step = 255 / (levels - 1)
+    return [round(value / step) for value in range(256)], [round(index * step) for index in range(levels)]
+
+
+def check_compress_level(output_format, compress_level):
+    # `compress_level` is the zlib level (0-9) for the zlib-based formats: lower is faster and larger.
+    if compress_level is None:
+        return
+    if output_format in ("jpeg", "svg", "gif", "webp"):
+        raise ValueError(f"compress_level does not apply to {output_format} output")
+    if not 0 <= compress_level <= 9:
+        raise ValueError(f"compress_level must be between 0 and 9, got {compress_level}")
+
+
+def save_image(image, path, output_format="jpeg", compress_level=None):
+    check_compress_level(output_format, compress_level)
+    if output_format == "jpeg":
+        image.save(path, "JPEG")
+        return
+
+    compress_level = DEFAULT_COMPRESS_LEVEL if compress_level is None else compress_level
+    if output_format == "png":
+        image.save(path, "PNG", compress_level=compress_level)
+    elif output_format == "png-palette":
+        index_lut, levels = palette_lut()
+        indexed = image.point(index_lut)
+        indexed.putpalette([level for level in levels for _ in range(3)])
+        indexed.save(path, "PNG", bits=4, compress_level=compress_level)
+    elif output_format == "png-1bit":
+        threshold_lut = [255 if value >= ONE_BIT_THRESHOLD else 0 for value in range(256)]
+        image.point(threshold_lut, "1").save(path, "PNG", compress_level=compress_level)
+    elif output_format == "tiff":
+        array = np.asarray(image)
+        with TiledTiffWriter(path, image.width, image.height, compress_level=compress_level) as writer:
+            for y in range(0, image.height, TIFF_TILE_SIZE):
+                writer.write_rows(array[y : y + TIFF_TILE_SIZE])
+    else:
+        raise ValueError(f"Unknown output format {output_format!r}, expected one of {OUTPUT_FORMATS}")
+
+
+def open_stream_writer(path, width, height, output_format="png", compress_level=None):
+    compress_level = DEFAULT_COMPRESS_LEVEL if compress_level is None else compress_level
+    if output_format == "png":
+        return PngStreamWriter(path, width, height, compress_level)
+    if output_format == "tiff":
+        return TiledTiffWriter(path, width, height, compress_level=compress_level)
+    raise ValueError(f"The {output_format} format cannot be streamed, expected one of {STREAMING_FORMATS}")
+
+
+class RowWriter:
+    def __init__(self, path, width, height):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._file = open(path, "wb")
+
+    def _check_rows(self, rows):
+        if rows.shape[1] != self.width or self.rows_written + rows.shape[0] > self.height:
+            raise ValueError(f"Rows of shape {rows.shape} do not fit a {self.width}x{self.height} image")
+
+    def _check_complete(self):
+        if self.rows_written != self.height:
+            raise ValueError(f"Wrote {self.rows_written} of {self.height} rows to {self.path}")
+
+    def abort(self):
+        self._file.close()
+        Path(self.path).unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Never leave a truncated file behind that could be mistaken for a finished conversion.
+            self.abort()
+
+
+class PngStreamWriter(RowWriter):
+    IDAT_CHUNK_SIZE = 1 << 20
+
+    def __init__(self, path, width, height, compress_level=DEFAULT_COMPRESS_LEVEL):
+        super().__init__(path, width, height)
+        self._compressor = zlib.compressobj(compress_level)
+        self._pending = bytearray()
+        self._file.write(PNG_SIGNATURE)
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+
+    def _write_chunk(self, chunk_type, data):
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+    def _flush_pending(self, force=False):
+        while len(self._pending) >= self.IDAT_CHUNK_SIZE or (force and self._pending):
+            self._write_chunk(b"IDAT", bytes(self._pending[: self.IDAT_CHUNK_SIZE]))
+            del self._pending[: self.IDAT_CHUNK_SIZE]
+
+    def write_rows(self, rows):
+        self._check_rows(rows)
+        # Every scanline gets a leading filter-type byte of 0 (no filtering).
+        filtered = np.zeros((rows.shape[0], self.width + 1), dtype=np.uint8)
+        filtered[:, 1:] = rows
+        self._pending += self._compressor.compress(filtered.tobytes())
+        self.rows_written += rows.shape[0]
+        self._flush_pending()
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            self._check_complete()
+            self._pending += self._compressor.flush()
+            self._flush_pending(force=True)
+            self._write_chunk(b"IEND", b"")
+        finally:
+            self._file.close()
+
+
+class TiledTiffWriter(RowWriter):
+    # Little-endian classic TIFF, 8-bit grayscale, deflate-compressed square tiles. Rows are buffered
+    # until a full band of tiles is available; the band's tiles are then compressed on a thread pool
+    # (zlib releases the GIL) while the caller keeps producing rows.
+    TAG_SHORT = 3
+    TAG_LONG = 4
+    COMPRESSION_DEFLATE = 8
+    MAX_PENDING_BANDS = 2
+
+    def __init__(
+        self, path, width, height, tile_size=TIFF_TILE_SIZE, compress_level=DEFAULT_COMPRESS_LEVEL, threads=None
+    ):
+        if tile_size % 16:
+            raise ValueError(f"TIFF tile size must be a multiple of 16, got {tile_size}")
+        super().__init__(path, width, height)
+        self.tile_size = tile_size
+        self.compress_level = compress_level
+        self.tiles_across = -(-width // tile_size)
+        self._band = np.full((tile_size, self.tiles_across * tile_size), BACKGROUND_COLOR, dtype=np.uint8)
+        self._band_rows = 0
+        self._pending = deque()
+        self._offsets = []
+        self._byte_counts = []
+        self._executor = ThreadPoolExecutor(max_workers=threads or default_worker_count())
+        # The first IFD offset is patched in once the tile data has been written.
+        self._file.write(b"II*\x00\x00\x00\x00\x00")
+
+    def _compress_tile(self, tile):
+        return zlib.compress(tile.tobytes(), self.compress_level)
+
+    def _submit_band(self):
+        tiles = [
+            self._band[:, x : x + self.tile_size].copy()
+            for x in range(0, self.tiles_across * self.tile_size, self.tile_size)
+        ]
+        self._pending.append([self._executor.submit(self._compress_tile, tile) for tile in tiles])
+        self._band.fill(BACKGROUND_COLOR)
+        self._band_rows = 0
+        while len(self._pending) > self.MAX_PENDING_BANDS:
+            self._write_band(self._pending.popleft())
+
+    def _write_band(self, futures):
+        for future in futures:
+            data = future.result()
+            self._offsets.append(self._file.tell())
+            self._byte_counts.append(len(data))
+            self._file.write(data)
+            if self._file.tell() >= 1 << 32:
+                raise ValueError(f"{self.path} exceeds the 4 GiB limit of a classic TIFF file")
+
+    def write_rows(self, rows):
+        self._check_rows(rows)
+        start = 0
+        while start < rows.shape[0]:
+            count = min(rows.shape[0] - start, self.tile_size - self._band_rows)
+            self._band[self._band_rows : self._band_rows + count, : self.width] = rows[start : start + count]
+            self._band_rows += count
+            start += count
+            if self._band_rows == self.tile_size:
+                self._submit_band()
+        self.rows_written += rows.shape[0]
+
+    def _write_array(self, values):
+        self._align()
+        offset = self._file.tell()
+        self._file.write(struct.pack(f"<{len(values)}I", *values))
+        return offset
+
+    def _align(self):
+        if self._file.tell() % 2:
+            self._file.write(b"\x00")
+
+    def _write_ifd(self):
+        tile_count = len(self._offsets)
+        offsets = self._offsets[0] if tile_count == 1 else self._write_array(self._offsets)
+        byte_counts = self._byte_counts[0] if tile_count == 1 else self._write_array(self._byte_counts)
+        entries = [
+            (256, self.TAG_LONG, 1, self.width),
+            (257, self.TAG_LONG, 1, self.height),
+            (258, self.TAG_SHORT, 1, 8),
+            (259, self.TAG_SHORT, 1, self.COMPRESSION_DEFLATE),
+            (262, self.TAG_SHORT, 1, 1),  # BlackIsZero
+            (277, self.TAG_SHORT, 1, 1),
+            (284, self.TAG_SHORT, 1, 1),
+            (322, self.TAG_LONG, 1, self.tile_size),
+            (323, self.TAG_LONG, 1, self.tile_size),
+            (324, self.TAG_LONG, tile_count, offsets),
+            (325, self.TAG_LONG, tile_count, byte_counts),
+        ]
+        self._align()
+        ifd_offset = self._file.tell()
+        self._file.write(struct.pack("<H", len(entries)))
+        for tag, tag_type, count, value in entries:
+            packed_value = struct.pack("<HH", value, 0) if tag_type == self.TAG_SHORT else struct.pack("<I", value)
+            self._file.write(struct.pack("<HHI", tag, tag_type, count) + packed_value)
+        self._file.write(struct.pack("<I", 0))
+        self._file.seek(4)
+        self._file.write(struct.pack("<I", ifd_offset))
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            self._check_complete()
+            if self._band_rows:
+                self._submit_band()
+            while self._pending:
+                self._write_band(self._pending.popleft())
+            self._write_ifd()
+        finally:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._file.close()
+
+    def abort(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        super().abort()
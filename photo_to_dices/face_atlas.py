@@ -0,0 +1,41 @@
+import logging
+from pathlib import Path
+
+from PIL import Image
+
+from photo_to_dices.dice_grid import FACE_COUNT, stack_faces
+from photo_to_dices.lru import ArrayLRUCache
+
+DEFAULT_FACE_SET = Path(__file__).parent / "dice"
+
+logger = logging.getLogger(__name__)
+
+
+def load_face_images(dice_size, face_set=DEFAULT_FACE_SET):
+    face_set = Path(face_set)
+    dice_images = []
+    for i in range(1, FACE_COUNT + 1):
+        dice_path = face_set / f"{i}.png"
+        logger.debug(f"Loading dice image: {dice_path}")
+        with Image.open(dice_path) as dice_image:
+            dice_images.append(dice_image.resize((dice_size, dice_size), Image.Resampling.LANCZOS))
+    return dice_images
+
+
+def load_face_sources(face_set=DEFAULT_FACE_SET, mode="L"):
+    # The faces at their original resolution, for outputs that scale them when displayed.
+    face_set = Path(face_set)
+    faces = []
+    for i in range(1, FACE_COUNT + 1):
+        with Image.open(face_set / f"{i}.png") as face_image:
+            faces.append(face_image.convert(mode))
+    return faces
+
+
+class FaceAtlasCache(ArrayLRUCache):
+    def get(self, dice_size, face_set=DEFAULT_FACE_SET, mode="L"):
+        key = (str(Path(face_set).resolve()), dice_size, mode)
+        return self.get_or_compute(key, lambda: stack_faces(load_face_images(dice_size, face_set), mode))
+
+
+face_atlas = FaceAtlasCache()
@@ -0,0 +1,119 @@
+import hashlib
+import struct
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from photo_to_dices.dice_grid import render_face_grid
+from photo_to_dices.face_atlas import DEFAULT_FACE_SET, face_atlas
+
+GRID_FILE_MAGIC = b"DICEGRID"
+GRID_FILE_VERSION = 1
+GRID_FILE_SUFFIX = ".dgrid"
+# magic, version, bits per die, 2 pad bytes, rows, cols, dice size, canvas width, canvas height, source sha256
+GRID_FILE_HEADER = struct.Struct("<8sBB2xIIIII32s")
+DEFAULT_BITS = 3
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def packed_row_bytes(cols, bits):
+    return -(-cols * bits // 8)
+
+
+def pack_faces(face_grid, bits=DEFAULT_BITS):
+    if bits == 8:
+        return np.ascontiguousarray(face_grid, dtype=np.uint8)
+    rows, cols = face_grid.shape
+    # Keep the low `bits` bits of every face, most significant first, and pad each row to whole bytes
+    # so any row range can be unpacked straight from a memory map.
+    bit_planes = np.unpackbits(face_grid.astype(np.uint8)[..., None], axis=-1)[..., 8 - bits :]
+    return np.packbits(bit_planes.reshape(rows, cols * bits), axis=-1)
+
+
+def unpack_faces(packed, cols, bits=DEFAULT_BITS):
+    if bits == 8:
+        return np.asarray(packed[:, :cols])
+    rows = packed.shape[0]
+    bit_planes = np.unpackbits(packed, axis=-1, count=cols * bits).reshape(rows, cols, bits)
+    weights = (1 << np.arange(bits - 1, -1, -1)).astype(np.uint8)
+    return (bit_planes * weights).sum(axis=-1, dtype=np.uint8)
+
+
+def save_face_grid(path, face_grid, dice_size, canvas_size, source_hash=b"", bits=DEFAULT_BITS):
+    if not 1 <= bits <= 8:
+        raise ValueError(f"bits must be between 1 and 8, got {bits}")
+    if face_grid.size and int(face_grid.max()) >= 1 << bits:
+        raise ValueError(f"Face value {int(face_grid.max())} does not fit in {bits} bits")
+
+    rows, cols = face_grid.shape
+    header = GRID_FILE_HEADER.pack(
+        GRID_FILE_MAGIC, GRID_FILE_VERSION, bits, rows, cols, dice_size, *canvas_size, source_hash.ljust(32, b"\0")
+    )
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(pack_faces(face_grid, bits).tobytes())
+    return Path(path)
+
+
+class FaceGridFile:
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            header = f.read(GRID_FILE_HEADER.size)
+        if len(header) < GRID_FILE_HEADER.size:
+            raise ValueError(f"{self.path} is too short to be a dice grid file")
+
+        magic, version, bits, rows, cols, dice_size, width, height, source_hash = GRID_FILE_HEADER.unpack(header)
+        if magic != GRID_FILE_MAGIC:
+            raise ValueError(f"{self.path} is not a dice grid file")
+        if version != GRID_FILE_VERSION:
+            raise ValueError(f"Unsupported dice grid file version {version}")
+
+        self.bits = bits
+        self.rows = rows
+        self.cols = cols
+        self.dice_size = dice_size
+        self.canvas_size = (width, height)
+        self.source_hash = source_hash.hex() if source_hash.strip(b"\0") else None
+        row_bytes = cols if bits == 8 else packed_row_bytes(cols, bits)
+        if rows and row_bytes:
+            self._packed = np.memmap(
+                self.path, dtype=np.uint8, mode="r", offset=GRID_FILE_HEADER.size, shape=(rows, row_bytes)
+            )
+        else:
+            self._packed = np.zeros((rows, row_bytes), dtype=np.uint8)
+
+    @property
+    def shape(self):
+        return self.rows, self.cols
+
+    def read_rows(self, start=0, stop=None):
+        return unpack_faces(self._packed[start:stop], self.cols, self.bits)
+
+    @property
+    def face_grid(self):
+        return self.read_rows()
+
+    def canvas_size_for(self, dice_size):
+        if dice_size == self.dice_size:
+            return self.canvas_size
+        width, height = self.canvas_size
+        return (
+            max(self.cols * dice_size, round(width * dice_size / self.dice_size)),
+            max(self.rows * dice_size, round(height * dice_size / self.dice_size)),
+        )
+
+    def render(self, dice_size=None, face_set=DEFAULT_FACE_SET, progress_callback=None, palette=None):
+        # Grids of a multi-set palette hold faces past 6 and need the same Palette to render.
+        dice_size = dice_size or self.dice_size
+        width, height = self.canvas_size_for(dice_size)
+        face_stack = palette.face_stack(dice_size) if palette is not None else face_atlas.get(dice_size, face_set)
+        return Image.fromarray(render_face_grid(self.face_grid, face_stack, width, height, progress_callback))
@@ -0,0 +1,72 @@
+import cProfile
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+
+class ConversionMetrics:
+    STAGES = ("open", "grayscale", "equalize", "resize", "grid", "composite", "save")
+
+    def __init__(self, profile=False, trace_memory=False):
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.stage_seconds = {}
+        self.counters = {}
+        self.profile_stats = None
+        self.memory_peak_bytes = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            # Stages accumulate so row-by-row engines can time each row under the same name.
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @property
+    def total_seconds(self):
+        return sum(self.stage_seconds.values())
+
+    @contextmanager
+    def capture(self):
+        # cProfile only sees the calling thread; tracemalloc only sees Python-visible allocations such as NumPy's.
+        profiler = cProfile.Profile() if self.profile else None
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        if profiler:
+            profiler.enable()
+        try:
+            yield self
+        finally:
+            if profiler:
+                profiler.disable()
+                self.profile_stats = pstats.Stats(profiler)
+            if self.trace_memory:
+                _, self.memory_peak_bytes = tracemalloc.get_traced_memory()
+                if started_tracing:
+                    tracemalloc.stop()
+
+    def as_dict(self):
+        result = {
+            "stages": {name: round(seconds, 6) for name, seconds in self.stage_seconds.items()},
+            "counters": dict(self.counters),
+            "total_seconds": round(self.total_seconds, 6),
+        }
+        if self.memory_peak_bytes is not None:
+            result["memory_peak_bytes"] = self.memory_peak_bytes
+        return result
+
+    def summary(self):
+        return ", ".join(f"{name}={seconds:.3f}s" for name, seconds in self.stage_seconds.items())
+
+
+def timed(metrics, name):
+    return metrics.stage(name) if metrics is not None else nullcontext()
@@ -0,0 +1,43 @@
+import json
+import time
+
+from photo_to_dices.disk_cache import DiskCache, cache_key
+
+MANIFEST_SUFFIX = ".json"
+DEFAULT_STORE_DIR = "~/tmp/photo2dice-store"
+
+
+class OutputStore(DiskCache):
+    # Finished conversions keyed by the source content and every parameter that changes the result, so photos that
+    # share a file name never overwrite each other and a resubmitted photo is answered without converting it again.
+    # Each output `<key><suffix>` has a manifest record `<key>.json` beside it holding the dice count and what produced
+    # it; finding an output is a single lookup of that record by key.
+    DEFAULT_MAX_BYTES = 4 * 1024 * 1024 * 1024
+
+    def __init__(self, directory=DEFAULT_STORE_DIR, max_bytes=DEFAULT_MAX_BYTES, max_age=None):
+        super().__init__(directory, max_bytes, max_age)
+
+    @staticmethod
+    def key_for(source_hash, **params):
+        return cache_key("output", source_hash, *(f"{name}={params[name]}" for name in sorted(params)))
+
+    def lookup(self, key):
+        # Returns (output path, manifest record) or None.
+        record_path = self.get(f"{key}{MANIFEST_SUFFIX}")
+        if record_path is None:
+            return None
+        try:
+            record = json.loads(record_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        output_path = self.get(record["output"])
+        if output_path is None:
+            return None
+        return output_path, record
+
+    def store(self, key, output_path, suffix, **record):
+        # The output is moved in before its record, so a record is only ever visible once its output is in place.
+        stored_path = self.put_file(f"{key}{suffix}", output_path)
+        record.update(output=stored_path.name, created=time.time())
+        self.put(f"{key}{MANIFEST_SUFFIX}", json.dumps(record).encode("utf-8"))
+        return stored_path
@@ -0,0 +1,153 @@
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from photo_to_dices.dice_grid import FACE_COUNT, block_means, grid_shape, stack_faces
+from photo_to_dices.encoders import OUTPUT_FORMATS
+from photo_to_dices.face_atlas import DEFAULT_FACE_SET, face_atlas, load_face_images, load_face_sources
+from photo_to_dices.lru import ArrayLRUCache
+
+# Body and pip colors of the dice sets we stock. A palette entry can also be a face-set directory of colored faces.
+DICE_COLORS = {
+    "white": ((255, 255, 255), (0, 0, 0)),
+    "black": ((0, 0, 0), (255, 255, 255)),
+    "red": ((200, 16, 46), (255, 255, 255)),
+    "green": ((0, 132, 61), (255, 255, 255)),
+    "blue": ((0, 71, 171), (255, 255, 255)),
+    "yellow": ((255, 205, 0), (0, 0, 0)),
+}
+PALETTES = {
+    "white": ("white",),
+    "black-white": ("white", "black"),
+    "colors": ("white", "black", "red", "green", "blue", "yellow"),
+}
+DEFAULT_PALETTE = "white"
+# Face values are stored as uint8, so a palette holds at most 42 dice sets.
+MAX_FACES = 255
+# Bits kept per channel when indexing the color lookup table: 32 levels per channel, a 32 KiB table.
+LUT_BITS = 5
+# Grayscale palettes keep the full image through every gray output format; colored dice need a color format.
+COLOR_OUTPUT_FORMATS = ("jpeg", "png")
+# sRGB primaries to CIE XYZ, and the D65 white point.
+SRGB_TO_XYZ = np.array(
+    [[0.4124564, 0.3575761, 0.1804375], [0.2126729, 0.7151522, 0.0721750], [0.0193339, 0.1191920, 0.9503041]]
+)
+D65_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+lookup_tables = ArrayLRUCache(max_entries=8)
+
+
+def palette_entries(palette):
+    # `palette` is the name of a palette or a comma-separated list of dice colors and face-set directories.
+    entries = PALETTES.get(palette) or tuple(entry.strip() for entry in palette.split(",") if entry.strip())
+    for entry in entries:
+        if entry not in DICE_COLORS and not Path(entry).expanduser().is_dir():
+            raise ValueError(
+                f"Unknown palette or dice color {entry!r}, expected one of {tuple(PALETTES)}, "
+                f"colors from {tuple(DICE_COLORS)} or face-set directories"
+            )
+    if not entries or len(entries) * FACE_COUNT > MAX_FACES:
+        raise ValueError(f"A palette holds between 1 and {MAX_FACES // FACE_COUNT} dice sets, got {len(entries)}")
+    return entries
+
+
+def srgb_to_lab(rgb):
+    # CIE L*a*b* of sRGB values in 0-255; distances in it follow perceived color differences far better than RGB.
+    rgb = np.asarray(rgb, dtype=np.float64) / 255
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ SRGB_TO_XYZ.T / D65_WHITE
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+def tint_face(face, body, pips, mode="RGB"):
+    # Recolors a white die with black pips; the gray level of every pixel blends between the pip and body colors.
+    gray = np.asarray(face.convert("L"), dtype=np.float64)[..., None] / 255
+    body, pips = np.array(body, dtype=np.float64), np.array(pips, dtype=np.float64)
+    return Image.fromarray(np.rint(pips + (body - pips) * gray).astype(np.uint8), "RGB").convert(mode)
+
+
+class Palette:
+    # The dice sets a piece is built from. Face value v of a grid is face (v - 1) % 6 + 1 of set (v - 1) // 6, and
+    # every die takes the face whose average color is perceptually nearest to its block mean, looked up in a table
+    # precomputed over all colors so mapping a grid is a single gather.
+    def __init__(self, palette=DEFAULT_PALETTE, face_set=DEFAULT_FACE_SET):
+        self.name = palette
+        self.entries = palette_entries(palette)
+        self.face_set = Path(face_set)
+        self.labels = tuple(entry if entry in DICE_COLORS else Path(entry).name for entry in self.entries)
+        gray = all(
+            entry in DICE_COLORS and all(len(set(color)) == 1 for color in DICE_COLORS[entry]) for entry in self.entries
+        )
+        self.mode = "L" if gray else "RGB"
+        self.output_formats = OUTPUT_FORMATS if gray else COLOR_OUTPUT_FORMATS
+        self.key = (
+            tuple(entry if entry in DICE_COLORS else str(Path(entry).expanduser().resolve()) for entry in self.entries),
+            str(self.face_set.resolve()),
+        )
+
+    @property
+    def face_count(self):
+        return len(self.entries) * FACE_COUNT
+
+    def face_images(self, dice_size=None):
+        # All faces of every set in face-value order, at `dice_size` or at their source resolution.
+        def load(face_set, mode):
+            if dice_size is None:
+                return load_face_sources(face_set, mode)
+            return [face.convert(mode) for face in load_face_images(dice_size, face_set)]
+
+        faces = []
+        for entry in self.entries:
+            if entry in DICE_COLORS:
+                faces.extend(tint_face(face, *DICE_COLORS[entry], self.mode) for face in load(self.face_set, "L"))
+            else:
+                faces.extend(load(Path(entry).expanduser(), self.mode))
+        return faces
+
+    def face_stack(self, dice_size):
+        key = ("palette", self.key, dice_size, self.mode)
+        return face_atlas.get_or_compute(key, lambda: stack_faces(self.face_images(dice_size), self.mode))
+
+    def lookup_table(self):
+        return lookup_tables.get_or_compute(self.key, self._build_lookup_table)
+
+    def _build_lookup_table(self):
+        # Seen from a distance a die reads as the average color of its face.
+        colors = [np.asarray(face.convert("RGB"), dtype=np.float64).mean(axis=(0, 1)) for face in self.face_images()]
+        face_lab = srgb_to_lab(colors)
+        # No die is as light or as dark as the equalized photo gets, so the faces' lightness is spread over the full
+        # range, just as the flat mapping spreads six faces over all gray levels.
+        lightness = face_lab[:, 0]
+        if lightness.max() > lightness.min():
+            face_lab[:, 0] = (lightness - lightness.min()) / (lightness.max() - lightness.min()) * 100
+
+        if self.mode == "L":
+            shape = (256,)
+            levels = np.arange(256, dtype=np.float64)
+            colors = np.repeat(levels[:, None], 3, axis=1)
+        else:
+            shape = (1 << LUT_BITS,) * 3
+            levels = (np.arange(1 << LUT_BITS) + 0.5) * (256 >> LUT_BITS)
+            colors = np.stack(np.meshgrid(levels, levels, levels, indexing="ij"), axis=-1).reshape(-1, 3)
+        distances = ((srgb_to_lab(colors)[:, None, :] - face_lab[None, :, :]) ** 2).sum(axis=-1)
+        return (distances.argmin(axis=1) + 1).astype(np.uint8).reshape(shape)
+
+    def faces_for(self, means):
+        # `means` holds gray block means for grayscale palettes, or a trailing RGB axis for colored ones.
+        lut = self.lookup_table()
+        index = np.rint(means).astype(np.uint8)
+        if self.mode == "L":
+            return lut[index]
+        index >>= 8 - LUT_BITS
+        return lut[index[..., 0], index[..., 1], index[..., 2]]
+
+    def face_grid(self, array, dice_size):
+        rows, cols = grid_shape(array.shape[1], array.shape[0], dice_size)
+        return self.faces_for(block_means(array, dice_size, rows, cols))
+
+    def dice_counts(self, face_grid):
+        # Dice needed of every set, for ordering stock.
+        counts = np.bincount(face_grid.ravel(), minlength=self.face_count + 1)[1 : self.face_count + 1]
+        return {label: int(count) for label, count in zip(self.labels, counts.reshape(-1, FACE_COUNT).sum(axis=1))}
@@ -0,0 +1,106 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from photo_to_dices.dice_grid import (
+    BACKGROUND_COLOR,
+    DEFAULT_MAPPING,
+    LOCAL_MAPPINGS,
+    block_means,
+    check_cancelled,
+    grid_shape,
+    map_faces,
+    render_face_row,
+)
+
+# More bands than workers keeps the pool busy when bands finish unevenly and gives smoother progress.
+BANDS_PER_WORKER = 4
+
+
+def default_worker_count():
+    return os.cpu_count() or 1
+
+
+def split_rows(rows, band_count):
+    band_rows = max(1, math.ceil(rows / max(1, band_count)))
+    return [(start, min(rows, start + band_rows)) for start in range(0, rows, band_rows)]
+
+
+def _render_band(input_name, output_name, shape, face_stack, row_start, row_stop, mapping):
+    input_shm = shared_memory.SharedMemory(name=input_name)
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    try:
+        source = np.ndarray(shape, dtype=np.uint8, buffer=input_shm.buf)
+        output = np.ndarray(shape, dtype=np.uint8, buffer=output_shm.buf)
+        dice_size = face_stack.shape[1]
+        _, cols = grid_shape(shape[1], shape[0], dice_size)
+
+        band = source[row_start * dice_size : row_stop * dice_size]
+        face_rows = map_faces(block_means(band, dice_size, row_stop - row_start, cols), mapping, row_start)
+        for offset, face_row in enumerate(face_rows):
+            y = (row_start + offset) * dice_size
+            output[y : y + dice_size, : cols * dice_size] = render_face_row(face_row, face_stack)
+
+        # Views into the shared buffers must be gone before the mappings can be closed.
+        del source, output, band
+        return row_start, face_rows
+    finally:
+        input_shm.close()
+        output_shm.close()
+
+
+def render_parallel(array, face_stack, workers, progress_callback=None, cancel_token=None, mapping=DEFAULT_MAPPING):
+    if mapping not in LOCAL_MAPPINGS:
+        raise ValueError(f"{mapping} mapping needs the whole grid and cannot be split across workers")
+    height, width = array.shape
+    dice_size = face_stack.shape[1]
+    rows, cols = grid_shape(width, height, dice_size)
+    face_grid = np.zeros((rows, cols), dtype=np.uint8)
+
+    input_shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    output_shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    try:
+        source = np.ndarray(array.shape, dtype=np.uint8, buffer=input_shm.buf)
+        source[:] = array
+        output = np.ndarray(array.shape, dtype=np.uint8, buffer=output_shm.buf)
+        output.fill(BACKGROUND_COLOR)
+
+        bands = split_rows(rows, workers * BANDS_PER_WORKER)
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = [
+                executor.submit(
+                    _render_band,
+                    input_shm.name,
+                    output_shm.name,
+                    array.shape,
+                    face_stack,
+                    row_start,
+                    row_stop,
+                    mapping,
+                )
+                for row_start, row_stop in bands
+            ]
+            finished_rows = 0
+            for future in as_completed(futures):
+                check_cancelled(cancel_token)
+                row_start, face_rows = future.result()
+                face_grid[row_start : row_start + len(face_rows)] = face_rows
+                finished_rows += len(face_rows)
+                if progress_callback and rows > 0:
+                    progress_callback(int((finished_rows / rows) * 100))
+        finally:
+            # Bands that have not started yet are dropped when the conversion is cancelled or fails.
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        result = output.copy()
+        del source, output
+        return result, face_grid
+    finally:
+        input_shm.close()
+        input_shm.unlink()
+        output_shm.close()
+        output_shm.unlink()
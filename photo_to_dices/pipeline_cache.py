@@ -0,0 +1,95 @@
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from photo_to_dices.decoding import decode_face_grid
+from photo_to_dices.dice_grid import DEFAULT_MAPPING, compute_face_grid
+from photo_to_dices.grid_file import file_sha256
+from photo_to_dices.lru import ArrayLRUCache
+from photo_to_dices.metrics import timed
+
+
+def source_identity(image_path):
+    path = Path(image_path).resolve()
+    stat = os.stat(path)
+    return str(path), stat.st_mtime_ns, stat.st_size
+
+
+@lru_cache(maxsize=1024)
+def source_sha256(identity):
+    # The identity carries the modification time and size, so an edited file is hashed again.
+    return file_sha256(identity[0]).hex()
+
+
+def equalize_image(input_image, metrics=None):
+    with timed(metrics, "open"):
+        input_image.load()
+    with timed(metrics, "grayscale"):
+        gray_image = ImageOps.grayscale(input_image)
+    with timed(metrics, "equalize"):
+        return np.asarray(ImageOps.equalize(gray_image))
+
+
+def equalize_color_image(input_image, metrics=None):
+    # Equalizing the R, G and B channels apart would shift hues, so only the luminance is equalized.
+    with timed(metrics, "open"):
+        input_image.load()
+        luma, blue, red = input_image.convert("RGB").convert("YCbCr").split()
+    with timed(metrics, "equalize"):
+        return np.asarray(Image.merge("YCbCr", (ImageOps.equalize(luma), blue, red)).convert("RGB"))
+
+
+def scale_image(equalized, scale, metrics=None):
+    with timed(metrics, "resize"):
+        image = Image.fromarray(equalized, "L" if equalized.ndim == 2 else "RGB")
+        return np.asarray(image.resize((image.width * scale, image.height * scale), Image.Resampling.LANCZOS))
+
+
+class PipelineCache(ArrayLRUCache):
+    # Each stage is cached under the parameters it depends on: a new scale reuses the equalized
+    # image, a new dice width reuses the scaled image, and repeating both reuses the face grid.
+    DEFAULT_MAX_ENTRIES = 16
+    DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(max_entries, max_bytes)
+
+    def equalized(self, identity, input_image, metrics=None, color=False):
+        if color:
+            return self.get_or_compute(
+                ("equalized-color", identity), lambda: equalize_color_image(input_image, metrics)
+            )
+        return self.get_or_compute(("equalized", identity), lambda: equalize_image(input_image, metrics))
+
+    def processed(self, identity, input_image, scale, metrics=None, color=False):
+        equalized = self.equalized(identity, input_image, metrics, color)
+        if scale <= 1:
+            return equalized
+        return self.get_or_compute(("scaled", identity, scale, color), lambda: scale_image(equalized, scale, metrics))
+
+    def face_grid(self, identity, processed_array, scale, dice_size, metrics=None, mapping=DEFAULT_MAPPING):
+        def compute():
+            with timed(metrics, "grid"):
+                return compute_face_grid(processed_array, dice_size, mapping)
+
+        return self.get_or_compute(("grid", identity, scale, dice_size, mapping), compute)
+
+    def palette_face_grid(self, identity, processed_array, scale, dice_size, palette, metrics=None):
+        def compute():
+            with timed(metrics, "grid"):
+                return palette.face_grid(processed_array, dice_size)
+
+        return self.get_or_compute(("palette-grid", identity, scale, dice_size, palette.key), compute)
+
+    def decoded_face_grid(self, identity, input_image, scale, dice_size, metrics=None, mapping=DEFAULT_MAPPING):
+        # Approximate grids from a reduced decode are kept apart from the exact ones.
+        return self.get_or_compute(
+            ("decoded-grid", identity, scale, dice_size, mapping),
+            lambda: decode_face_grid(input_image, scale, dice_size, metrics, mapping),
+        )
+
+
+pipeline_cache = PipelineCache()
@@ -0,0 +1,33 @@
+from PIL import Image
+
+from photo_to_dices.decoding import reduced_block_means, reduced_face_grid
+from photo_to_dices.dice_grid import DEFAULT_MAPPING, render_face_grid
+from photo_to_dices.face_atlas import DEFAULT_FACE_SET, face_atlas
+
+DEFAULT_PREVIEW_SIZE = (480, 360)
+MIN_PREVIEW_DICE_SIZE = 2
+
+
+def preview_face_grid(equalized, scale, dice_size, mapping=DEFAULT_MAPPING, palette=None):
+    # With a Palette, `equalized` is the image it maps: RGB for colored dice.
+    height, width = equalized.shape[:2]
+    if palette is not None:
+        return palette.faces_for(reduced_block_means(equalized, (width, height), scale, dice_size))
+    return reduced_face_grid(equalized, (width, height), scale, dice_size, mapping)
+
+
+def render_preview(
+    face_grid, max_size=DEFAULT_PREVIEW_SIZE, face_set=DEFAULT_FACE_SET, palette=None, cancel_token=None
+):
+    rows, cols = face_grid.shape
+    if face_grid.size == 0:
+        return Image.new("L", (1, 1), "white")
+    max_width, max_height = max_size
+    dice_size = max(MIN_PREVIEW_DICE_SIZE, min(max_width // max(cols, 1), max_height // max(rows, 1)))
+    face_stack = palette.face_stack(dice_size) if palette is not None else face_atlas.get(dice_size, face_set)
+    preview = Image.fromarray(
+        render_face_grid(face_grid, face_stack, cols * dice_size, rows * dice_size, cancel_token=cancel_token)
+    )
+    # Grids too dense to show every die legibly are shrunk to fit rather than overflowing the widget.
+    preview.thumbnail(max_size, Image.Resampling.BOX)
+    return preview
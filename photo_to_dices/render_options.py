@@ -0,0 +1,26 @@
+from dataclasses import dataclass
+
+from photo_to_dices.adaptive import DEFAULT_LAYOUT
+from photo_to_dices.dice_grid import DEFAULT_MAPPING
+from photo_to_dices.palette import DEFAULT_PALETTE
+
+DEFAULT_DICE_WIDTH = 300
+DEFAULT_ENGINE = "vectorized"
+DEFAULT_WORKERS = 1
+
+
+@dataclass(frozen=True)
+class RenderOptions:
+    # Every setting of one conversion, handed through the pipeline as a single value. `palette` is a palette name
+    # (see `palette.Palette`), `output_format` None picks the engine's default and `workers` None uses every core.
+    scale: int = 1
+    dice_width: int = DEFAULT_DICE_WIDTH
+    engine: str = DEFAULT_ENGINE
+    workers: int | None = DEFAULT_WORKERS
+    mapping: str = DEFAULT_MAPPING
+    palette: str = DEFAULT_PALETTE
+    layout: str = DEFAULT_LAYOUT
+    output_format: str | None = None
+    compress_level: int | None = None
+    fast_decode: bool = False
+    save_grid: bool = False
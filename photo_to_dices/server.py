@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import UnidentifiedImageError
+
+from photo_to_dices.art_generator import LOG_FORMAT, ArtGenerator
+from photo_to_dices.disk_cache import DiskCache, cache_key
+from photo_to_dices.face_atlas import DEFAULT_FACE_SET
+from photo_to_dices.grid_file import FaceGridFile, save_face_grid
+from photo_to_dices.parallel import default_worker_count
+from photo_to_dices.pipeline_cache import source_identity, source_sha256
+from photo_to_dices.tiles import DeepZoomPyramid
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+DEFAULT_CACHE_DIR = "~/tmp/photo2dice-cache"
+MAX_UPLOAD_BYTES = 64 * 1024 * 1024
+MAX_HEADER_LINES = 100
+REQUEST_TIMEOUT = 30
+MAX_SCALE = 10
+MAX_DICE_WIDTH = 2000
+# Everything behind a key is derived from content, so clients may cache it forever.
+IMMUTABLE = {"Cache-Control": "public, max-age=31536000, immutable"}
+
+GRID_PATH = re.compile(r"^/grids/([0-9a-f]{64})\.dgrid$")
+DESCRIPTOR_PATH = re.compile(r"^/tiles/([0-9a-f]{64})\.dzi$")
+TILE_PATH = re.compile(r"^/tiles/([0-9a-f]{64})_files/(\d+)/(\d+)_(\d+)\.png$")
+
+logger = logging.getLogger(__name__)
+
+_generator = None
+
+
+class HttpError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+
+
+def _init_worker(output_dir, face_set, log_level):
+    global _generator
+    logging.basicConfig(level=log_level, format=LOG_FORMAT)
+    # Results are cached on disk by the service, so workers keep no pipeline intermediates.
+    _generator = ArtGenerator(output_dir, face_set, pipeline_cache=None)
+
+
+def _grid_job(source, scale, dice_width, fast_decode, mapping, source_hash, output_path):
+    image = io.BytesIO(source) if isinstance(source, bytes) else source
+    face_grid, dice_size, canvas_size = _generator.face_grid(image, scale, dice_width, fast_decode, mapping=mapping)
+    save_face_grid(output_path, face_grid, dice_size, canvas_size, bytes.fromhex(source_hash))
+
+
+@lru_cache(maxsize=8)
+def _pyramid(grid_path):
+    return DeepZoomPyramid.from_grid_file(grid_path, face_set=_generator.face_set)
+
+
+def _descriptor_job(grid_path):
+    return _pyramid(grid_path).descriptor().encode("utf-8")
+
+
+def _tile_job(grid_path, level, col, row):
+    pyramid = _pyramid(grid_path)
+    cols, rows = pyramid.tile_count(level) if level <= pyramid.max_level else (0, 0)
+    if col >= cols or row >= rows:
+        raise LookupError(f"No tile {col}_{row} at level {level}")
+    buffer = io.BytesIO()
+    pyramid.tile(level, col, row).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _int_param(query, name, default, minimum, maximum):
+    try:
+        value = int(query.get(name, [default])[0])
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, f"{name} must be an integer")
+    if not minimum <= value <= maximum:
+        raise HttpError(HTTPStatus.BAD_REQUEST, f"{name} must be between {minimum} and {maximum}")
+    return value
+
+
+class DiceArtService:
+    # Face grids and tiles are cached on disk under a hash of the source content and the parameters, so a
+    # repeated request is a file lookup. CPU work runs in a process pool, and identical requests that arrive
+    # together share one computation.
+    def __init__(self, cache, roots, workers=None, face_set=DEFAULT_FACE_SET):
+        self.cache = cache
+        self.roots = [Path(root).expanduser().resolve() for root in roots]
+        self.face_set = Path(face_set).resolve()
+        # Forked workers would inherit the sockets of the connections open when they start, keeping a closed
+        # connection open until they exit; workers from a fork server inherit none.
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers or default_worker_count(),
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=_init_worker,
+            initargs=(cache.tmp_dir, self.face_set, logging.getLogger().level),
+        )
+        self._pending = {}
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    async def _cached(self, key, produce):
+        path = self.cache.get(key)
+        if path is not None:
+            return path, True
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(produce())
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        # Shielded so a client hanging up does not cancel the work other requests are waiting on.
+        return await asyncio.shield(task), False
+
+    async def _cached_bytes(self, key, job, *args):
+        async def produce():
+            data = await asyncio.get_running_loop().run_in_executor(self.executor, job, *args)
+            return self.cache.put(key, data)
+
+        return await self._cached(key, produce)
+
+    def _resolve_path(self, query):
+        if "path" not in query:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "POST an image or pass ?path=")
+        path = Path(query["path"][0]).expanduser().resolve()
+        if not any(path.is_relative_to(root) for root in self.roots):
+            raise HttpError(HTTPStatus.FORBIDDEN, f"{path} is outside the served directories")
+        if not path.is_file():
+            raise HttpError(HTTPStatus.NOT_FOUND, f"{path} does not exist")
+        return path
+
+    def _grid_path(self, grid_key):
+        path = self.cache.get(grid_key)
+        if path is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, "Unknown grid, request /grid again")
+        return path
+
+    async def grid(self, query, body):
+        scale = _int_param(query, "scale", 1, 1, MAX_SCALE)
+        dice_width = _int_param(query, "dice_width", ArtGenerator.DEFAULT_DICE_WIDTH, 1, MAX_DICE_WIDTH)
+        fast_decode = query.get("fast_decode", ["0"])[0].lower() in ("1", "true", "yes")
+        mapping = query.get("mapping", [ArtGenerator.DEFAULT_MAPPING])[0]
+        if mapping not in ArtGenerator.MAPPINGS:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"mapping must be one of {', '.join(ArtGenerator.MAPPINGS)}")
+        loop = asyncio.get_running_loop()
+        if body:
+            source = body
+            source_hash = await loop.run_in_executor(None, lambda: hashlib.sha256(body).hexdigest())
+        else:
+            source = str(self._resolve_path(query))
+            source_hash = await loop.run_in_executor(None, source_sha256, source_identity(source))
+        key = cache_key("grid", source_hash, scale, dice_width, int(fast_decode), mapping, self.face_set)
+
+        async def produce():
+            output_path = self.cache.temporary_path()
+            try:
+                await loop.run_in_executor(
+                    self.executor,
+                    _grid_job,
+                    source,
+                    scale,
+                    dice_width,
+                    fast_decode,
+                    mapping,
+                    source_hash,
+                    str(output_path),
+                )
+            except BaseException:
+                output_path.unlink(missing_ok=True)
+                raise
+            return self.cache.put_file(key, output_path)
+
+        path, cached = await self._cached(key, produce)
+        grid_file = FaceGridFile(path)
+        width, height = grid_file.canvas_size
+        payload = {
+            "key": key,
+            "cached": cached,
+            "rows": grid_file.rows,
+            "cols": grid_file.cols,
+            "dice": grid_file.rows * grid_file.cols,
+            "dice_size": grid_file.dice_size,
+            "width": width,
+            "height": height,
+            "source_sha256": source_hash,
+            "grid": f"/grids/{key}.dgrid",
+            "tiles": f"/tiles/{key}.dzi",
+        }
+        return "application/json", json.dumps(payload).encode("utf-8"), {}
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == "/grid" and method in ("GET", "POST"):
+            return await self.grid(parse_qs(url.query), body if method == "POST" else b"")
+        if method != "GET":
+            raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED)
+        if url.path == "/stats":
+            return "application/json", json.dumps(self.cache.stats()).encode("utf-8"), {}
+
+        loop = asyncio.get_running_loop()
+        if match := GRID_PATH.match(url.path):
+            path = self._grid_path(match[1])
+            return "application/octet-stream", await loop.run_in_executor(None, path.read_bytes), IMMUTABLE
+        if match := DESCRIPTOR_PATH.match(url.path):
+            grid_path = str(self._grid_path(match[1]))
+            path, cached = await self._cached_bytes(cache_key("dzi", match[1]), _descriptor_job, grid_path)
+            return "application/xml", path.read_bytes(), {**IMMUTABLE, "X-Cache": "hit" if cached else "miss"}
+        if match := TILE_PATH.match(url.path):
+            grid_path = str(self._grid_path(match[1]))
+            level, col, row = int(match[2]), int(match[3]), int(match[4])
+            key = cache_key("tile", match[1], level, col, row)
+            try:
+                path, cached = await self._cached_bytes(key, _tile_job, grid_path, level, col, row)
+            except LookupError as e:
+                raise HttpError(HTTPStatus.NOT_FOUND, str(e))
+            return "image/png", path.read_bytes(), {**IMMUTABLE, "X-Cache": "hit" if cached else "miss"}
+        raise HttpError(HTTPStatus.NOT_FOUND)
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3:
+            raise HttpError(HTTPStatus.BAD_REQUEST)
+        method, target, _ = parts
+
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+
+        if "transfer-encoding" in headers:
+            raise HttpError(HTTPStatus.LENGTH_REQUIRED, "Send uploads with a Content-Length")
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        if length > MAX_UPLOAD_BYTES:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = await reader.readexactly(length) if length > 0 else b""
+        return method, target, body
+
+    async def handle(self, reader, writer):
+        headers = {}
+        try:
+            method, target, body = await asyncio.wait_for(self._read_request(reader), REQUEST_TIMEOUT)
+            content_type, payload, headers = await self.dispatch(method, target, body)
+            status = HTTPStatus.OK
+        except HttpError as e:
+            status, content_type = HTTPStatus(e.status), "application/json"
+            payload = json.dumps({"error": str(e)}).encode("utf-8")
+        except UnidentifiedImageError as e:
+            status, content_type = HTTPStatus.BAD_REQUEST, "application/json"
+            payload = json.dumps({"error": str(e)}).encode("utf-8")
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as e:
+            logger.exception("Request failed")
+            status, content_type = HTTPStatus.INTERNAL_SERVER_ERROR, "application/json"
+            payload = json.dumps({"error": str(e)}).encode("utf-8")
+
+        head = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Type: {content_type}"]
+        head += [f"Content-Length: {len(payload)}", "Connection: close"]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        try:
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    server = await asyncio.start_server(service.handle, host, port)
+    for sock in server.sockets:
+        logger.warning(f"Serving dice art on http://{sock.getsockname()[0]}:{sock.getsockname()[1]}")
+    async with server:
+        await server.serve_forever()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="photo2dice-serve",
+        description=(
+            "Serve dice grids and DeepZoom tiles over HTTP. POST an image (or GET with ?path=) to /grid, then fetch "
+            "/grids/<key>.dgrid or /tiles/<key>.dzi."
+        ),
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Where grids and tiles are cached")
+    parser.add_argument("--cache-size", type=int, default=1024, help="Cache size limit in MiB")
+    parser.add_argument(
+        "--root",
+        action="append",
+        help="Directory whose images may be requested by ?path= (repeatable, defaults to the working directory)",
+    )
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (defaults to all cores)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log conversion progress to stderr")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format=LOG_FORMAT)
+    cache = DiskCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    service = DiceArtService(cache, args.root or [Path.cwd()], args.workers)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+import numpy as np
+from PIL import Image
+
+from photo_to_dices.dice_grid import (
+    BACKGROUND_COLOR,
+    DEFAULT_MAPPING,
+    FaceRowMapper,
+    block_means,
+    check_cancelled,
+    grid_shape,
+    render_face_row,
+)
+from photo_to_dices.metrics import timed
+
+# Enough source rows around a strip to cover the LANCZOS kernel when upscaling.
+RESAMPLE_MARGIN = 4
+
+
+def equalize_lut(histogram):
+    # Same mapping as `ImageOps.equalize`, but built from a histogram that can be gathered up front.
+    histo = [count for count in histogram if count]
+    if len(histo) <= 1:
+        return list(range(256))
+    step = (sum(histo) - histo[-1]) // 255
+    if not step:
+        return list(range(256))
+    lut = []
+    n = step // 2
+    for i in range(256):
+        lut.append(n // step)
+        n = n + histogram[i]
+    return lut
+
+
+def read_processed_strip(gray_image, lut, scale, y0, y1):
+    # Returns processed (equalized, scaled) rows [y0, y1) without materializing the full scaled image.
+    width = gray_image.width
+    if scale == 1:
+        return np.asarray(gray_image.crop((0, y0, width, y1)).point(lut))
+
+    top = max(0, y0 // scale - RESAMPLE_MARGIN)
+    bottom = min(gray_image.height, -(-y1 // scale) + RESAMPLE_MARGIN)
+    source = gray_image.crop((0, top, width, bottom)).point(lut)
+    box = (0, y0 / scale - top, width, y1 / scale - top)
+    return np.asarray(source.resize((width * scale, y1 - y0), Image.Resampling.LANCZOS, box=box))
+
+
+def stream_dice_rows(
+    gray_image,
+    lut,
+    scale,
+    face_stack,
+    writer,
+    progress_callback=None,
+    cancel_token=None,
+    metrics=None,
+    mapping=DEFAULT_MAPPING,
+):
+    dice_size = face_stack.shape[1]
+    width, height = gray_image.width * scale, gray_image.height * scale
+    rows, cols = grid_shape(width, height, dice_size)
+    total_rows = (height - dice_size) // dice_size
+    output_row = np.full((dice_size, width), BACKGROUND_COLOR, dtype=np.uint8)
+    face_grid = np.zeros((rows, cols), dtype=np.uint8)
+    mapper = FaceRowMapper(cols, mapping)
+
+    for row in range(rows):
+        check_cancelled(cancel_token)
+        y = row * dice_size
+        with timed(metrics, "resize"):
+            strip = read_processed_strip(gray_image, lut, scale, y, y + dice_size)
+        with timed(metrics, "grid"):
+            face_grid[row] = mapper.map_row(block_means(strip, dice_size, 1, cols)[0])
+        with timed(metrics, "composite"):
+            output_row[:, : cols * dice_size] = render_face_row(face_grid[row], face_stack)
+        with timed(metrics, "save"):
+            writer.write_rows(output_row)
+        if progress_callback and total_rows > 0:
+            progress_callback(int((row / total_rows) * 100))
+
+    remaining = height - rows * dice_size
+    blank = np.full((min(remaining, dice_size), width), BACKGROUND_COLOR, dtype=np.uint8)
+    with timed(metrics, "save"):
+        while remaining > 0:
+            writer.write_rows(blank[:remaining])
+            remaining -= len(blank[:remaining])
+    return face_grid
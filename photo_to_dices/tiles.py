@@ -0,0 +1,150 @@
+import math
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from photo_to_dices.dice_grid import BACKGROUND_COLOR, check_cancelled, render_face_grid
+from photo_to_dices.encoders import DEFAULT_COMPRESS_LEVEL
+from photo_to_dices.face_atlas import DEFAULT_FACE_SET, face_atlas
+from photo_to_dices.grid_file import FaceGridFile
+from photo_to_dices.parallel import default_worker_count
+
+TILE_FORMATS = ("dzi",)
+TILE_SUFFIXES = {"dzi": ".dzi"}
+DEFAULT_TILE_SIZE = 254
+DEFAULT_TILE_OVERLAP = 1
+SUPERSAMPLING = 2
+DZI_NAMESPACE = "http://schemas.microsoft.com/deepzoom/2008"
+
+
+class DeepZoomPyramid:
+    # A DeepZoom image backed by the face grid alone. Any tile of any level is rendered on demand from a
+    # face atlas sized for that level, so serving or exporting a pyramid never builds the full canvas.
+    def __init__(
+        self,
+        face_grid,
+        dice_size,
+        canvas_size,
+        face_set=DEFAULT_FACE_SET,
+        tile_size=DEFAULT_TILE_SIZE,
+        overlap=DEFAULT_TILE_OVERLAP,
+    ):
+        self.face_grid = face_grid
+        self.dice_size = dice_size
+        self.width, self.height = canvas_size
+        self.face_set = face_set
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.max_level = math.ceil(math.log2(max(self.width, self.height, 1)))
+
+    @classmethod
+    def from_grid_file(cls, path, **kwargs):
+        grid_file = FaceGridFile(path)
+        return cls(grid_file.face_grid, grid_file.dice_size, grid_file.canvas_size, **kwargs)
+
+    def level_size(self, level):
+        factor = 2 ** (self.max_level - level)
+        return max(1, math.ceil(self.width / factor)), max(1, math.ceil(self.height / factor))
+
+    def tile_count(self, level):
+        width, height = self.level_size(level)
+        return math.ceil(width / self.tile_size), math.ceil(height / self.tile_size)
+
+    def tile_bounds(self, level, col, row):
+        width, height = self.level_size(level)
+        left = col * self.tile_size - (self.overlap if col else 0)
+        top = row * self.tile_size - (self.overlap if row else 0)
+        right = min(width, (col + 1) * self.tile_size + self.overlap)
+        bottom = min(height, (row + 1) * self.tile_size + self.overlap)
+        return left, top, right, bottom
+
+    def tile(self, level, col, row):
+        left, top, right, bottom = self.tile_bounds(level, col, row)
+        factor = 2 ** (self.max_level - level)
+        return self.render_region((left * factor, top * factor, right * factor, bottom * factor), factor)
+
+    def render_region(self, box, factor):
+        # Renders the canvas region `box` shrunk by `factor`. The dice covering it are drawn with faces of about
+        # twice their size at this level and box-filtered down, so the work per tile stays close to its output size
+        # at every level while thin borders and pips keep their tone.
+        left, top, right, bottom = box
+        face_size = min(self.dice_size, max(1, math.ceil(self.dice_size * SUPERSAMPLING / factor)))
+        rows, cols = self.face_grid.shape
+        col_start, row_start = left // self.dice_size, top // self.dice_size
+        col_stop, row_stop = -(-right // self.dice_size), -(-bottom // self.dice_size)
+
+        # The margin the legacy loops leave on the right and bottom, and anything past the canvas, stays white.
+        region = np.full(
+            ((row_stop - row_start) * face_size, (col_stop - col_start) * face_size), BACKGROUND_COLOR, dtype=np.uint8
+        )
+        grid = self.face_grid[row_start:row_stop, col_start:col_stop]
+        if grid.size:
+            face_stack = face_atlas.get(face_size, self.face_set)
+            height, width = grid.shape[0] * face_size, grid.shape[1] * face_size
+            region[:height, :width] = render_face_grid(grid, face_stack, width, height)
+
+        ratio = face_size / self.dice_size
+        source_box = (
+            (left - col_start * self.dice_size) * ratio,
+            (top - row_start * self.dice_size) * ratio,
+            (right - col_start * self.dice_size) * ratio,
+            (bottom - row_start * self.dice_size) * ratio,
+        )
+        size = (math.ceil((right - left) / factor), math.ceil((bottom - top) / factor))
+        return Image.fromarray(region, "L").resize(size, Image.Resampling.BOX, box=source_box)
+
+    def descriptor(self, tile_format="png"):
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<Image xmlns="{DZI_NAMESPACE}" Format="{tile_format}" Overlap="{self.overlap}" '
+            f'TileSize="{self.tile_size}">\n'
+            f'  <Size Width="{self.width}" Height="{self.height}"/>\n'
+            "</Image>\n"
+        )
+
+    def tiles(self):
+        for level in range(self.max_level + 1):
+            cols, rows = self.tile_count(level)
+            for row in range(rows):
+                for col in range(cols):
+                    yield level, col, row
+
+    def export(
+        self, path, compress_level=DEFAULT_COMPRESS_LEVEL, threads=None, progress_callback=None, cancel_token=None
+    ):
+        # Writes `<name>.dzi` next to a `<name>_files/<level>/<col>_<row>.png` tree and returns the bytes written.
+        # The descriptor goes last, so its presence means every tile is in place.
+        path = Path(path)
+        tile_dir = path.with_name(f"{path.stem}_files")
+        path.unlink(missing_ok=True)
+        shutil.rmtree(tile_dir, ignore_errors=True)
+        for level in range(self.max_level + 1):
+            (tile_dir / str(level)).mkdir(parents=True)
+
+        def write_tile(level, col, row):
+            check_cancelled(cancel_token)
+            tile_path = tile_dir / str(level) / f"{col}_{row}.png"
+            self.tile(level, col, row).save(tile_path, compress_level=compress_level)
+            return tile_path.stat().st_size
+
+        tiles = list(self.tiles())
+        executor = ThreadPoolExecutor(max_workers=threads or default_worker_count())
+        try:
+            futures = [executor.submit(write_tile, *tile) for tile in tiles]
+            bytes_written = 0
+            for finished, future in enumerate(as_completed(futures), 1):
+                bytes_written += future.result()
+                if progress_callback:
+                    progress_callback(int(finished / len(tiles) * 100))
+            descriptor = self.descriptor().encode("utf-8")
+            path.write_bytes(descriptor)
+        except BaseException:
+            executor.shutdown(wait=True, cancel_futures=True)
+            shutil.rmtree(tile_dir, ignore_errors=True)
+            raise
+        finally:
+            executor.shutdown(wait=True)
+        return bytes_written + len(descriptor)
@@ -0,0 +1,152 @@
+import base64
+import gzip
+import io
+import zlib
+from pathlib import Path
+
+from photo_to_dices.dice_grid import check_cancelled
+from photo_to_dices.face_atlas import DEFAULT_FACE_SET, load_face_sources
+
+VECTOR_FORMATS = ("svg", "svgz", "pdf")
+VECTOR_SUFFIXES = {"svg": ".svg", "svgz": ".svgz", "pdf": ".pdf"}
+DEFAULT_VECTOR_COMPRESS_LEVEL = 6
+# Acrobat refuses pages larger than 200 inches, so bigger canvases are scaled down to fit; the dice stay sharp.
+MAX_PDF_PAGE_POINTS = 14400
+
+
+def _number(value):
+    return f"{value:.6f}".rstrip("0").rstrip(".")
+
+
+def _report_row(progress_callback, row, total_rows):
+    if progress_callback and total_rows > 0:
+        progress_callback(int((row / total_rows) * 100))
+
+
+def write_svg(file, face_grid, dice_size, canvas_size, faces, progress_callback=None, cancel_token=None):
+    # User units are dice, so each reference only carries its column and every row shares one translate.
+    width, height = canvas_size
+    total_rows = (height - dice_size) // dice_size
+    file.write(
+        '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+        f'width="{width}" height="{height}" viewBox="0 0 {_number(width / dice_size)} {_number(height / dice_size)}">\n'
+        "<defs>\n"
+    )
+    for number, face in enumerate(faces, 1):
+        buffer = io.BytesIO()
+        face.save(buffer, "PNG", optimize=True)
+        encoded = base64.b64encode(buffer.getvalue()).decode("ascii")
+        file.write(
+            f'<image id="f{number}" width="1" height="1" preserveAspectRatio="none" '
+            f'xlink:href="data:image/png;base64,{encoded}"/>\n'
+        )
+    file.write('</defs>\n<rect width="100%" height="100%" fill="#fff"/>\n')
+
+    for row, face_row in enumerate(face_grid):
+        check_cancelled(cancel_token)
+        uses = "".join(f'<use xlink:href="#f{face}" x="{col}"/>' for col, face in enumerate(face_row.tolist()))
+        file.write(f'<g transform="translate(0 {row})">{uses}</g>\n')
+        _report_row(progress_callback, row, total_rows)
+    file.write("</svg>\n")
+
+
+def write_pdf(
+    file, face_grid, dice_size, canvas_size, faces, compress_level, progress_callback=None, cancel_token=None
+):
+    # One page drawing six shared image XObjects. Object numbers: 1 catalog, 2 page tree, 3 page,
+    # 4 content stream, 5 its length (known only after streaming), 6.. one per face.
+    width, height = canvas_size
+    total_rows = (height - dice_size) // dice_size
+    offsets = {}
+
+    def begin_object(number):
+        offsets[number] = file.tell()
+        file.write(f"{number} 0 obj\n".encode("ascii"))
+
+    file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    face_objects = []
+    for number, face in enumerate(faces, 6):
+        data = zlib.compress(face.tobytes(), compress_level)
+        begin_object(number)
+        file.write(
+            f"<< /Type /XObject /Subtype /Image /Width {face.width} /Height {face.height} /ColorSpace /DeviceGray "
+            f"/BitsPerComponent 8 /Filter /FlateDecode /Length {len(data)} >>\nstream\n".encode("ascii")
+        )
+        file.write(data)
+        file.write(b"\nendstream\nendobj\n")
+        face_objects.append(number)
+
+    page_scale = min(1, MAX_PDF_PAGE_POINTS / max(width, height, 1))
+    begin_object(4)
+    file.write(b"<< /Length 5 0 R /Filter /FlateDecode >>\nstream\n")
+    stream_start = file.tell()
+    compressor = zlib.compressobj(compress_level)
+    file.write(
+        compressor.compress(
+            f"{_number(page_scale)} 0 0 {_number(page_scale)} 0 0 cm\n1 g 0 0 {width} {height} re f\n".encode("ascii")
+        )
+    )
+    for row, face_row in enumerate(face_grid):
+        check_cancelled(cancel_token)
+        # PDF's origin is the bottom-left corner; each die draws its face into the unit square, then steps right.
+        y = height - (row + 1) * dice_size
+        draws = "".join(f"/F{face} Do 1 0 0 1 1 0 cm\n" for face in face_row.tolist())
+        file.write(compressor.compress(f"q {dice_size} 0 0 {dice_size} 0 {y} cm\n{draws}Q\n".encode("ascii")))
+        _report_row(progress_callback, row, total_rows)
+    file.write(compressor.flush())
+    stream_length = file.tell() - stream_start
+    file.write(b"\nendstream\nendobj\n")
+
+    begin_object(5)
+    file.write(f"{stream_length}\nendobj\n".encode("ascii"))
+    begin_object(3)
+    xobjects = " ".join(f"/F{index} {number} 0 R" for index, number in enumerate(face_objects, 1))
+    file.write(
+        f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {_number(width * page_scale)} {_number(height * page_scale)}] "
+        f"/Resources << /XObject << {xobjects} >> >> /Contents 4 0 R >>\nendobj\n".encode("ascii")
+    )
+    begin_object(2)
+    file.write(b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>\nendobj\n")
+    begin_object(1)
+    file.write(b"<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+
+    xref_offset = file.tell()
+    object_count = max(offsets) + 1
+    file.write(f"xref\n0 {object_count}\n0000000000 65535 f \n".encode("ascii"))
+    for number in range(1, object_count):
+        file.write(f"{offsets[number]:010d} 00000 n \n".encode("ascii"))
+    file.write(f"trailer\n<< /Size {object_count} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("ascii"))
+
+
+def save_vector(
+    path,
+    face_grid,
+    dice_size,
+    canvas_size,
+    output_format="svg",
+    face_set=DEFAULT_FACE_SET,
+    compress_level=None,
+    progress_callback=None,
+    cancel_token=None,
+):
+    # Faces are embedded once at their original resolution and referenced per die, so no raster is composited.
+    faces = load_face_sources(face_set)
+    compress_level = DEFAULT_VECTOR_COMPRESS_LEVEL if compress_level is None else compress_level
+    try:
+        if output_format == "svg":
+            with open(path, "w", encoding="utf-8") as file:
+                write_svg(file, face_grid, dice_size, canvas_size, faces, progress_callback, cancel_token)
+        elif output_format == "svgz":
+            with gzip.open(path, "wt", compresslevel=compress_level, encoding="utf-8") as file:
+                write_svg(file, face_grid, dice_size, canvas_size, faces, progress_callback, cancel_token)
+        elif output_format == "pdf":
+            with open(path, "wb") as file:
+                write_pdf(
+                    file, face_grid, dice_size, canvas_size, faces, compress_level, progress_callback, cancel_token
+                )
+        else:
+            raise ValueError(f"Unknown vector format {output_format!r}, expected one of {VECTOR_FORMATS}")
+    except BaseException:
+        # Never leave a truncated document behind that could be mistaken for a finished conversion.
+        Path(path).unlink(missing_ok=True)
+        raise
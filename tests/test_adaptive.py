@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from photo_to_dices.adaptive import adaptive_layout
+from photo_to_dices.art_generator import ArtGenerator
+
+
+def coverage(layout):
+    width, height = layout.canvas_size
+    covered = np.zeros((height, width), dtype=np.int32)
+    for y, x, size in zip(layout.ys, layout.xs, layout.sizes):
+        covered[y : y + size, x : x + size] += 1
+    return covered
+
+
+@pytest.mark.parametrize("shape", [(60, 6000), (6000, 60), (10, 10), (25, 7), (90, 130), (200, 45), (400, 640)])
+def test_layout_covers_small_and_strip_shaped_inputs(shape):
+    rng = np.random.default_rng(0)
+    array = rng.integers(0, 256, shape, dtype=np.uint8)
+    array[: shape[0] // 2] = 200
+    layout = adaptive_layout(array, 20)
+
+    assert layout.canvas_size == (-(-shape[1] // 20) * 20, -(-shape[0] // 20) * 20)
+    assert (coverage(layout) == 1).all()
+
+
+def test_flat_image_uses_the_largest_dice():
+    layout = adaptive_layout(np.full((320, 480), 128, dtype=np.uint8), 20)
+
+    assert layout.dice_counts() == {"160px": 6}
+
+
+def test_render_strip(tmp_path):
+    art = ArtGenerator(tmp_path, pipeline_cache=None).render(np.full((60, 6000), 90, dtype=np.uint8), layout="adaptive")
+
+    assert art.size == (6000, 60)
+    assert art.dice == art.face_grid.size == sum(art.face_grid.dice_counts().values())
@@ -0,0 +1,39 @@
+import pytest
+from PIL import Image, ImageSequence
+
+from photo_to_dices.art_generator import ArtGenerator
+
+
+def make_animation(path, **options):
+    frames = [Image.new("L", (120, 80), value) for value in (30, 140, 250)]
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=[40, 80, 120], **options)
+    return path
+
+
+def convert(tmp_path, source, output_format):
+    generator = ArtGenerator(tmp_path / "out", pipeline_cache=None)
+    output_path, _ = generator.convert_to_dice_art(source, dice_width=10, output_format=output_format)
+    durations = []
+    with Image.open(output_path) as image:
+        for frame in ImageSequence.Iterator(image):
+            # WebP reads a frame's duration when the frame is decoded.
+            frame.load()
+            durations.append(frame.info["duration"])
+        return image.info.get("loop"), durations
+
+
+@pytest.mark.parametrize("output_format", ["gif", "webp"])
+@pytest.mark.parametrize("loop", [0, 3])
+def test_loop_count_survives(tmp_path, output_format, loop):
+    source = make_animation(tmp_path / "clip.gif", loop=loop)
+
+    assert convert(tmp_path, source, output_format) == (loop, [40, 80, 120])
+
+
+@pytest.mark.parametrize("output_format, loop", [("gif", None), ("webp", 1)])
+def test_play_once_survives(tmp_path, output_format, loop):
+    source = make_animation(tmp_path / "clip.gif")
+    with Image.open(source) as image:
+        assert "loop" not in image.info
+
+    assert convert(tmp_path, source, output_format) == (loop, [40, 80, 120])
@@ -0,0 +1,94 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from photo_to_dices.cli import collect_inputs, main, split_clashes
+
+
+def save_photo(path, seed):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.fromarray(np.random.default_rng(seed).integers(0, 256, (120, 160), dtype=np.uint8), "L").save(path)
+    return path
+
+
+@pytest.fixture
+def photos(tmp_path):
+    root = tmp_path / "photos"
+    save_photo(root / "a" / "IMG_0001.png", 1)
+    save_photo(root / "b" / "IMG_0001.png", 2)
+    save_photo(root / "IMG_0002.png", 3)
+    return root
+
+
+def run(capsys, *argv):
+    status = main([*map(str, argv), "-j", "1", "-w", "8"])
+    return status, [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_collect_inputs_keeps_relative_directories(tmp_path, photos):
+    inputs = collect_inputs([photos], tmp_path / "out", recursive=True)
+
+    assert inputs == [
+        (photos / "IMG_0002.png", Path()),
+        (photos / "a" / "IMG_0001.png", Path("a")),
+        (photos / "b" / "IMG_0001.png", Path("b")),
+    ]
+    assert collect_inputs([photos / "a" / "IMG_0001.png"], tmp_path / "out") == [
+        (photos / "a" / "IMG_0001.png", Path())
+    ]
+    assert [path for path, _ in collect_inputs([photos / "*" / "*.png"], tmp_path / "out")] == [
+        photos / "a" / "IMG_0001.png",
+        photos / "b" / "IMG_0001.png",
+    ]
+
+
+def test_collect_inputs_skips_outputs(tmp_path, photos):
+    save_photo(photos / "a" / "dice-IMG_0001.png", 4)
+    save_photo(photos / "out" / "IMG_0003.png", 5)
+
+    inputs = collect_inputs([photos], photos / "out", recursive=True)
+
+    assert [path.name for path, _ in inputs] == ["IMG_0002.png", "IMG_0001.png", "IMG_0001.png"]
+
+
+def test_split_clashes(tmp_path):
+    inputs = [(tmp_path / "x.png", Path()), (tmp_path / "x.jpg", Path()), (tmp_path / "a" / "x.png", Path("a"))]
+
+    assert split_clashes(inputs) == ([inputs[0], inputs[2]], [(tmp_path / "x.jpg", tmp_path / "x.png")])
+
+
+def test_same_names_in_different_directories(tmp_path, photos, capsys):
+    status, records = run(capsys, photos, "-r", "-o", tmp_path / "out", "-f", "png")
+
+    assert status == 0
+    assert [record["status"] for record in records] == ["converted"] * 3
+    outputs = sorted(Path(record["output"]).relative_to(tmp_path / "out") for record in records)
+    assert outputs == [Path("a/dice-IMG_0001.png"), Path("b/dice-IMG_0001.png"), Path("dice-IMG_0002.png")]
+
+
+def test_outputs_beside_photos(photos, capsys):
+    status, records = run(capsys, photos, "-r", "-o", photos, "-f", "png")
+    assert [record["status"] for record in records] == ["converted"] * 3
+
+    # A second run skips every photo by its own output and does not pick up the outputs.
+    status, records = run(capsys, photos, "-r", "-o", photos, "-f", "png")
+    assert [record["status"] for record in records] == ["skipped"] * 3
+    assert {record["output"] for record in records} == {
+        str(photos / "dice-IMG_0002.png"),
+        str(photos / "a" / "dice-IMG_0001.png"),
+        str(photos / "b" / "dice-IMG_0001.png"),
+    }
+
+
+def test_clashing_names_are_reported(tmp_path, capsys):
+    first = save_photo(tmp_path / "photos" / "x.png", 1)
+    second = save_photo(tmp_path / "photos" / "x.bmp", 2)
+
+    status, records = run(capsys, first, second, "-o", tmp_path / "out", "-f", "png")
+
+    assert status == 1
+    assert records[0] == {"input": str(second), "status": "error", "error": f"Output name clashes with {first}"}
+    assert records[1]["status"] == "converted"
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from photo_to_dices.art_generator import ArtGenerator
+from photo_to_dices.decoding import decode_reduced, reduction_factor
+
+# The share of dice of a clean photo that may flip to a neighbouring face (see `decode_face_grid`).
+MAX_CHANGED_SHARE = 0.05
+
+
+@pytest.fixture(scope="module")
+def photo(tmp_path_factory):
+    # A 4 MP JPEG of soft shapes with mild sensor noise.
+    height, width = 1800, 2400
+    rows, cols = np.mgrid[0:height, 0:width]
+    pixels = 128 + 60 * np.sin(cols / 170) + 50 * np.cos(rows / 130)
+    pixels += np.random.default_rng(0).normal(0, 8, (height, width))
+    path = tmp_path_factory.mktemp("photos") / "photo.jpg"
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).convert("RGB").save(path, quality=90)
+    return path
+
+
+def test_jpeg_is_decoded_reduced(photo):
+    generator = ArtGenerator()
+    dice_size = generator.dice_size_for(2400, 60)
+    with Image.open(photo) as image:
+        reduced = decode_reduced(image, reduction_factor(1, dice_size))
+
+        # libjpeg's DCT scaling shrank the decode by 8 on each side.
+        assert image.size == (300, 225)
+    assert reduced.shape == (225, 300)
+
+
+@pytest.mark.parametrize("mapping", ["flat", "bayer"])
+@pytest.mark.parametrize("scale, dice_width", [(1, 60), (2, 60), (1, 30)])
+def test_fast_decode_face_grid(tmp_path, photo, scale, dice_width, mapping):
+    generator = ArtGenerator(tmp_path)
+    exact, dice_size, canvas_size = generator.face_grid(photo, scale, dice_width, mapping=mapping)
+    fast, fast_dice_size, fast_canvas_size = generator.face_grid(photo, scale, dice_width, True, mapping=mapping)
+
+    assert (fast_dice_size, fast_canvas_size) == (dice_size, canvas_size)
+    assert fast.shape == exact.shape
+    changed = np.abs(fast.astype(int) - exact)
+    assert changed.max() <= 1
+    assert np.count_nonzero(changed) / changed.size <= MAX_CHANGED_SHARE
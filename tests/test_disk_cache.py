@@ -0,0 +1,88 @@
+import os
+import time
+
+from photo_to_dices.disk_cache import DiskCache, cache_key
+
+
+def keys(count):
+    return [cache_key("entry", index) for index in range(count)]
+
+
+def test_put_and_get(tmp_path):
+    cache = DiskCache(tmp_path)
+    key, missing = keys(2)
+
+    path = cache.put(key, b"data")
+
+    assert cache.get(key) == path
+    assert path.read_bytes() == b"data"
+    assert cache.get(missing) is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "entries": 1, "bytes": 4}
+    assert not any(cache.tmp_dir.iterdir())
+
+
+def test_evicts_least_recently_used_over_size(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=30)
+    first, second, third, fourth = keys(4)
+    for key in (first, second, third):
+        cache.put(key, b"x" * 10)
+    # Reading the oldest entry makes the second one the least recently used.
+    cache.get(first)
+
+    cache.put(fourth, b"x" * 10)
+
+    assert cache.get(second) is None
+    assert not cache.path_for(second).exists()
+    assert all(cache.get(key) is not None for key in (first, third, fourth))
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 30
+
+
+def test_replacing_an_entry_counts_its_size_once(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=30)
+    key, other = keys(2)
+    cache.put(key, b"x" * 10)
+    cache.put(key, b"x" * 20)
+    cache.put(other, b"x" * 10)
+
+    assert cache.stats()["evictions"] == 0
+    assert cache.stats()["bytes"] == 30
+
+
+def test_evicts_expired_entries(tmp_path):
+    cache = DiskCache(tmp_path, max_age=60)
+    old, new = keys(2)
+    old_path = cache.put(old, b"old")
+    hour_ago = time.time() - 3600
+    os.utime(old_path, (hour_ago, hour_ago))
+
+    cache.put(new, b"new")
+
+    assert not old_path.exists()
+    assert cache.get(old) is None
+    assert cache.get(new) is not None
+
+
+def test_reload_keeps_recency_and_limit(tmp_path):
+    cache = DiskCache(tmp_path)
+    first, second, third = keys(3)
+    for age, key in zip((300, 200, 100), (first, second, third)):
+        path = cache.put(key, b"x" * 10)
+        os.utime(path, (time.time() - age,) * 2)
+
+    # A smaller limit on restart evicts the entries used longest ago.
+    reloaded = DiskCache(tmp_path, max_bytes=20)
+
+    assert reloaded.stats()["entries"] == 2
+    assert not cache.path_for(first).exists()
+    assert reloaded.get(second) is not None and reloaded.get(third) is not None
+
+
+def test_sees_entries_written_by_another_instance(tmp_path):
+    cache = DiskCache(tmp_path)
+    other = DiskCache(tmp_path)
+    [key] = keys(1)
+
+    other.put(key, b"shared")
+
+    assert cache.get(key).read_bytes() == b"shared"
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from photo_to_dices.encoders import PngStreamWriter, TiledTiffWriter, save_image
+
+
+def pixels(height, width):
+    # Distinct values along both axes, so a tile written to the wrong offset cannot go unnoticed.
+    rows, cols = np.indices((height, width))
+    return ((rows * 7 + cols * 3) % 256).astype(np.uint8)
+
+
+def write_in_bands(writer, array, band_heights):
+    start = 0
+    for band_height in band_heights:
+        writer.write_rows(array[start : start + band_height])
+        start += band_height
+    writer.write_rows(array[start:])
+
+
+def read(path):
+    with Image.open(path) as image:
+        return image.mode, np.asarray(image)
+
+
+@pytest.mark.parametrize("shape", [(130, 300), (1, 1), (97, 641)])
+def test_png_stream_round_trip(tmp_path, monkeypatch, shape):
+    # Small IDAT chunks so images span several of them.
+    monkeypatch.setattr(PngStreamWriter, "IDAT_CHUNK_SIZE", 500)
+    array = pixels(*shape)
+    path = tmp_path / "out.png"
+    with PngStreamWriter(path, shape[1], shape[0], compress_level=1) as writer:
+        write_in_bands(writer, array, [min(7, shape[0])])
+
+    mode, decoded = read(path)
+    assert mode == "L"
+    np.testing.assert_array_equal(decoded, array)
+
+
+@pytest.mark.parametrize(
+    "shape, tile_size",
+    [
+        ((600, 300), 256),  # width not a multiple of the tile, last band of 88 rows
+        ((50, 100), 256),  # a single tile
+        ((515, 1030), 256),  # partial last band of 3 rows and partial last column of tiles
+        ((333, 200), 32),  # many bands, more than the writer keeps in flight
+    ],
+)
+def test_tiled_tiff_round_trip(tmp_path, shape, tile_size):
+    array = pixels(*shape)
+    path = tmp_path / "out.tif"
+    with TiledTiffWriter(path, shape[1], shape[0], tile_size=tile_size, compress_level=1, threads=2) as writer:
+        write_in_bands(writer, array, [100, 37, 150])
+
+    mode, decoded = read(path)
+    assert mode == "L"
+    np.testing.assert_array_equal(decoded, array)
+
+
+def test_save_image_tiff_round_trip(tmp_path):
+    array = pixels(700, 513)
+    path = tmp_path / "out.tif"
+    save_image(Image.fromarray(array, "L"), path, "tiff", compress_level=0)
+
+    np.testing.assert_array_equal(read(path)[1], array)
+
+
+@pytest.mark.parametrize("writer_class", [PngStreamWriter, TiledTiffWriter])
+def test_writers_reject_extra_rows(tmp_path, writer_class):
+    writer = writer_class(tmp_path / "out", 10, 4)
+    with pytest.raises(ValueError):
+        writer.write_rows(pixels(5, 10))
+    writer.abort()
+
+
+@pytest.mark.parametrize("writer_class", [PngStreamWriter, TiledTiffWriter])
+def test_failed_write_leaves_no_file(tmp_path, writer_class):
+    path = tmp_path / "out"
+    with pytest.raises(RuntimeError):
+        with writer_class(path, 10, 4) as writer:
+            writer.write_rows(pixels(2, 10))
+            raise RuntimeError("conversion failed")
+
+    assert not path.exists()
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from photo_to_dices.art_generator import ArtGenerator
+
+
+@pytest.fixture
+def photo(tmp_path):
+    # A gradient with noise on a size that is not a multiple of the dice, so partial edges are exercised.
+    height, width = 371, 533
+    gradient = np.add.outer(np.linspace(0, 160, height), np.linspace(0, 90, width))
+    noise = np.random.default_rng(0).normal(0, 25, (height, width))
+    path = tmp_path / "photo.png"
+    Image.fromarray(np.clip(gradient + noise, 0, 255).astype(np.uint8), "L").save(path)
+    return path
+
+
+def convert(generator, photo, **options):
+    output_path, dice = generator.convert_to_dice_art(photo, scale=2, dice_width=40, output_format="png", **options)
+    with Image.open(output_path) as image:
+        return np.asarray(image.convert("L")), dice
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"engine": "vectorized"},
+        {"engine": "streaming"},
+        {"engine": "vectorized", "workers": 2},
+    ],
+    ids=["vectorized", "streaming", "parallel"],
+)
+def test_engines_match_legacy(tmp_path, photo, options):
+    expected, expected_dice = convert(ArtGenerator(tmp_path / "legacy", pipeline_cache=None), photo, engine="legacy")
+    pixels, dice = convert(ArtGenerator(tmp_path / "out", pipeline_cache=None), photo, **options)
+
+    assert dice == expected_dice
+    assert pixels.shape == expected.shape == (371 * 2, 533 * 2)
+    np.testing.assert_array_equal(pixels, expected)
+
+
+@pytest.mark.parametrize("mapping", ["bayer", "floyd-steinberg"])
+def test_streaming_matches_vectorized_for_dithered_mappings(tmp_path, photo, mapping):
+    generator = ArtGenerator(tmp_path, pipeline_cache=None)
+    expected, _ = convert(generator, photo, mapping=mapping)
+    pixels, _ = convert(generator, photo, engine="streaming", mapping=mapping)
+
+    np.testing.assert_array_equal(pixels, expected)
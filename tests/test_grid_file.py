@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from photo_to_dices.grid_file import FaceGridFile, pack_faces, packed_row_bytes, save_face_grid, unpack_faces
+
+
+def faces(rows, cols, high):
+    return np.random.default_rng(rows * 1000 + cols).integers(1, high + 1, (rows, cols), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("bits, high", [(3, 6), (8, 255)])
+@pytest.mark.parametrize("shape", [(23, 37), (1, 1), (5, 8)])
+def test_pack_round_trip(bits, high, shape):
+    face_grid = faces(*shape, high)
+    packed = pack_faces(face_grid, bits)
+
+    assert packed.shape == (shape[0], shape[1] if bits == 8 else packed_row_bytes(shape[1], bits))
+    np.testing.assert_array_equal(unpack_faces(packed, shape[1], bits), face_grid)
+
+
+@pytest.mark.parametrize("bits, high", [(3, 6), (8, 255)])
+def test_file_round_trip(tmp_path, bits, high):
+    face_grid = faces(23, 37, high)
+    path = save_face_grid(tmp_path / "grid.dgrid", face_grid, 20, (750, 470), b"\x01" * 32, bits)
+    grid_file = FaceGridFile(path)
+
+    assert (grid_file.bits, grid_file.shape, grid_file.dice_size) == (bits, (23, 37), 20)
+    assert grid_file.canvas_size == (750, 470)
+    assert grid_file.source_hash == "01" * 32
+    np.testing.assert_array_equal(grid_file.face_grid, face_grid)
+    # Row ranges are unpacked straight from the memory map at their offset.
+    np.testing.assert_array_equal(grid_file.read_rows(5, 9), face_grid[5:9])
+    np.testing.assert_array_equal(grid_file.read_rows(22), face_grid[22:])
+
+
+@pytest.mark.parametrize("shape", [(0, 0), (4, 0), (0, 4)])
+def test_empty_grid_round_trip(tmp_path, shape):
+    path = save_face_grid(tmp_path / "grid.dgrid", np.zeros(shape, dtype=np.uint8), 20, (10, 10))
+    grid_file = FaceGridFile(path)
+
+    assert grid_file.shape == shape
+    assert grid_file.source_hash is None
+    assert grid_file.face_grid.shape == shape
+
+
+def test_rejects_faces_wider_than_bits(tmp_path):
+    with pytest.raises(ValueError):
+        save_face_grid(tmp_path / "grid.dgrid", np.full((2, 2), 8, dtype=np.uint8), 20, (40, 40), bits=3)
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "grid.dgrid"
+    path.write_bytes(b"not a grid" * 20)
+    with pytest.raises(ValueError):
+        FaceGridFile(path)
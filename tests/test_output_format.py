@@ -0,0 +1,32 @@
+from PIL import Image
+
+from photo_to_dices.art_generator import ArtGenerator
+
+
+def make_gif(path):
+    frames = [Image.new("L", (120, 80), level) for level in (40, 200)]
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=50)
+    return path
+
+
+def test_animated_source_defaults_to_gif(tmp_path):
+    generator = ArtGenerator(tmp_path / "out", pipeline_cache=None)
+    output_path, _ = generator.convert_to_dice_art(make_gif(tmp_path / "clip.gif"))
+
+    assert output_path.endswith(".gif")
+    assert Image.open(output_path).n_frames == 2
+
+
+def test_palette_on_animated_source_defaults_to_a_still(tmp_path):
+    generator = ArtGenerator(tmp_path / "out", pipeline_cache=None)
+    output_path, _ = generator.convert_to_dice_art(make_gif(tmp_path / "clip.gif"), palette="colors")
+
+    assert output_path.endswith(".png")
+    assert Image.open(output_path).mode == "RGB"
+
+
+def test_adaptive_layout_on_animated_source_defaults_to_a_still(tmp_path):
+    generator = ArtGenerator(tmp_path / "out", pipeline_cache=None)
+    output_path, _ = generator.convert_to_dice_art(make_gif(tmp_path / "clip.gif"), layout="adaptive")
+
+    assert output_path.endswith(".png")
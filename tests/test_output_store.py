@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from photo_to_dices.art_generator import ArtGenerator
+from photo_to_dices.grid_file import FaceGridFile
+from photo_to_dices.metrics import ConversionMetrics
+from photo_to_dices.output_store import OutputStore
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / "photo.png"
+    Image.fromarray(np.random.default_rng(0).integers(0, 256, (240, 320), dtype=np.uint8), "L").save(path)
+    return path
+
+
+def convert(generator, photo, **options):
+    metrics = ConversionMetrics()
+    output_path, dice = generator.convert_to_dice_art(photo, dice_width=16, metrics=metrics, **options)
+    return output_path, dice, metrics.counters.get("store_hits", 0)
+
+
+def test_store_hit_returns_the_stored_output(tmp_path, photo):
+    generator = ArtGenerator(tmp_path / "out", pipeline_cache=None, output_store=OutputStore(tmp_path / "store"))
+    output_path, dice, hits = convert(generator, photo)
+    stored_path, stored_dice, stored_hits = convert(generator, photo)
+
+    assert (hits, stored_hits) == (0, 1)
+    assert (stored_path, stored_dice) == (output_path, dice)
+    assert not generator.output_path_for(photo).exists()
+    # Other parameters are another key.
+    assert convert(generator, photo, scale=2)[0] != output_path
+
+
+@pytest.mark.parametrize("stored", [False, True], ids=["miss", "hit"])
+def test_store_saves_grid(tmp_path, photo, stored):
+    store = OutputStore(tmp_path / "store")
+    expected = ArtGenerator(tmp_path / "plain", pipeline_cache=None)
+    expected.convert_to_dice_art(photo, dice_width=16, save_grid=True)
+    expected_grid = FaceGridFile(expected.grid_path_for(photo))
+
+    generator = ArtGenerator(tmp_path / "out", pipeline_cache=None, output_store=store)
+    if stored:
+        convert(generator, photo)
+    _, dice, hits = convert(generator, photo, save_grid=True)
+
+    grid_file = FaceGridFile(generator.grid_path_for(photo))
+    assert hits == stored
+    assert grid_file.face_grid.size == dice
+    assert (grid_file.dice_size, grid_file.canvas_size) == (expected_grid.dice_size, expected_grid.canvas_size)
+    assert grid_file.source_hash == expected_grid.source_hash
+    np.testing.assert_array_equal(grid_file.face_grid, expected_grid.face_grid)
@@ -0,0 +1,62 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from photo_to_dices.art_generator import ArtGenerator
+from photo_to_dices.dice_art import canvas_shape
+
+
+@pytest.fixture
+def pixels():
+    return np.random.default_rng(0).integers(0, 256, (150, 230), dtype=np.uint8)
+
+
+@pytest.fixture
+def generator(tmp_path):
+    return ArtGenerator(tmp_path)
+
+
+@pytest.mark.parametrize("options", [{}, {"engine": "legacy"}, {"palette": "colors"}, {"layout": "adaptive"}])
+def test_render_into_buffer(generator, pixels, options):
+    expected = generator.render(pixels, scale=2, dice_width=10, **options)
+    mode = expected.mode
+    shape = canvas_shape(230, 150, 2, mode, expected.dice_size if "layout" in options else None)
+    block = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+    try:
+        art = generator.render(pixels, scale=2, dice_width=10, out=block.buf, **options)
+        canvas = np.ndarray(shape, np.uint8, block.buf)
+
+        assert art.pixels.shape == shape
+        assert np.shares_memory(art.pixels, canvas)
+        np.testing.assert_array_equal(canvas, expected.pixels)
+        del art, canvas
+    finally:
+        block.close()
+        block.unlink()
+
+
+def test_render_into_array(generator, pixels):
+    out = np.zeros(canvas_shape(230, 150), dtype=np.uint8)
+
+    art = generator.render(pixels, dice_width=10, out=out)
+
+    assert art.pixels is out
+    np.testing.assert_array_equal(out, generator.render(pixels, dice_width=10).pixels)
+
+
+@pytest.mark.parametrize(
+    "out",
+    [
+        bytearray(150 * 230 - 1),
+        bytes(150 * 230),
+        np.zeros((230, 150), dtype=np.uint8),
+        np.zeros((150, 230, 1), dtype=np.uint8),
+        np.zeros((150, 230), dtype=np.uint16),
+        np.zeros((150, 460), dtype=np.uint8)[:, ::2],
+    ],
+    ids=["short", "read-only", "transposed", "extra-axis", "uint16", "strided"],
+)
+def test_render_rejects_wrong_buffer(generator, pixels, out):
+    with pytest.raises(ValueError):
+        generator.render(pixels, dice_width=10, out=out)
@@ -0,0 +1,127 @@
+import asyncio
+import io
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from photo_to_dices.disk_cache import DiskCache
+from photo_to_dices.grid_file import FaceGridFile
+from photo_to_dices.server import DiceArtService
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / "photos" / "photo.png"
+    path.parent.mkdir()
+    Image.fromarray(np.random.default_rng(0).integers(0, 256, (240, 320), dtype=np.uint8), "L").save(path)
+    return path
+
+
+@pytest.fixture
+def service(tmp_path, photo):
+    service = DiceArtService(DiskCache(tmp_path / "cache"), [photo.parent], workers=1)
+    yield service
+    service.close()
+
+
+async def _request(port, method, target, body=b""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{method} {target} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    headers = {name.lower(): value.strip() for name, _, value in (line.partition(":") for line in header_lines)}
+    return int(status_line.split()[1]), headers, payload
+
+
+def fetch(service, *requests):
+    # Serves on a free port for the duration of the given (method, target, body) requests, sent one after another.
+    async def run():
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return [await _request(port, *request) for request in requests]
+
+    return asyncio.run(run())
+
+
+def test_grid_from_path(service, photo):
+    [(status, headers, payload)] = fetch(service, ("GET", f"/grid?path={photo}&dice_width=16", b""))
+
+    assert status == 200
+    assert headers["content-type"] == "application/json"
+    result = json.loads(payload)
+    assert (result["dice"], result["cached"]) == (result["rows"] * result["cols"], False)
+    assert (result["width"], result["height"]) == (320, 240)
+    assert result["grid"] == f"/grids/{result['key']}.dgrid"
+
+
+def test_grid_from_upload(service, photo):
+    [(status, _, payload)] = fetch(service, ("POST", "/grid?dice_width=16", photo.read_bytes()))
+
+    assert status == 200
+    assert json.loads(payload)["width"] == 320
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["dice_width=0", "dice_width=wide", "scale=99", "mapping=spiral", ""],
+    ids=["width-range", "width-integer", "scale-range", "mapping", "no-source"],
+)
+def test_bad_parameter_is_400(service, photo, query):
+    [(status, headers, payload)] = fetch(service, ("GET", f"/grid?{query}" + (f"&path={photo}" if query else ""), b""))
+
+    assert status == 400
+    assert headers["content-type"] == "application/json"
+    assert json.loads(payload)["error"]
+
+
+def test_upload_that_is_not_an_image_is_400(service):
+    [(status, _, _)] = fetch(service, ("POST", "/grid", b"not an image"))
+
+    assert status == 400
+
+
+def test_path_outside_roots_is_403(service, tmp_path):
+    outside = tmp_path / "outside.png"
+    Image.new("L", (32, 32)).save(outside)
+
+    [(status, _, _)] = fetch(service, ("GET", f"/grid?path={outside}", b""))
+
+    assert status == 403
+
+
+def test_cache_hit_returns_same_bytes(service, photo):
+    target = f"/grid?path={photo}&dice_width=16"
+    (_, _, first), (_, _, second) = fetch(service, ("GET", target, b""), ("GET", target, b""))
+    first, second = json.loads(first), json.loads(second)
+
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert {**first, "cached": True} == second
+    assert service.cache.stats()["hits"] == 1
+
+    tile = f"/tiles/{first['key']}_files/0/0_0.png"
+    (_, grid_headers, grid), (_, _, grid_again), (_, miss_headers, tile_bytes), (_, hit_headers, tile_again) = fetch(
+        service, ("GET", first["grid"], b""), ("GET", first["grid"], b""), ("GET", tile, b""), ("GET", tile, b"")
+    )
+    assert grid == grid_again
+    assert grid_headers["cache-control"].endswith("immutable")
+    assert FaceGridFile(service.cache.get(first["key"])).cols == first["cols"]
+    assert (miss_headers["x-cache"], hit_headers["x-cache"]) == ("miss", "hit")
+    assert tile_bytes == tile_again
+    assert Image.open(io.BytesIO(tile_bytes)).format == "PNG"
+
+
+def test_unknown_grid_and_tile_are_404(service, photo):
+    [(_, _, payload)] = fetch(service, ("GET", f"/grid?path={photo}&dice_width=16", b""))
+    key = json.loads(payload)["key"]
+
+    (grid_status, _, _), (tile_status, _, _) = fetch(
+        service, ("GET", f"/grids/{'0' * 64}.dgrid", b""), ("GET", f"/tiles/{key}_files/0/9_9.png", b"")
+    )
+
+    assert (grid_status, tile_status) == (404, 404)
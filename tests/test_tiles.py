@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from photo_to_dices.art_generator import ArtGenerator
+from photo_to_dices.tiles import DeepZoomPyramid
+
+
+@pytest.fixture
+def photo(tmp_path):
+    # Neither side is a multiple of the dice or the tiles, so tiles cut through dice and end on a partial die.
+    height, width = 371, 533
+    gradient = np.add.outer(np.linspace(0, 200, height), np.linspace(0, 50, width))
+    noise = np.random.default_rng(1).normal(0, 30, (height, width))
+    path = tmp_path / "photo.png"
+    Image.fromarray(np.clip(gradient + noise, 0, 255).astype(np.uint8), "L").save(path)
+    return path
+
+
+@pytest.fixture
+def converted(tmp_path, photo):
+    generator = ArtGenerator(tmp_path / "out")
+    raster_path, _ = generator.convert_to_dice_art(photo, dice_width=40, output_format="png")
+    dzi_path, _ = generator.convert_to_dice_art(photo, dice_width=40, output_format="dzi")
+    with Image.open(raster_path) as image:
+        return np.asarray(image), tmp_path / "out" / "dice-photo_files"
+
+
+def read_tile(tile_dir, level, col, row):
+    with Image.open(tile_dir / str(level) / f"{col}_{row}.png") as tile:
+        return np.asarray(tile)
+
+
+@pytest.mark.parametrize(
+    "col, row, box",
+    [
+        # The first tile, with its overlap reaching across the tile boundary at 254.
+        (0, 0, (0, 0, 255, 255)),
+        # Overlaps on every side of a tile boundary that cuts through dice.
+        (1, 1, (253, 253, 509, 371)),
+        # The right and bottom edge, where the partial last die stays white.
+        (2, 1, (507, 253, 533, 371)),
+    ],
+)
+def test_full_resolution_tiles_match_raster(converted, col, row, box):
+    raster, tile_dir = converted
+    pyramid = DeepZoomPyramid(np.zeros((1, 1), dtype=np.uint8), 20, (533, 371))
+    left, top, right, bottom = box
+
+    assert pyramid.tile_bounds(pyramid.max_level, col, row) == box
+    np.testing.assert_array_equal(read_tile(tile_dir, pyramid.max_level, col, row), raster[top:bottom, left:right])
+
+
+def test_full_resolution_level_matches_raster(converted):
+    raster, tile_dir = converted
+    pyramid = DeepZoomPyramid(np.zeros((1, 1), dtype=np.uint8), 20, (533, 371))
+    level = pyramid.max_level
+    cols, rows = pyramid.tile_count(level)
+
+    assert pyramid.level_size(level) == (533, 371)
+    # The partial dice on the right and bottom edges are left white.
+    assert (raster[:, 520:] == 255).all() and (raster[360:] == 255).all()
+    for row in range(rows):
+        for col in range(cols):
+            left, top, right, bottom = pyramid.tile_bounds(level, col, row)
+            np.testing.assert_array_equal(read_tile(tile_dir, level, col, row), raster[top:bottom, left:right])
@@ -0,0 +1,103 @@
+import gzip
+import re
+import xml.etree.ElementTree as ElementTree
+import zlib
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from photo_to_dices.face_atlas import DEFAULT_FACE_SET, load_face_sources
+from photo_to_dices.vector import save_vector
+
+SVG = "{http://www.w3.org/2000/svg}"
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+DICE_SIZE = 20
+
+
+@pytest.fixture
+def face_grid():
+    return np.random.default_rng(0).integers(1, 7, (7, 11), dtype=np.uint8)
+
+
+def canvas_size(face_grid):
+    rows, cols = face_grid.shape
+    return cols * DICE_SIZE + 5, rows * DICE_SIZE + 3
+
+
+@pytest.mark.parametrize("output_format", ["svg", "svgz"])
+def test_svg_places_every_die(tmp_path, face_grid, output_format):
+    path = tmp_path / f"dice.{output_format}"
+    save_vector(path, face_grid, DICE_SIZE, canvas_size(face_grid), output_format)
+    data = gzip.decompress(path.read_bytes()) if output_format == "svgz" else path.read_bytes()
+    root = ElementTree.fromstring(data)
+
+    width, height = canvas_size(face_grid)
+    assert (root.get("width"), root.get("height")) == (str(width), str(height))
+    assert root.get("viewBox") == f"0 0 {width / DICE_SIZE:g} {height / DICE_SIZE:g}"
+    faces = root.findall(f"{SVG}defs/{SVG}image")
+    assert [face.get("id") for face in faces] == [f"f{number}" for number in range(1, 7)]
+
+    rows = root.findall(f"{SVG}g")
+    assert len(rows) == face_grid.shape[0]
+    assert len(root.findall(f".//{SVG}use")) == face_grid.size
+    for row, group in enumerate(rows):
+        assert group.get("transform") == f"translate(0 {row})"
+        uses = group.findall(f"{SVG}use")
+        assert [int(use.get("x")) for use in uses] == list(range(face_grid.shape[1]))
+        assert [use.get(XLINK_HREF) for use in uses] == [f"#f{face}" for face in face_grid[row]]
+
+
+def pdf_objects(data):
+    # Checks the cross-reference table against the file and returns the bytes of every object by number.
+    xref_offset = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", data).group(1))
+    assert data[xref_offset:].startswith(b"xref\n")
+    header, *entries = data[xref_offset:].split(b"trailer")[0].splitlines()[1:]
+    first, count = map(int, header.split())
+    assert (first, len(entries)) == (0, count)
+    assert re.search(rb"/Size (\d+)", data).group(1) == str(count).encode()
+    assert entries[0] == b"0000000000 65535 f "
+
+    objects = {}
+    for number, entry in enumerate(entries[1:], 1):
+        offset, generation, kind = entry.split()
+        assert (generation, kind) == (b"00000", b"n")
+        start = int(offset)
+        assert data[start:].startswith(f"{number} 0 obj\n".encode())
+        objects[number] = data[start : data.index(b"endobj\n", start)]
+    return objects
+
+
+def test_pdf_structure(tmp_path, face_grid):
+    path = tmp_path / "dice.pdf"
+    width, height = canvas_size(face_grid)
+    save_vector(path, face_grid, DICE_SIZE, (width, height), "pdf")
+    objects = pdf_objects(path.read_bytes())
+
+    images = {number: body for number, body in objects.items() if b"/Subtype /Image" in body}
+    assert len(images) == 6
+    sources = load_face_sources(DEFAULT_FACE_SET)
+    for (number, body), face in zip(sorted(images.items()), sources):
+        assert f"/Width {face.width} /Height {face.height}".encode() in body
+        stream = body[body.index(b"stream\n") + 7 : body.rindex(b"\nendstream")]
+        assert zlib.decompress(stream) == face.tobytes()
+
+    page = objects[3]
+    assert f"/MediaBox [0 0 {width} {height}]".encode() in page
+    references = dict(re.findall(rb"/F(\d) (\d+) 0 R", page))
+    assert {int(number) for number in references.values()} == set(images)
+
+    content = objects[4]
+    stream = content[content.index(b"stream\n") + 7 : content.rindex(b"\nendstream")]
+    assert int(objects[5].split(b"\n")[1]) == len(stream)
+    draws = Counter(re.findall(rb"/F(\d) Do", zlib.decompress(stream)))
+    assert {int(face): count for face, count in draws.items()} == dict(Counter(face_grid.ravel().tolist()))
+
+
+def test_pdf_page_is_scaled_to_fit(tmp_path):
+    face_grid = np.ones((3, 1000), dtype=np.uint8)
+    path = tmp_path / "dice.pdf"
+    save_vector(path, face_grid, DICE_SIZE, (20000, 60), "pdf")
+
+    media_box = re.search(rb"/MediaBox \[0 0 ([\d.]+) ([\d.]+)\]", path.read_bytes())
+    assert (float(media_box.group(1)), float(media_box.group(2))) == (14400, 43.2)